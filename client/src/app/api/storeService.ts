@@ -141,6 +141,8 @@ export const updateStore = async (storeId: string, formData: FormData) => {
 
 /**
  * Delete a store
+ * The deletion runs in the background; the response contains a job_id
+ * that can be polled with fetchStoreDeletionStatus.
  */
 export const deleteStore = async (storeId: string) => {
     try {
@@ -164,7 +166,33 @@ export const deleteStore = async (storeId: string) => {
         throw error;
     }
 };
- 
+
+/**
+ * Fetch the progress of a background store deletion
+ */
+export const fetchStoreDeletionStatus = async (jobId: string) => {
+    try {
+        const apiUrl = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+        const response = await fetch(`${apiUrl}/delete_store_status/${jobId}`, {
+            method: 'GET',
+            credentials: 'include',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.detail || `Error fetching store deletion status: ${response.status}`);
+        }
+
+        return await response.json();
+    } catch (error) {
+        console.error('Store deletion status error:', error);
+        throw error;
+    }
+};
+
 /**
  * Update a store for a seller (store user)
  */
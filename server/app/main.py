@@ -1,8 +1,25 @@
 # app/main.py
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import auth, dashboard, reviews, fetch_products, fetch_stores, dashboard_stats, fetch_users, product_operations, store_operations, fetch_municipalities, admin_activities, fetch_most_viewed_products, store_users, store_user_auth, store_user_store, fetch_user_store, store_user_products, store_user_archived_products, store_user_profile, admin_archived_products, user_management
+from app.routes import auth, dashboard, reviews, fetch_products, fetch_stores, dashboard_stats, fetch_users, product_operations, store_operations, fetch_municipalities, admin_activities, fetch_most_viewed_products, store_users, store_user_auth, store_user_store, fetch_user_store, store_user_products, store_user_archived_products, store_user_profile, admin_archived_products, user_management, product_import, product_views, search, nearby, store_clusters, facets, recommendations, admin_duplicate_products, store_user_dashboard, ar_asset_uploads, signed_uploads
 from app.auth.auth_handler import get_current_user
+from app.utils.email_templates import load_email_templates
+from app.utils.activity_logger import activity_buffer
+from app.utils.view_counter import view_counter
+from app.utils.product_catalog import product_catalog
+from app.utils.search_index import product_search_index
+from app.utils.similarity_index import similar_product_index
+from app.utils.spatial_index import nearby_index
+from app.utils.store_clusters import store_cluster_index
+from app.utils.catalog_columns import catalog_columns
+from app.utils.duplicate_index import duplicate_product_index
+from app.utils.recommendations import item_recommender
+from app.utils.image_hashes import image_hash_index
+from app.utils.store_stats import store_stats_invalidator
+from app.utils.idempotency import IdempotencyMiddleware
+from app.utils.upload_sweeper import application_document_sweeper
+from app.auth.auth_handler import SESSION_COOKIE_NAME as ADMIN_SESSION_COOKIE_NAME
+from app.routes.store_user_auth import SESSION_COOKIE_NAME as STORE_USER_SESSION_COOKIE_NAME
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -14,14 +31,67 @@ app = FastAPI(title="Elyukal Admin API")
 import os
 from app.config import SERVER_IP, CLIENT_URL
 
+# Creation endpoints that replay their response when retried with the same Idempotency-Key.
+# Added before CORS so replayed responses still get the CORS headers.
+app.add_middleware(
+    IdempotencyMiddleware,
+    routes=[
+        ("POST", "/add_product"),
+        ("POST", "/add_store"),
+        ("POST", "/store-user/add-product"),
+        ("POST", "/store-user/create-store"),
+    ],
+    credential_cookies=[ADMIN_SESSION_COOKIE_NAME, STORE_USER_SESSION_COOKIE_NAME],
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", CLIENT_URL],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browser clients read the resumable upload headers
+    expose_headers=["Location", "Tus-Resumable", "Upload-Offset", "Upload-Length"],
 )
 
+@app.on_event("startup")
+async def startup_event():
+    # Compile the email templates once so template errors surface at boot
+    load_email_templates()
+    # Start flushing buffered admin activities in the background
+    await activity_buffer.start()
+    # Start flushing buffered product views in the background
+    await view_counter.start()
+    # Load the in-memory product catalog and the indexes that follow it
+    product_catalog.add_listener(product_search_index)
+    product_catalog.add_listener(similar_product_index)
+    product_catalog.add_listener(nearby_index)
+    product_catalog.add_listener(store_cluster_index)
+    product_catalog.add_listener(catalog_columns)
+    product_catalog.add_listener(duplicate_product_index)
+    product_catalog.add_listener(image_hash_index)
+    product_catalog.add_listener(store_stats_invalidator)
+    await product_catalog.start()
+    # Build the review-based recommendations
+    await item_recommender.start()
+    # Load the perceptual hashes of product images
+    await image_hash_index.start()
+    # Periodically remove seller application documents that were never submitted
+    await application_document_sweeper.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write out any admin activities that are still buffered
+    await activity_buffer.stop()
+    # Write out any product views that are still buffered
+    await view_counter.stop()
+    # Stop the periodic product catalog refresh
+    await product_catalog.stop()
+    await item_recommender.stop()
+    # Finish pending image hashing and stop the worker pool
+    await image_hash_index.stop()
+    await application_document_sweeper.stop()
+
 @app.get("/")
 def read_root():
     return {"message": "Elyukal Admin API running!"}
@@ -47,3 +117,14 @@ app.include_router(store_user_archived_products.router)
 app.include_router(store_user_profile.router)
 app.include_router(admin_archived_products.router)
 app.include_router(user_management.router)
+app.include_router(product_import.router)
+app.include_router(product_views.router)
+app.include_router(search.router)
+app.include_router(nearby.router)
+app.include_router(store_clusters.router)
+app.include_router(facets.router)
+app.include_router(recommendations.router)
+app.include_router(admin_duplicate_products.router)
+app.include_router(store_user_dashboard.router)
+app.include_router(ar_asset_uploads.router)
+app.include_router(signed_uploads.router)
@@ -2,9 +2,10 @@ from fastapi import APIRouter, HTTPException, Depends, Path
 from app.db.database import supabase_client
 from app.auth.auth_handler import get_current_user
 from app.utils.activity_logger import log_admin_activity
-from typing import Optional
+from app.utils.product_catalog import product_catalog
+from pydantic import BaseModel
+from typing import List, Optional
 import logging
-from datetime import datetime
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +16,26 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Admin Archived Product Operations"])
 
+# Maximum number of ids sent to the database in one bulk statement
+BULK_CHUNK_SIZE = 200
+
+# Pydantic model for bulk operation requests
+class BulkProductIds(BaseModel):
+    product_ids: List[int]
+
+def chunk_ids(ids: List[int], size: int = BULK_CHUNK_SIZE):
+    """Split a list of ids into chunks of at most size ids, dropping duplicates."""
+    unique_ids = list(dict.fromkeys(ids))
+    for start in range(0, len(unique_ids), size):
+        yield unique_ids[start:start + size]
+
+def summarize_results(results: List[dict]) -> dict:
+    """Count per-id results by status."""
+    summary = {}
+    for result in results:
+        summary[result["status"]] = summary.get(result["status"], 0) + 1
+    return summary
+
 @router.put("/admin/archive-product/{product_id}")
 async def archive_product(product_id: int = Path(...), current_user: dict = Depends(get_current_user)):
     """
@@ -23,74 +44,33 @@ async def archive_product(product_id: int = Path(...), current_user: dict = Depe
     try:
         logger.info(f"Starting product archiving for product_id: {product_id}")
 
-        # Check if the product is already in the archived_products table
-        archived_check = supabase_client.table("archived_products").select("*").eq("original_product_id", product_id).execute()
+        # Move the product to archived_products in a single transactional call
+        archive_response = supabase_client.rpc("archive_product", {
+            "p_product_id": product_id,
+            "p_archived_by": current_user["id"],
+            "p_archived_by_type": "admin"
+        }).execute()
+
+        result = archive_response.data or {}
+        status = result.get("status")
 
-        if archived_check.data and len(archived_check.data) > 0:
+        if status == "already_archived":
             logger.info(f"Product with ID {product_id} is already archived")
             return {"message": "Product is already archived"}
 
-        # First, check if the product exists and get its data
-        product_response = supabase_client.table("products").select("*").eq("id", product_id).execute()
-
-        if not product_response.data or len(product_response.data) == 0:
+        if status == "not_found":
             logger.error(f"Product with ID {product_id} not found")
             raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
 
-        existing_product = product_response.data[0]
-
-        # Store the original product ID for reference
-        original_product_id = existing_product["id"]
-
-        # Log the original product ID
-        logger.info(f"Archiving product with ID: {original_product_id}")
-
-        # Prepare data for archived_products table
-        archived_product_data = {
-            # Don't include ID field since it's a serial/auto-increment field
-            "original_product_id": original_product_id,  # Store the original ID for reference
-            "name": existing_product["name"],
-            "description": existing_product["description"],
-            "category": existing_product["category"],
-            "location_name": existing_product.get("location_name", ""),
-            "address": existing_product["address"],
-            "latitude": existing_product.get("latitude"),
-            "longitude": existing_product.get("longitude"),
-            "ar_asset_url": existing_product.get("ar_asset_url", ""),
-            "image_urls": existing_product.get("image_urls", []),
-            "in_stock": False,  # Archived products are set to not in stock
-            "store_id": existing_product["store_id"],
-            "town": existing_product.get("town"),
-            "price_min": existing_product.get("price_min"),
-            "price_max": existing_product.get("price_max"),
-            "views": existing_product.get("views", 0),
-            "archived_at": datetime.now().isoformat(),
-            "archived_by": current_user["id"],
-            "archived_by_type": "admin"
-        }
-
-        # Insert into archived_products table
-        archive_response = supabase_client.table("archived_products").insert(archived_product_data).execute()
-
-        if not archive_response.data:
-            logger.error("Failed to insert into archived_products table")
+        if status != "archived":
+            logger.error(f"Unexpected archive result for product {product_id}: {result}")
             raise HTTPException(status_code=500, detail="Failed to archive product")
 
-        # Delete from products table
-        delete_response = supabase_client.table("products").delete().eq("id", product_id).execute()
-
-        if not delete_response.data:
-            logger.error(f"Failed to delete product with ID {product_id} from products table")
-            # Try to delete from archived_products to maintain consistency
-            # We can now use the original_product_id to find the archived product
-            cleanup_response = supabase_client.table("archived_products").select("id").eq("original_product_id", product_id).execute()
-            if cleanup_response.data and len(cleanup_response.data) > 0:
-                archived_id = cleanup_response.data[0]["id"]
-                supabase_client.table("archived_products").delete().eq("id", archived_id).execute()
-            raise HTTPException(status_code=500, detail="Failed to complete product archiving")
+        # Keep the in-memory catalog in sync
+        product_catalog.remove_products([result["product_id"]])
 
         # Log admin activity for archiving product
-        await log_admin_activity(current_user, "archived", existing_product["name"])
+        await log_admin_activity(current_user, "archived", result["name"])
 
         logger.info(f"Successfully archived product with ID: {product_id}")
         return {"message": "Product archived successfully"}
@@ -110,54 +90,31 @@ async def restore_product(product_id: int = Path(...), current_user: dict = Depe
     try:
         logger.info(f"Starting product restoration for product_id: {product_id}")
 
-        # First, check if the archived product exists and get its data
-        archived_product_response = supabase_client.table("archived_products").select("*").eq("id", product_id).execute()
+        # Move the product back to products in a single transactional call
+        restore_response = supabase_client.rpc("restore_product", {
+            "p_archived_id": product_id
+        }).execute()
 
-        if not archived_product_response.data or len(archived_product_response.data) == 0:
+        result = restore_response.data or {}
+        status = result.get("status")
+
+        if status == "not_found":
             logger.error(f"Archived product with ID {product_id} not found")
             raise HTTPException(status_code=404, detail=f"Archived product with ID {product_id} not found")
 
-        archived_product = archived_product_response.data[0]
+        if status == "conflict":
+            logger.error(f"A product with the original ID of archived product {product_id} already exists")
+            raise HTTPException(status_code=409, detail="A product with the same ID already exists")
 
-        # Prepare data for products table
-        product_data = {
-            "id": archived_product["original_product_id"],  # Use the original product ID
-            "name": archived_product["name"],
-            "description": archived_product["description"],
-            "category": archived_product["category"],
-            "location_name": archived_product.get("location_name", ""),
-            "address": archived_product["address"],
-            "latitude": archived_product.get("latitude"),
-            "longitude": archived_product.get("longitude"),
-            "ar_asset_url": archived_product.get("ar_asset_url", ""),
-            "image_urls": archived_product.get("image_urls", []),
-            "in_stock": True,  # Restored products are set to in stock by default
-            "store_id": archived_product["store_id"],
-            "town": archived_product.get("town"),
-            "price_min": archived_product.get("price_min"),
-            "price_max": archived_product.get("price_max"),
-            "views": archived_product.get("views", 0)
-        }
-
-        # Insert into products table
-        restore_response = supabase_client.table("products").insert(product_data).execute()
-
-        if not restore_response.data:
-            logger.error("Failed to insert into products table")
+        if status != "restored":
+            logger.error(f"Unexpected restore result for product {product_id}: {result}")
             raise HTTPException(status_code=500, detail="Failed to restore product")
 
-        # Delete from archived_products table using the archived product's actual ID
-        delete_response = supabase_client.table("archived_products").delete().eq("id", archived_product["id"]).execute()
-
-        if not delete_response.data:
-            logger.error(f"Failed to delete product with ID {product_id} from archived_products table")
-            # Try to delete from products to maintain consistency
-            original_id = archived_product["original_product_id"]
-            supabase_client.table("products").delete().eq("id", original_id).execute()
-            raise HTTPException(status_code=500, detail="Failed to complete product restoration")
+        # Keep the in-memory catalog in sync
+        product_catalog.schedule_refresh_products([result["product_id"]])
 
         # Log admin activity for restoring product
-        await log_admin_activity(current_user, "restored", archived_product["name"])
+        await log_admin_activity(current_user, "restored", result["name"])
 
         logger.info(f"Successfully restored product with ID: {product_id}")
         return {"message": "Product restored successfully"}
@@ -248,3 +205,122 @@ async def permanently_delete_product(product_id: int = Path(...), current_user:
     except Exception as e:
         logger.error(f"Error permanently deleting product: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error permanently deleting product: {str(e)}")
+
+
+@router.put("/admin/bulk-archive-products")
+async def bulk_archive_products(payload: BulkProductIds, current_user: dict = Depends(get_current_user)):
+    """
+    Archive many products at once, returning a result for each requested id.
+    """
+    try:
+        if not payload.product_ids:
+            raise HTTPException(status_code=400, detail="No product IDs provided")
+
+        logger.info(f"Starting bulk archiving for {len(payload.product_ids)} products")
+
+        results = []
+        for chunk in chunk_ids(payload.product_ids):
+            response = supabase_client.rpc("archive_products", {
+                "p_product_ids": chunk,
+                "p_archived_by": current_user["id"],
+                "p_archived_by_type": "admin"
+            }).execute()
+            results.extend(response.data or [])
+
+        summary = summarize_results(results)
+        archived_count = summary.get("archived", 0)
+
+        # Keep the in-memory catalog in sync
+        product_catalog.remove_products([result["id"] for result in results if result["status"] == "archived"])
+
+        # Log one admin activity for the whole batch
+        if archived_count:
+            await log_admin_activity(current_user, "archived", f"{archived_count} products (bulk)")
+
+        logger.info(f"Bulk archiving finished: {summary}")
+        return {"message": f"{archived_count} products archived successfully", "summary": summary, "results": results}
+
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        logger.error(f"Error bulk archiving products: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error bulk archiving products: {str(e)}")
+
+@router.put("/admin/bulk-restore-products")
+async def bulk_restore_products(payload: BulkProductIds, current_user: dict = Depends(get_current_user)):
+    """
+    Restore many archived products at once, returning a result for each requested id.
+    """
+    try:
+        if not payload.product_ids:
+            raise HTTPException(status_code=400, detail="No product IDs provided")
+
+        logger.info(f"Starting bulk restoration for {len(payload.product_ids)} products")
+
+        results = []
+        for chunk in chunk_ids(payload.product_ids):
+            response = supabase_client.rpc("restore_products", {
+                "p_archived_ids": chunk
+            }).execute()
+            results.extend(response.data or [])
+
+        summary = summarize_results(results)
+        restored_count = summary.get("restored", 0)
+
+        # Keep the in-memory catalog in sync
+        product_catalog.schedule_refresh_products([result["product_id"] for result in results if result["status"] == "restored"])
+
+        # Log one admin activity for the whole batch
+        if restored_count:
+            await log_admin_activity(current_user, "restored", f"{restored_count} products (bulk)")
+
+        logger.info(f"Bulk restoration finished: {summary}")
+        return {"message": f"{restored_count} products restored successfully", "summary": summary, "results": results}
+
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        logger.error(f"Error bulk restoring products: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error bulk restoring products: {str(e)}")
+
+@router.delete("/admin/bulk-permanently-delete-products")
+async def bulk_permanently_delete_products(payload: BulkProductIds, current_user: dict = Depends(get_current_user)):
+    """
+    Permanently delete many archived products at once, returning a result for each requested id.
+    """
+    try:
+        if not payload.product_ids:
+            raise HTTPException(status_code=400, detail="No product IDs provided")
+
+        logger.info(f"Starting bulk permanent deletion for {len(payload.product_ids)} products")
+
+        results = []
+        for chunk in chunk_ids(payload.product_ids):
+            # One DELETE ... WHERE id IN (...) per chunk; the deleted rows are returned
+            delete_response = supabase_client.table("archived_products").delete().in_("id", chunk).execute()
+            deleted = {row["id"]: row.get("name") for row in delete_response.data or []}
+
+            for archived_id in chunk:
+                if archived_id in deleted:
+                    results.append({"id": archived_id, "status": "deleted", "name": deleted[archived_id]})
+                else:
+                    results.append({"id": archived_id, "status": "not_found", "name": None})
+
+        summary = summarize_results(results)
+        deleted_count = summary.get("deleted", 0)
+
+        # Log one admin activity for the whole batch
+        if deleted_count:
+            await log_admin_activity(current_user, "permanently deleted", f"{deleted_count} products (bulk)")
+
+        logger.info(f"Bulk permanent deletion finished: {summary}")
+        return {"message": f"{deleted_count} products permanently deleted successfully", "summary": summary, "results": results}
+
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        logger.error(f"Error bulk permanently deleting products: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error bulk permanently deleting products: {str(e)}")
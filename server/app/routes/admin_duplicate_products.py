@@ -0,0 +1,161 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Path, BackgroundTasks
+from app.auth.auth_handler import get_current_user
+from app.utils.jobs import job_registry
+from app.utils.product_catalog import product_catalog
+from app.utils.duplicate_index import duplicate_product_index
+from app.utils.image_hashes import image_hash_index, DUPLICATE_IMAGE_DISTANCE
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Admin Duplicate Products"])
+
+def listing_summary(product_id: int) -> dict:
+    product = product_catalog.products.get(product_id) or {}
+    store = product_catalog.stores.get(product.get("store_id")) or {}
+    return {
+        "id": product_id,
+        "name": product.get("name"),
+        "store_id": product.get("store_id"),
+        "store_name": store.get("name"),
+        "image_urls": product.get("image_urls") or []
+    }
+
+@router.get("/admin/duplicate-products")
+async def fetch_duplicate_products(
+    cross_store_only: bool = False,
+    limit: int = Query(50, ge=1, le=500),
+    _: dict = Depends(get_current_user)
+):
+    """
+    Get clusters of listings that are likely duplicates of each other.
+
+    Clusters come from the MinHash/LSH index over product name and description
+    shingles. With cross_store_only, only clusters spanning several stores are returned.
+    """
+    try:
+        if not product_catalog.loaded:
+            raise HTTPException(status_code=503, detail="Duplicate detection is not ready yet")
+
+        clusters = []
+        for cluster in duplicate_product_index.clusters():
+            store_ids = {(product_catalog.products.get(product_id) or {}).get("store_id") for product_id in cluster}
+            if cross_store_only and len(store_ids) < 2:
+                continue
+            similarities = [
+                similarity
+                for product_id in cluster
+                for other_id, similarity in duplicate_product_index.duplicates_of(product_id)
+                if other_id > product_id
+            ]
+            clusters.append({
+                "products": [listing_summary(product_id) for product_id in cluster],
+                "store_count": len(store_ids),
+                "max_similarity": round(max(similarities), 4),
+                "min_similarity": round(min(similarities), 4)
+            })
+            if len(clusters) >= limit:
+                break
+
+        return {"clusters": clusters}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching duplicate products: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching duplicate products: {str(e)}")
+
+@router.get("/admin/duplicate-products/{product_id}")
+async def fetch_product_duplicates(product_id: int, _: dict = Depends(get_current_user)):
+    """
+    Get the listings detected as duplicates of one product.
+    """
+    try:
+        if not product_catalog.loaded:
+            raise HTTPException(status_code=503, detail="Duplicate detection is not ready yet")
+
+        if product_id not in product_catalog.products:
+            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+
+        duplicates = [
+            {**listing_summary(other_id), "similarity": round(similarity, 4)}
+            for other_id, similarity in duplicate_product_index.duplicates_of(product_id)
+        ]
+        return {"duplicates": duplicates}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching duplicates of product {product_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching duplicate products: {str(e)}")
+
+@router.get("/admin/duplicate-images/{product_id}")
+async def fetch_duplicate_images(
+    product_id: int,
+    max_distance: int = Query(DUPLICATE_IMAGE_DISTANCE, ge=0, le=16),
+    _: dict = Depends(get_current_user)
+):
+    """
+    Get images of other products that look the same as the images of a product.
+
+    Matches are found with a Hamming-distance lookup on the perceptual hashes
+    computed at upload time.
+    """
+    try:
+        if not image_hash_index.loaded:
+            raise HTTPException(status_code=503, detail="Image duplicate detection is not ready yet")
+
+        if product_id not in product_catalog.products:
+            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+
+        duplicates = []
+        for image in image_hash_index.product_duplicates(product_id, max_distance):
+            duplicates.append({
+                "image_url": image["image_url"],
+                "matches": [
+                    {**match, "product": listing_summary(match["product_id"])}
+                    for match in image["matches"]
+                ]
+            })
+        return {"duplicates": duplicates}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching duplicate images of product {product_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching duplicate images: {str(e)}")
+
+async def run_image_hash_backfill(job_id: str):
+    """Background task that hashes the product images that have no hash yet."""
+    job_registry.update(job_id, status="running")
+    try:
+        result = await image_hash_index.backfill(lambda **progress: job_registry.set_progress(job_id, **progress))
+        job_registry.update(job_id, status="completed", result=result)
+    except Exception as e:
+        logger.error(f"Image hash backfill job {job_id} failed: {str(e)}", exc_info=True)
+        job_registry.update(job_id, status="failed", result={"error": str(e)})
+
+@router.post("/admin/duplicate-images/backfill", status_code=202)
+async def backfill_image_hashes(background_tasks: BackgroundTasks, _: dict = Depends(get_current_user)):
+    """
+    Start hashing the images of existing products that were uploaded before image hashing.
+
+    Poll /admin/duplicate-images/backfill/{job_id} for progress.
+    """
+    if not image_hash_index.loaded or not product_catalog.loaded:
+        raise HTTPException(status_code=503, detail="Image duplicate detection is not ready yet")
+
+    job = await job_registry.create("image_hash_backfill")
+    background_tasks.add_task(run_image_hash_backfill, job["job_id"])
+    logger.info(f"Queued image hash backfill job {job['job_id']}")
+    return {"message": "Image hash backfill started", "job_id": job["job_id"]}
+
+@router.get("/admin/duplicate-images/backfill/{job_id}")
+async def get_image_hash_backfill_status(job_id: str = Path(...), _: dict = Depends(get_current_user)):
+    """
+    Get the progress of an image hash backfill job.
+    """
+    job = await job_registry.get(job_id)
+    if not job or job["type"] != "image_hash_backfill":
+        raise HTTPException(status_code=404, detail=f"Image hash backfill job {job_id} not found")
+    return {"job": job}
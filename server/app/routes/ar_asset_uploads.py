@@ -0,0 +1,255 @@
+from fastapi import APIRouter, HTTPException, Depends, Header, Path, Request, Response
+from pydantic import BaseModel
+from app.db.database import supabase_client
+from app.auth.auth_handler import get_current_user
+from app.routes.store_user_auth import get_store_user_identity
+from app.utils.activity_logger import log_admin_activity
+from app.utils.conditional_writes import update_where, row_exists
+from app.utils.product_catalog import product_catalog
+from app.utils.resumable_uploads import ar_asset_uploads, parse_checksum, UploadError
+from app.utils.storage import STORAGE_BUCKET, remove_storage_objects
+from typing import Optional
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["AR Asset Uploads"])
+
+TUS_VERSION = "1.0.0"
+
+class UploadCreate(BaseModel):
+    product_id: int
+    length: int
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+
+class UploadCommit(BaseModel):
+    sha256: Optional[str] = None  # Hex digest of the whole file
+
+async def create_upload(owner: str, body: UploadCreate, response: Response, location: str) -> dict:
+    # Creating a session scans the owner's open sessions on disk
+    session = await asyncio.to_thread(ar_asset_uploads.create, owner, body.length, {
+        "product_id": body.product_id,
+        "filename": body.filename,
+        "content_type": body.content_type or "application/octet-stream"
+    })
+    response.status_code = 201
+    response.headers["Location"] = f"{location}/{session['upload_id']}"
+    response.headers["Tus-Resumable"] = TUS_VERSION
+    response.headers["Upload-Offset"] = "0"
+    return session
+
+def upload_offset_response(owner: str, upload_id: str) -> Response:
+    session = ar_asset_uploads.get(upload_id, owner)
+    return Response(status_code=200, headers={
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["length"]),
+        "Cache-Control": "no-store"
+    })
+
+async def append_chunk(owner: str, upload_id: str, request: Request, upload_offset: int,
+                       upload_checksum: Optional[str]) -> Response:
+    if request.headers.get("content-type") != "application/offset+octet-stream":
+        raise UploadError(415, "Chunks must be sent as application/offset+octet-stream")
+    offset = await ar_asset_uploads.append(
+        upload_id, owner, upload_offset, request.stream(), parse_checksum(upload_checksum)
+    )
+    return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION, "Upload-Offset": str(offset)})
+
+async def attach_upload(owner: str, upload_id: str, body: UploadCommit, store_id: Optional[str] = None) -> list:
+    """
+    Move a finished upload to storage and set it as its product's AR asset.
+
+    With store_id the product must belong to that store. Returns the updated product rows.
+    """
+    # Verifying the checksum reads the whole file
+    session = await asyncio.to_thread(ar_asset_uploads.finish, upload_id, owner, body.sha256)
+    product_id = session["product_id"]
+
+    ar_asset_path = f"ar-assets/{product_id}/{uuid.uuid4()}"
+
+    def upload():
+        # Passing the open file lets the storage client stream it instead of loading it into memory
+        with open(ar_asset_uploads.data_path(upload_id), "rb") as data_file:
+            supabase_client.storage.from_(STORAGE_BUCKET).upload(
+                path=ar_asset_path,
+                file=data_file,
+                file_options={"content-type": session["content_type"]}
+            )
+
+    await asyncio.to_thread(upload)
+    ar_asset_url = supabase_client.storage.from_(STORAGE_BUCKET).get_public_url(ar_asset_path)
+
+    filters = {"id": product_id}
+    if store_id is not None:
+        filters["store_id"] = store_id
+    updated = update_where("products", {"ar_asset_url": ar_asset_url}, **filters)
+
+    if not updated:
+        remove_storage_objects([ar_asset_path])
+        if store_id is not None and row_exists("products", "id", product_id):
+            raise UploadError(403, "You don't have permission to update this product")
+        raise UploadError(404, f"Product with ID {product_id} not found")
+
+    ar_asset_uploads.delete(upload_id, owner)
+
+    # Keep the in-memory catalog in sync
+    product_catalog.upsert_products(updated)
+    logger.info(f"Attached upload {upload_id} as the AR asset of product {product_id}")
+    return updated
+
+def upload_http_error(e: UploadError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Tus-Resumable": TUS_VERSION})
+
+# Admin endpoints
+
+@router.post("/ar-asset-uploads")
+async def create_ar_asset_upload(body: UploadCreate, response: Response, current_user: dict = Depends(get_current_user)):
+    """
+    Start a resumable AR asset upload for a product.
+
+    Send the file in chunks with PATCH /ar-asset-uploads/{upload_id}, resume from
+    the offset returned by HEAD after a dropped connection, and attach it to the
+    product with POST /ar-asset-uploads/{upload_id}/commit.
+    """
+    try:
+        return await create_upload(f"admin:{current_user.get('id')}", body, response, "/ar-asset-uploads")
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@router.head("/ar-asset-uploads/{upload_id}")
+async def get_ar_asset_upload_offset(upload_id: str = Path(...), current_user: dict = Depends(get_current_user)):
+    """Return the number of bytes received so far in the Upload-Offset header."""
+    try:
+        return upload_offset_response(f"admin:{current_user.get('id')}", upload_id)
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@router.patch("/ar-asset-uploads/{upload_id}")
+async def append_ar_asset_upload(
+    request: Request,
+    upload_id: str = Path(...),
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Append a chunk at Upload-Offset, optionally verified by an Upload-Checksum header."""
+    try:
+        return await append_chunk(f"admin:{current_user.get('id')}", upload_id, request, upload_offset, upload_checksum)
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@router.post("/ar-asset-uploads/{upload_id}/commit")
+async def commit_ar_asset_upload(
+    body: UploadCommit,
+    upload_id: str = Path(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """Verify a finished upload and set it as the product's AR asset."""
+    try:
+        updated = await attach_upload(f"admin:{current_user.get('id')}", upload_id, body)
+
+        # Log admin activity for updating product
+        await log_admin_activity(current_user, "edited", updated[0].get("name", f"Product {updated[0]['id']}"))
+
+        return {"message": "AR asset uploaded successfully", "product": updated[0]}
+    except UploadError as e:
+        raise upload_http_error(e)
+    except Exception as e:
+        logger.error(f"Error committing AR asset upload {upload_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error committing AR asset upload: {str(e)}")
+
+@router.delete("/ar-asset-uploads/{upload_id}", status_code=204)
+async def delete_ar_asset_upload(upload_id: str = Path(...), current_user: dict = Depends(get_current_user)):
+    """Abandon an upload and discard the bytes received so far."""
+    try:
+        ar_asset_uploads.delete(upload_id, f"admin:{current_user.get('id')}")
+        return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
+    except UploadError as e:
+        raise upload_http_error(e)
+
+# Store user endpoints
+
+def store_user_owner(identity: dict) -> str:
+    return f"store_user:{identity['store_user'].get('id')}"
+
+@router.post("/store-user/ar-asset-uploads")
+async def create_store_user_ar_asset_upload(
+    body: UploadCreate,
+    response: Response,
+    identity: dict = Depends(get_store_user_identity)
+):
+    """Start a resumable AR asset upload for one of the store user's products."""
+    store_id = identity["store_id"]
+    if not store_id:
+        raise HTTPException(status_code=400, detail="You don't have a store")
+
+    # Refuse early when the catalog already knows the product belongs to another store
+    product = product_catalog.products.get(body.product_id)
+    if product is not None and str(product.get("store_id")) != str(store_id):
+        raise HTTPException(status_code=403, detail="You don't have permission to update this product")
+
+    try:
+        return await create_upload(store_user_owner(identity), body, response, "/store-user/ar-asset-uploads")
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@router.head("/store-user/ar-asset-uploads/{upload_id}")
+async def get_store_user_ar_asset_upload_offset(
+    upload_id: str = Path(...),
+    identity: dict = Depends(get_store_user_identity)
+):
+    """Return the number of bytes received so far in the Upload-Offset header."""
+    try:
+        return upload_offset_response(store_user_owner(identity), upload_id)
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@router.patch("/store-user/ar-asset-uploads/{upload_id}")
+async def append_store_user_ar_asset_upload(
+    request: Request,
+    upload_id: str = Path(...),
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+    identity: dict = Depends(get_store_user_identity)
+):
+    """Append a chunk at Upload-Offset, optionally verified by an Upload-Checksum header."""
+    try:
+        return await append_chunk(store_user_owner(identity), upload_id, request, upload_offset, upload_checksum)
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@router.post("/store-user/ar-asset-uploads/{upload_id}/commit")
+async def commit_store_user_ar_asset_upload(
+    body: UploadCommit,
+    upload_id: str = Path(...),
+    identity: dict = Depends(get_store_user_identity)
+):
+    """Verify a finished upload and set it as the AR asset of the store user's product."""
+    store_id = identity["store_id"]
+    if not store_id:
+        raise HTTPException(status_code=400, detail="You don't have a store")
+
+    try:
+        updated = await attach_upload(store_user_owner(identity), upload_id, body, store_id)
+        return {"message": "AR asset uploaded successfully", "product": updated[0]}
+    except UploadError as e:
+        raise upload_http_error(e)
+    except Exception as e:
+        logger.error(f"Error committing AR asset upload {upload_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error committing AR asset upload: {str(e)}")
+
+@router.delete("/store-user/ar-asset-uploads/{upload_id}", status_code=204)
+async def delete_store_user_ar_asset_upload(
+    upload_id: str = Path(...),
+    identity: dict = Depends(get_store_user_identity)
+):
+    """Abandon an upload and discard the bytes received so far."""
+    try:
+        ar_asset_uploads.delete(upload_id, store_user_owner(identity))
+        return Response(status_code=204, headers={"Tus-Resumable": TUS_VERSION})
+    except UploadError as e:
+        raise upload_http_error(e)
@@ -1,12 +1,18 @@
 # app/routes/dashboard_stats.py
 from fastapi import APIRouter, HTTPException
 from app.db.database import supabase_client
+from app.utils.product_catalog import product_catalog
+from app.utils.catalog_columns import catalog_columns
 
 router = APIRouter()
 
 @router.get("/get_total_number_of_categories")
 async def get_total_number_of_categories():
     try:
+        if product_catalog.loaded:
+            # Count distinct codes of the in-memory category column
+            return {"total_categories": catalog_columns.distinct_count("category", catalog_columns.mask())}
+
         # Query all products to get their categories
         response = supabase_client.table("products").select("category").execute()
         
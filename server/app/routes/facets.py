@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.utils.product_catalog import product_catalog
+from app.utils.catalog_columns import catalog_columns
+from typing import Optional
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/facets", tags=["Facets"])
+
+# Lower bounds of the price bands, applied to price_min; the last band is open-ended
+PRICE_BAND_EDGES = [0, 100, 250, 500, 1000, 2500, 5000]
+
+@router.get("/products")
+async def product_facets(
+    category: Optional[str] = None,
+    town: Optional[str] = None,
+    store_id: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_rating: Optional[float] = Query(None, ge=0, le=5)
+):
+    """
+    Get product counts per category, town, store and price band.
+
+    Every facet is counted with all active filters except its own, so the
+    counts show how many products each alternative value would match. Counts
+    come from the in-memory catalog columns; no product rows are transferred.
+    """
+    try:
+        if not product_catalog.loaded:
+            raise HTTPException(status_code=503, detail="Product facets are not ready yet")
+
+        filters = {
+            "category": category,
+            "town": town,
+            "store_id": store_id,
+            "in_stock": in_stock,
+            "min_price": min_price,
+            "max_price": max_price,
+            "min_rating": min_rating
+        }
+
+        def mask_without(*names):
+            return catalog_columns.mask(**{key: value for key, value in filters.items() if key not in names})
+
+        def sorted_counts(counts: dict) -> list:
+            return sorted(counts.items(), key=lambda item: (-item[1], str(item[0])))
+
+        stores = product_catalog.stores
+        edges = PRICE_BAND_EDGES + [math.inf]
+        price_counts = catalog_columns.band_counts("price_min", edges, mask_without("min_price", "max_price"))
+
+        return {
+            "total": catalog_columns.count(mask_without()),
+            "facets": {
+                "category": [
+                    {"value": value, "count": count}
+                    for value, count in sorted_counts(catalog_columns.value_counts("category", mask_without("category")))
+                ],
+                "town": [
+                    {"value": value, "count": count}
+                    for value, count in sorted_counts(catalog_columns.value_counts("town", mask_without("town")))
+                ],
+                "store": [
+                    {"store_id": value, "name": (stores.get(value) or {}).get("name"), "count": count}
+                    for value, count in sorted_counts(catalog_columns.value_counts("store", mask_without("store_id")))
+                ],
+                "price": [
+                    {"min": edges[i], "max": None if math.isinf(edges[i + 1]) else edges[i + 1], "count": count}
+                    for i, count in enumerate(price_counts)
+                ]
+            }
+        }
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error computing product facets: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error computing product facets: {str(e)}")
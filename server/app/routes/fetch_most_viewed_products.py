@@ -1,38 +1,38 @@
 from fastapi import APIRouter, HTTPException
 from app.db.database import supabase_client
+from app.utils.rating_stats import attach_rating_stats
+from app.utils.product_catalog import product_catalog
+from app.utils.catalog_columns import catalog_columns
 
 router = APIRouter()
 
+# Number of products returned by the most viewed endpoint
+MOST_VIEWED_LIMIT = 5
+
 @router.get("/fetch_most_viewed_products")
 async def fetch_most_viewed_products():
     try:
-        # Fetch products with store details
-        response = supabase_client.table("products").select(
-            "id, name, description, category, price_min, price_max, ar_asset_url, image_urls, address, in_stock, store_id, views, stores(name, store_id, latitude, longitude, store_image, type, rating, town)"
-        ).execute()
-
-        if not response.data:
+        if product_catalog.loaded:
+            # Sort the in-memory views column
+            top_ids = catalog_columns.top(["views"], MOST_VIEWED_LIMIT, catalog_columns.mask())
+            products = [product_catalog.product_with_store(product_id) for product_id in top_ids]
+        else:
+            # Let the database sort by views and return only the top products. The client
+            # has no nulls-last option (nullsfirst=False adds nothing), so the modifier is
+            # spelled out; it matches products_views_idx.
+            response = supabase_client.table("products").select(
+                "id, name, description, category, price_min, price_max, ar_asset_url, image_urls, address, in_stock, store_id, views, stores(name, store_id, latitude, longitude, store_image, type, rating, town)"
+            ).order("views.desc.nullslast").limit(MOST_VIEWED_LIMIT).execute()
+            products = response.data
+
+        if not products:
             raise HTTPException(status_code=404, detail="No products found")
 
-        products = response.data
-
-        # Fetch ratings for each product
-        for product in products:
-            ratings_response = (
-                supabase_client.table("reviews")
-                .select("rating")
-                .eq("product_id", product["id"])
-                .execute()
-            )
-            ratings = [r["rating"] for r in ratings_response.data]
-            product["average_rating"] = "{:.1f}".format(round(sum(ratings) / len(ratings), 1)) if ratings else "0"
-            product["total_reviews"] = len(ratings)
-
-        # Sort products by views in descending order and take top 5
-        sorted_products = sorted(products, key=lambda x: x.get("views", 0), reverse=True)[:5]
+        # Fetch ratings for the returned products in one query
+        products = attach_rating_stats(products)
 
-        return {"products": sorted_products}
+        return {"products": products}
 
     except Exception as e:
         print(f"Error fetching most viewed products: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
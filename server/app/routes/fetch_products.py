@@ -1,10 +1,17 @@
 from fastapi import APIRouter, HTTPException
 from app.db.database import supabase_client
 from app.schemas.product import Products
+from app.utils.rating_stats import attach_rating_stats
+from app.utils.product_catalog import product_catalog
+from app.utils.similarity_index import similar_product_index
+from app.utils.catalog_columns import catalog_columns
 from typing import List
 
 router = APIRouter()
 
+# Number of products returned by the popular products endpoint
+POPULAR_PRODUCTS_LIMIT = 4
+
 @router.get("/fetch_products")
 async def fetch_products():
     try:
@@ -58,6 +65,10 @@ async def get_total_number_of_products():
 @router.get("/get_total_number_of_product_views")
 async def get_total_number_of_product_views():
     try:
+        if product_catalog.loaded:
+            # Sum the in-memory views column
+            return {"total_product_views": int(catalog_columns.total("views", catalog_columns.mask()))}
+
         # Query all products to get their views
         response = supabase_client.table("products").select("views").execute()
         
@@ -101,41 +112,28 @@ async def fetch_products_by_municipality(municipality_id: str):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/fetch_similar_products/{product_id}")
-async def fetch_similar_products(product_id: str):
+async def fetch_similar_products(product_id: int):
     try:
-        reference_product = supabase_client.table("products").select(
-            "id, name, store_id, stores(name, store_id, latitude, longitude, store_image, type, rating, town)"
-        ).eq("id", product_id).single().execute()
+        if not product_catalog.loaded:
+            raise HTTPException(status_code=503, detail="Similar products are not ready yet")
 
-        if not reference_product.data:
+        if product_id not in product_catalog.products:
             raise HTTPException(status_code=404, detail="Reference product not found")
 
-        ref_name = reference_product.data["name"].strip()  # Remove leading/trailing spaces
-
-        response = supabase_client.table("products").select(
-            "id, name, description, category, price_min,price_max, ar_asset_url, image_urls, address, in_stock, store_id, views, stores(name, store_id, latitude, longitude, store_image, type, rating, town)"
-        ).eq("name", ref_name).neq("id", product_id).execute()
-
-        if not response.data:
-            print(f"No similar products found for name: '{ref_name}'")  # Log for debugging
-            return {"similar_products": []}
-
-        similar_products = response.data
-        print(f"Found similar products: {similar_products}")  # Log results
+        # Neighbours are precomputed by the similarity index
+        similar_products = []
+        for similar_id, similarity in similar_product_index.similar(product_id):
+            product = product_catalog.product_with_store(similar_id)
+            if product is not None:
+                product["similarity"] = round(similarity, 4)
+                similar_products.append(product)
 
-        for product in similar_products:
-            ratings_response = (
-                supabase_client.table("reviews")
-                .select("rating")
-                .eq("product_id", product["id"])
-                .execute()
-            )
-            ratings = [r["rating"] for r in ratings_response.data]
-            product["average_rating"] = "{:.1f}".format(round(sum(ratings) / len(ratings), 1)) if ratings else "0"
-            product["total_reviews"] = len(ratings)
+        attach_rating_stats(similar_products)
 
         return {"similar_products": similar_products}
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
         print(f"Error fetching similar products: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -143,28 +141,44 @@ async def fetch_similar_products(product_id: str):
 @router.get("/fetch_popular_products")
 async def fetch_popular_products():
     try:
-        # Fetch products without ordering yet
-        response = supabase_client.table('products').select(
+        if product_catalog.loaded:
+            # Best rated first, then most reviewed; unrated products follow by views
+            top_ids = catalog_columns.top(["rating", "review_count", "views"], POPULAR_PRODUCTS_LIMIT, catalog_columns.mask())
+            products = [product_catalog.product_with_store(product_id) for product_id in top_ids]
+            if not products:
+                raise HTTPException(status_code=404, detail="No products found")
+            return {"products": attach_rating_stats(products)}
+
+        select_columns = (
             "id, name, description, category, price_min,price_max, ar_asset_url, image_urls, address, in_stock, store_id, views, "
             "stores(name, store_id, latitude, longitude, store_image, type, rating)"
-        ).execute()
-        
-        if not response.data:
+        )
+
+        # Get the best rated product ids from the precomputed rating aggregates
+        top_rated_response = supabase_client.rpc("top_rated_products", {"p_limit": POPULAR_PRODUCTS_LIMIT}).execute()
+        top_rated_ids = [row["product_id"] for row in top_rated_response.data or []]
+
+        products = []
+        if top_rated_ids:
+            response = supabase_client.table('products').select(select_columns).in_("id", top_rated_ids).execute()
+            products_by_id = {product["id"]: product for product in response.data or []}
+            products = [products_by_id[product_id] for product_id in top_rated_ids if product_id in products_by_id]
+
+        # Fill up with unrated products when fewer products have reviews
+        if len(products) < POPULAR_PRODUCTS_LIMIT:
+            query = supabase_client.table('products').select(select_columns)
+            if top_rated_ids:
+                query = query.not_.in_("id", top_rated_ids)
+            fill_response = query.limit(POPULAR_PRODUCTS_LIMIT - len(products)).execute()
+            products.extend(fill_response.data or [])
+
+        if not products:
             raise HTTPException(status_code=404, detail="No products found")
-        
-        products = response.data
-        
-        for product in products:
-            ratings_response = supabase_client.table("reviews").select("rating").eq("product_id", product["id"]).execute()
-            ratings = [r["rating"] for r in ratings_response.data] if ratings_response.data else []
-            product["average_rating"] = "{:.1f}".format(round(sum(ratings)/len(ratings), 1)) if ratings else "0"
-            product["total_reviews"] = len(ratings)
-        
-       
-        sorted_products = sorted(products, key=lambda x: x["average_rating"], reverse=True)[:4]
-        
-        return {"products": sorted_products}
+
+        attach_rating_stats(products)
+
+        return {"products": products}
     
     except Exception as e:
         print(f"Error fetching products: {type(e).__name__}: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Database error: {type(e).__name__}: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database error: {type(e).__name__}: {str(e)}")
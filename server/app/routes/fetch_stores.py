@@ -2,6 +2,7 @@
 from fastapi import APIRouter, HTTPException
 from app.db.database import supabase_client
 from app.schemas.stores import Store
+from app.utils.store_stats import STORE_STATS_SELECT, with_store_stats
 from typing import List
 
 router = APIRouter()
@@ -11,9 +12,11 @@ async def fetch_stores():
     try:
         print("Attempting to connect to Supabase...")
         
-        # Query updated to include only operating_hours and phone for highlights
+        # Query updated to include only operating_hours and phone for highlights,
+        # plus the precomputed store statistics
         response = supabase_client.table("stores").select(
-            "store_id, name, description, latitude, longitude, rating, store_image, type, operating_hours, phone"
+            "store_id, name, description, latitude, longitude, rating, store_image, type, operating_hours, phone, "
+            + STORE_STATS_SELECT
         ).execute()
         
         print("Supabase Response:", response)
@@ -22,7 +25,7 @@ async def fetch_stores():
             print("No data found in response")
             raise HTTPException(status_code=404, detail="No stores found")
         
-        return response.data
+        return [with_store_stats(store) for store in response.data]
         
     except Exception as e:
         print(f"Error in fetch_stores: {str(e)}")
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi import APIRouter, HTTPException, Depends
 from app.db.database import supabase_client
 from app.schemas.stores import Store
-from app.routes.store_user_auth import verify_store_user_session
+from app.routes.store_user_auth import get_store_user_identity
 import logging
 
 logging.basicConfig(
@@ -16,29 +16,15 @@ router = APIRouter(tags=["Store User Store Operations"])
 @router.get("/store-user/store/{store_id}", response_model=Store)
 async def fetch_user_store(
     store_id: str,
-    request: Request
+    identity: dict = Depends(get_store_user_identity)
 ):
     """
     Fetch details of a specific store by its store_id.
     Only the store owner can access this endpoint.
     """
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-        
-        if not user_email:
-            logger.warning("Unauthorized access attempt to store details")
-            raise HTTPException(status_code=401, detail="Authentication required")
-        
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-        
-        if not user_response.data:
-            logger.error(f"Store user not found for email: {user_email}")
-            raise HTTPException(status_code=404, detail="Store user not found")
-        
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
+        user_email = store_user.get("email")
         
         # Check if the user owns the requested store
         if store_user.get("store_owned") != store_id:
@@ -0,0 +1,116 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.utils.product_catalog import product_catalog
+from app.utils.spatial_index import nearby_index
+from app.utils.rating_stats import attach_rating_stats
+from typing import Callable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/nearby", tags=["Nearby"])
+
+# Largest search radius accepted by the nearby endpoints
+MAX_NEARBY_RADIUS_KM = 200
+
+def product_filter(category: Optional[str], in_stock: Optional[bool]) -> Optional[Callable[[int], bool]]:
+    """Build a predicate over product ids for the optional category and in_stock filters."""
+    if category is None and in_stock is None:
+        return None
+    category = category.strip().lower() if category else None
+
+    def accept(product_id: int) -> bool:
+        product = product_catalog.products.get(product_id)
+        if product is None:
+            return False
+        if category is not None and (product.get("category") or "").strip().lower() != category:
+            return False
+        if in_stock is not None and bool(product.get("in_stock")) != in_stock:
+            return False
+        return True
+
+    return accept
+
+def query_grid(grid, lat: float, lon: float, radius_km: Optional[float], limit: int, accept) -> List[Tuple[float, object]]:
+    """Run a radius query when a radius is given, otherwise a k-nearest query."""
+    if radius_km is not None:
+        return grid.within(lat, lon, radius_km, accept)[:limit]
+    return grid.nearest(lat, lon, limit, accept)
+
+def ensure_loaded():
+    if not product_catalog.loaded:
+        raise HTTPException(status_code=503, detail="Nearby index is not ready yet")
+
+@router.get("/stores")
+async def nearby_stores(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_NEARBY_RADIUS_KM),
+    limit: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None,
+    in_stock: Optional[bool] = None
+):
+    """
+    Find the stores nearest to a point, optionally within radius_km.
+
+    With category or in_stock, only stores that have a matching product are returned.
+    """
+    try:
+        ensure_loaded()
+
+        accept_product = product_filter(category, in_stock)
+        if accept_product is None:
+            accept = None
+        else:
+            def accept(store_id: str) -> bool:
+                return any(accept_product(product_id) for product_id in nearby_index.store_products.get(store_id, ()))
+
+        stores = []
+        for distance, store_id in query_grid(nearby_index.stores, lat, lon, radius_km, limit, accept):
+            store = product_catalog.stores.get(store_id)
+            if store is not None:
+                stores.append({**store, "distance_km": round(distance, 3)})
+
+        return {"stores": stores}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching nearby stores: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching nearby stores: {str(e)}")
+
+@router.get("/products")
+async def nearby_products(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_NEARBY_RADIUS_KM),
+    limit: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None,
+    in_stock: Optional[bool] = None
+):
+    """
+    Find the products nearest to a point, optionally within radius_km.
+
+    Products without coordinates of their own are located at their store.
+    """
+    try:
+        ensure_loaded()
+
+        products = []
+        for distance, product_id in query_grid(
+            nearby_index.products, lat, lon, radius_km, limit, product_filter(category, in_stock)
+        ):
+            product = product_catalog.product_with_store(product_id)
+            if product is not None:
+                product["distance_km"] = round(distance, 3)
+                products.append(product)
+
+        # Fetch ratings for the returned products in one query
+        attach_rating_stats(products)
+
+        return {"products": products}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching nearby products: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching nearby products: {str(e)}")
@@ -0,0 +1,380 @@
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Path, BackgroundTasks
+from app.db.database import supabase_client, SUPABASE_URL
+from app.schemas.product import Products
+from app.auth.auth_handler import get_current_user
+from app.utils.activity_logger import log_admin_activity
+from app.utils.jobs import job_registry
+from app.utils.product_catalog import product_catalog
+from app.utils.signed_uploads import IMAGE_TYPES, MAX_IMAGE_BYTES
+from app.utils.storage import remove_storage_objects
+from pydantic import ValidationError
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+import asyncio
+import csv
+import httpx
+import ipaddress
+import itertools
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import uuid
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename='product_import_errors.log'
+)
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Product Import"])
+
+# Default and maximum number of rows inserted per batch
+DEFAULT_IMPORT_CHUNK_SIZE = 500
+MAX_IMPORT_CHUNK_SIZE = 1000
+
+# Maximum number of remote images downloaded at the same time
+IMPORT_IMAGE_CONCURRENCY = 8
+IMPORT_IMAGE_TIMEOUT_SECONDS = 20
+
+# Redirects followed per image; every hop is checked like the original URL
+IMPORT_IMAGE_MAX_REDIRECTS = 5
+
+# Columns copied from a validated row into the products table (rating is not stored)
+PRODUCT_COLUMNS = [
+    "name", "description", "category", "price_min", "price_max", "location_name", "address",
+    "latitude", "longitude", "ar_asset_url", "image_urls", "in_stock", "store_id", "town"
+]
+
+def iter_rows(path: str, file_format: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Stream rows from a CSV or NDJSON file without loading it into memory.
+
+    Yields (row_number, row) pairs; row numbers are 1-based data rows.
+    """
+    with open(path, "r", encoding="utf-8-sig", newline="") as source:
+        if file_format == "csv":
+            for row_number, row in enumerate(csv.DictReader(source), start=1):
+                yield row_number, row
+        else:
+            row_number = 0
+            for line in source:
+                if not line.strip():
+                    continue
+                row_number += 1
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    row = {"__parse_error__": f"Invalid JSON: {str(e)}"}
+                yield row_number, row
+
+def parse_image_urls(value) -> List[str]:
+    """Accept a list, a JSON array string or a '|' separated string of image URLs."""
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return [str(url).strip() for url in value if str(url).strip()]
+    value = str(value).strip()
+    if value.startswith("["):
+        return [str(url).strip() for url in json.loads(value) if str(url).strip()]
+    return [url.strip() for url in value.split("|") if url.strip()]
+
+def normalize_row(row: dict, default_store_id: Optional[str]) -> dict:
+    """Turn a raw CSV/NDJSON row into the shape expected by the Products schema."""
+    if "__parse_error__" in row:
+        raise ValueError(row["__parse_error__"])
+
+    normalized = {key.strip(): value for key, value in row.items() if key is not None}
+    normalized = {key: value for key, value in normalized.items() if value not in ("", None)}
+
+    normalized.setdefault("store_id", default_store_id)
+    normalized.setdefault("ar_asset_url", "")
+    normalized.setdefault("rating", 0.0)
+    normalized.setdefault("in_stock", True)
+    normalized.setdefault("location_name", "")
+    normalized["image_urls"] = parse_image_urls(normalized.get("image_urls"))
+
+    # Coordinates are stored as strings
+    for field in ("latitude", "longitude"):
+        if field in normalized:
+            normalized[field] = str(normalized[field])
+
+    return normalized
+
+def read_rows(rows: Iterator[Tuple[int, dict]], count: int, default_store_id: Optional[str]) -> Tuple[int, list, list]:
+    """
+    Read and validate up to `count` rows; runs in a worker thread.
+
+    Returns the number of rows read, the valid (row_number, product) pairs and
+    the errors of the invalid rows.
+    """
+    read = 0
+    valid = []
+    errors = []
+    for row_number, row in itertools.islice(rows, count):
+        read += 1
+        try:
+            product = Products(**normalize_row(row, default_store_id))
+            valid.append((row_number, product.model_dump(mode="json", include=set(PRODUCT_COLUMNS))))
+        except (ValidationError, ValueError, TypeError) as e:
+            errors.append({"row": row_number, "error": str(e)})
+    return read, valid, errors
+
+def is_storage_url(url: str) -> bool:
+    """Check whether an image URL already points to our Supabase storage."""
+    return bool(SUPABASE_URL) and url.startswith(SUPABASE_URL)
+
+async def check_public_url(url: str) -> None:
+    """Refuse URLs that are not http(s) or whose host resolves to a private, loopback or link-local address."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"URL {url} is not an http(s) URL")
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(parts.hostname, None, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"Host of {url} could not be resolved")
+    for address in addresses:
+        ip = ipaddress.ip_address(address[4][0].split("%", 1)[0])
+        if not ip.is_global:
+            raise ValueError(f"URL {url} points to a non-public address")
+
+async def fetch_and_store_image(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str, image_path: str) -> str:
+    """
+    Download a remote image and upload it to test-bucket, returning its public URL.
+
+    Redirects are followed by hand so every hop is checked with check_public_url.
+    The body is streamed and refused once it passes MAX_IMAGE_BYTES.
+    """
+    async with semaphore:
+        for _ in range(IMPORT_IMAGE_MAX_REDIRECTS + 1):
+            await check_public_url(url)
+            async with client.stream("GET", url) as response:
+                if response.is_redirect:
+                    url = str(response.url.join(response.headers["location"]))
+                    continue
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "application/octet-stream").split(";")[0].strip().lower()
+                if content_type not in IMAGE_TYPES:
+                    raise ValueError(f"URL {url} did not return an accepted image type ({content_type})")
+                if int(response.headers.get("content-length") or 0) > MAX_IMAGE_BYTES:
+                    raise ValueError(f"Image at {url} exceeds {MAX_IMAGE_BYTES} bytes")
+
+                content = bytearray()
+                async for piece in response.aiter_bytes():
+                    content.extend(piece)
+                    if len(content) > MAX_IMAGE_BYTES:
+                        raise ValueError(f"Image at {url} exceeds {MAX_IMAGE_BYTES} bytes")
+                break
+        else:
+            raise ValueError(f"URL {url} redirected more than {IMPORT_IMAGE_MAX_REDIRECTS} times")
+
+        await asyncio.to_thread(
+            supabase_client.storage.from_("test-bucket").upload,
+            path=image_path,
+            file=bytes(content),
+            file_options={"content-type": content_type}
+        )
+        return supabase_client.storage.from_("test-bucket").get_public_url(image_path)
+
+async def store_row_images(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, product: dict) -> List[str]:
+    """
+    Replace remote image URLs of a product with copies in our storage, concurrently.
+
+    Returns the storage paths that were written. If any image fails, the copies
+    already made for the row are removed and the first error is raised.
+    """
+    product_id = str(uuid.uuid4())
+    image_urls = list(product["image_urls"])
+    remote_images = [
+        (i, url, f"product-images/products/{product_id}/{i}_{uuid.uuid4()}")
+        for i, url in enumerate(image_urls) if not is_storage_url(url)
+    ]
+
+    results = await asyncio.gather(
+        *(fetch_and_store_image(client, semaphore, url, image_path) for _, url, image_path in remote_images),
+        return_exceptions=True
+    )
+    stored_paths = [image_path for (_, _, image_path), result in zip(remote_images, results) if not isinstance(result, Exception)]
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        await asyncio.to_thread(remove_storage_objects, stored_paths)
+        raise errors[0]
+
+    for (i, _, _), stored_url in zip(remote_images, results):
+        image_urls[i] = stored_url
+    product["image_urls"] = image_urls
+    return stored_paths
+
+async def existing_store_ids(store_ids: Iterable[str]) -> Set[str]:
+    """The given store ids that exist, from the catalog and one query for the ones it does not know."""
+    store_ids = {str(store_id) for store_id in store_ids if store_id}
+    existing = {store_id for store_id in store_ids if store_id in product_catalog.stores}
+    unknown = list(store_ids - existing)
+    if unknown:
+        response = await asyncio.to_thread(
+            lambda: supabase_client.table("stores").select("store_id").in_("store_id", unknown).execute()
+        )
+        existing.update(str(store["store_id"]) for store in response.data or [])
+    return existing
+
+async def insert_rows(job_id: str, rows: List[Tuple[int, dict]]) -> List[Tuple[int, dict]]:
+    """
+    Insert rows in one statement and return the inserted (row_number, product) pairs.
+
+    A failed insert is split in halves and retried, so only the rows that fail
+    on their own get an error, after log2(len(rows)) extra statements per bad row.
+    """
+    try:
+        response = await asyncio.to_thread(
+            lambda: supabase_client.table("products").insert([product for _, product in rows]).execute()
+        )
+        if not response.data:
+            raise ValueError("Supabase returned no data after insert")
+        return list(zip([row_number for row_number, _ in rows], response.data))
+    except Exception as e:
+        if len(rows) == 1:
+            job_registry.add_error(job_id, {"row": rows[0][0], "error": f"Insert failed: {str(e)}"})
+            return []
+        logger.warning(f"Import batch of {len(rows)} rows failed for job {job_id}, retrying in halves: {str(e)}")
+        middle = len(rows) // 2
+        return await insert_rows(job_id, rows[:middle]) + await insert_rows(job_id, rows[middle:])
+
+async def insert_batch(job_id: str, batch: List[Tuple[int, dict]], client: httpx.AsyncClient, semaphore: asyncio.Semaphore) -> int:
+    """Check the stores of a batch, fetch its images concurrently and insert its rows."""
+    # Reject rows of unknown stores before downloading their images
+    stores = await existing_store_ids(product["store_id"] for _, product in batch)
+    known = []
+    for row_number, product in batch:
+        if str(product["store_id"]) in stores:
+            known.append((row_number, product))
+        else:
+            job_registry.add_error(job_id, {"row": row_number, "error": f"Store {product['store_id']} does not exist"})
+
+    image_results = await asyncio.gather(
+        *(store_row_images(client, semaphore, product) for _, product in known),
+        return_exceptions=True
+    )
+
+    ready = []
+    stored_paths = {}
+    for (row_number, product), image_result in zip(known, image_results):
+        if isinstance(image_result, Exception):
+            job_registry.add_error(job_id, {"row": row_number, "error": f"Image fetch failed: {str(image_result)}"})
+        else:
+            ready.append((row_number, product))
+            stored_paths[row_number] = image_result
+
+    if not ready:
+        return 0
+
+    inserted = await insert_rows(job_id, ready)
+
+    # Remove the images copied for rows that were not inserted
+    inserted_rows = {row_number for row_number, _ in inserted}
+    orphaned = [path for row_number, paths in stored_paths.items() if row_number not in inserted_rows for path in paths]
+    if orphaned:
+        await asyncio.to_thread(remove_storage_objects, orphaned)
+
+    # Keep the in-memory catalog in sync
+    product_catalog.upsert_products([product for _, product in inserted])
+    return len(inserted)
+
+async def run_product_import(job_id: str, path: str, file_format: str, default_store_id: Optional[str], chunk_size: int, current_user: dict):
+    """Background task that streams, validates and batch-inserts an import file."""
+    job_registry.update(job_id, status="running")
+    rows_read = 0
+    rows_inserted = 0
+    rows_invalid = 0
+    rows = iter_rows(path, file_format)
+
+    try:
+        semaphore = asyncio.Semaphore(IMPORT_IMAGE_CONCURRENCY)
+        async with httpx.AsyncClient(timeout=IMPORT_IMAGE_TIMEOUT_SECONDS, follow_redirects=False) as client:
+            while True:
+                # Parse and validate each chunk in a worker thread to keep the event loop free
+                read, batch, errors = await asyncio.to_thread(read_rows, rows, chunk_size, default_store_id)
+                if not read:
+                    break
+                rows_read += read
+                rows_invalid += len(errors)
+                for error in errors:
+                    job_registry.add_error(job_id, error)
+
+                if batch:
+                    rows_inserted += await insert_batch(job_id, batch, client, semaphore)
+                job_registry.set_progress(job_id, rows_read=rows_read, rows_inserted=rows_inserted, rows_invalid=rows_invalid)
+
+        job_registry.set_progress(job_id, rows_read=rows_read, rows_inserted=rows_inserted, rows_invalid=rows_invalid)
+
+        # Log a single admin activity for the whole import
+        if rows_inserted:
+            await log_admin_activity(current_user, "added", f"{rows_inserted} products (import)")
+
+        job_registry.update(job_id, status="completed", result={"rows_inserted": rows_inserted})
+        logger.info(f"Product import job {job_id} completed: {rows_inserted} of {rows_read} rows inserted")
+
+    except Exception as e:
+        logger.error(f"Product import job {job_id} failed: {str(e)}", exc_info=True)
+        job_registry.set_progress(job_id, rows_read=rows_read, rows_inserted=rows_inserted, rows_invalid=rows_invalid)
+        job_registry.update(job_id, status="failed", result={"error": str(e)})
+    finally:
+        rows.close()
+        os.unlink(path)
+
+@router.post("/admin/import-products", status_code=202)
+async def import_products(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    store_id: Optional[str] = Form(None),
+    chunk_size: int = Form(DEFAULT_IMPORT_CHUNK_SIZE),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Start a bulk product import from a CSV or NDJSON file.
+
+    Each row uses the products columns; image_urls may be a JSON array or a '|' separated
+    list, and store_id falls back to the store_id form field. The file is processed in
+    the background; poll /admin/import-products/{job_id} for progress and row errors.
+    """
+    try:
+        filename = (file.filename or "").lower()
+        if filename.endswith(".csv"):
+            file_format = "csv"
+        elif filename.endswith(".ndjson") or filename.endswith(".jsonl"):
+            file_format = "ndjson"
+        else:
+            raise HTTPException(status_code=400, detail="File must be a .csv, .ndjson or .jsonl file")
+
+        if chunk_size < 1 or chunk_size > MAX_IMPORT_CHUNK_SIZE:
+            raise HTTPException(status_code=400, detail=f"chunk_size must be between 1 and {MAX_IMPORT_CHUNK_SIZE}")
+
+        # Spool the upload to disk so it can be streamed after the request has finished
+        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_format}") as spooled:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, spooled)
+            path = spooled.name
+
+        job = await job_registry.create("product_import", filename=file.filename, format=file_format)
+        background_tasks.add_task(run_product_import, job["job_id"], path, file_format, store_id, chunk_size, current_user)
+
+        logger.info(f"Queued product import job {job['job_id']} for file {file.filename}")
+        return {"message": "Product import started", "job_id": job["job_id"]}
+
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        logger.error(f"Error starting product import: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error starting product import: {str(e)}")
+
+@router.get("/admin/import-products/{job_id}")
+async def get_product_import_status(job_id: str = Path(...), _: dict = Depends(get_current_user)):
+    """
+    Get the progress and row-level errors of a product import job.
+    """
+    job = await job_registry.get(job_id)
+    if not job or job["type"] != "product_import":
+        raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
+    return {"job": job}
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Path
 from app.db.database import supabase_client
-from app.schemas.product import Products
+from app.schemas.product import Products, AdminProductPatch
 from app.auth.auth_handler import get_current_user
 from app.utils.activity_logger import log_admin_activity
+from app.utils.product_catalog import product_catalog
+from app.utils.image_hashes import image_hash_index
+from app.utils.conditional_writes import update_where, delete_where, changed_values, unchanged_row
+from app.utils.storage import remove_storage_objects
 from typing import List, Optional
 import uuid
 import json
@@ -60,6 +64,7 @@ async def add_product(
         
         # Upload images to 'product-images' folder in test-bucket
         image_urls = []
+        uploaded_images = []
         for i, image in enumerate(images):
             try:
                 image_path = f"product-images/products/{product_id}/{i}_{uuid.uuid4()}"
@@ -74,6 +79,7 @@ async def add_product(
                 
                 image_url = supabase_client.storage.from_("test-bucket").get_public_url(image_path)
                 image_urls.append(image_url)
+                uploaded_images.append((image_url, content))
                 logger.debug(f"Successfully uploaded image {i}: {image_url}")
             except Exception as img_error:
                 logger.error(f"Failed to upload image {i}: {str(img_error)}", exc_info=True)
@@ -123,6 +129,12 @@ async def add_product(
             logger.error("Supabase returned no data after insert")
             raise HTTPException(status_code=500, detail="Failed to add product")
         
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_products(response.data)
+        
+        # Hash the uploaded images in the background for duplicate detection
+        image_hash_index.schedule_product_images(response.data[0]["id"], store_id, uploaded_images, image_urls)
+        
         # Log admin activity for adding product
         await log_admin_activity(current_user, "added", name)
         
@@ -188,15 +200,6 @@ async def update_product(
     try:
         logger.info(f"Starting product update for product_id: {product_id}")
         
-        # First, check if the product exists
-        product_response = supabase_client.table("products").select("*").eq("id", product_id).execute()
-        
-        if not product_response.data or len(product_response.data) == 0:
-            logger.error(f"Product with ID {product_id} not found")
-            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
-        
-        existing_product = product_response.data[0]
-        
         # Parse the keep_images JSON string to get the list of image URLs to keep
         try:
             keep_image_urls = json.loads(keep_images)
@@ -208,6 +211,8 @@ async def update_product(
         
         # Prepare the final list of image URLs (kept + new)
         final_image_urls = keep_image_urls.copy()
+        uploaded_images = []
+        uploaded_paths = []
         
         # Upload new images if any
         if images:
@@ -225,13 +230,15 @@ async def update_product(
                     
                     image_url = supabase_client.storage.from_("test-bucket").get_public_url(image_path)
                     final_image_urls.append(image_url)
+                    uploaded_images.append((image_url, content))
+                    uploaded_paths.append(image_path)
                     logger.debug(f"Successfully uploaded new image {i}: {image_url}")
                 except Exception as img_error:
                     logger.error(f"Failed to upload new image {i}: {str(img_error)}", exc_info=True)
                     raise
         
-        # Handle AR asset
-        ar_asset_url = existing_product.get("ar_asset_url", "") if keep_ar_asset else ""
+        # Handle AR asset; the existing one is kept by leaving the column out of the update
+        ar_asset_url = ""
         
         # Upload new AR asset if provided and not keeping existing
         if ar_asset and not keep_ar_asset:
@@ -246,6 +253,7 @@ async def update_product(
                     file_options={"content-type": ar_asset.content_type}
                 )
                 ar_asset_url = supabase_client.storage.from_("test-bucket").get_public_url(ar_asset_path)
+                uploaded_paths.append(ar_asset_path)
                 logger.debug(f"Successfully uploaded new AR asset: {ar_asset_url}")
             except Exception as ar_error:
                 logger.error(f"Failed to upload new AR asset: {str(ar_error)}", exc_info=True)
@@ -262,51 +270,111 @@ async def update_product(
             "address": address,
             "latitude": latitude,
             "longitude": longitude,
-            "ar_asset_url": ar_asset_url,
             "image_urls": final_image_urls,
             "in_stock": in_stock,
             "store_id": store_id,
             "town": town
         }
+        if not keep_ar_asset:
+            product_data["ar_asset_url"] = ar_asset_url
         
         logger.debug(f"Updating product data: {json.dumps(product_data)}")
-        response = supabase_client.table("products").update(product_data).eq("id", product_id).execute()
+        updated = update_where("products", product_data, id=product_id)
         
-        if not response.data:
-            logger.error("Supabase returned no data after update")
-            raise HTTPException(status_code=500, detail="Failed to update product")
+        if not updated:
+            logger.error(f"Product with ID {product_id} not found")
+            remove_storage_objects(uploaded_paths)
+            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+        
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_products(updated)
+        
+        # Hash the uploaded images in the background for duplicate detection
+        image_hash_index.schedule_product_images(product_id, store_id, uploaded_images, final_image_urls)
         
         # Log admin activity for updating product
         await log_admin_activity(current_user, "edited", name)
         
         logger.info(f"Successfully updated product with ID: {product_id}")
-        return {"message": "Product updated successfully", "product": response.data[0]}
+        return {"message": "Product updated successfully", "product": updated[0]}
         
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
     except Exception as e:
         logger.error(f"Error updating product: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error updating product: {str(e)}")
 
+@router.patch("/update_product/{product_id}")
+async def patch_product(
+    changes: AdminProductPatch,
+    product_id: int = Path(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Partially update a product.
+
+    Only the fields present in the body are written; the write is skipped when the
+    database already holds them all. New images are uploaded with the PUT endpoint;
+    image_urls here can reorder or drop existing images.
+    """
+    try:
+        values = changes.model_dump(mode="json", exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="No fields to update")
+
+        current = product_catalog.products.get(product_id)
+        # The cached row may be stale; only skip the write when the database agrees
+        if not changed_values(current, values):
+            unchanged = unchanged_row("products", values, id=product_id)
+            if unchanged is not None:
+                logger.info(f"No changes for product with ID: {product_id}")
+                return {"message": "Product is unchanged", "product": unchanged}
+
+        logger.debug(f"Patching product {product_id}: {json.dumps(values)}")
+        updated = update_where("products", values, id=product_id)
+
+        if not updated:
+            logger.error(f"Product with ID {product_id} not found")
+            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_products(updated)
+
+        # Drop the hashes of images the product no longer uses
+        if "image_urls" in values:
+            image_hash_index.schedule_product_images(product_id, updated[0].get("store_id"), [], values["image_urls"])
+
+        # Log admin activity for updating product
+        await log_admin_activity(current_user, "edited", updated[0].get("name", f"Product {product_id}"))
+
+        logger.info(f"Successfully patched product with ID: {product_id} ({', '.join(values)})")
+        return {"message": "Product updated successfully", "product": updated[0]}
+
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        logger.error(f"Error patching product: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error updating product: {str(e)}")
+
 @router.delete("/delete_product/{product_id}")
 async def delete_product(product_id: int = Path(...), current_user: dict = Depends(get_current_user)):
     try:
         logger.info(f"Starting product deletion for product_id: {product_id}")
         
-        # First, check if the product exists and get its name for logging
-        product_response = supabase_client.table("products").select("*").eq("id", product_id).execute()
+        # Delete the product from the database; the deleted row tells whether it
+        # existed and gives its name for logging
+        deleted = delete_where("products", id=product_id)
         
-        if not product_response.data or len(product_response.data) == 0:
+        if not deleted:
             logger.error(f"Product with ID {product_id} not found")
             raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
         
-        existing_product = product_response.data[0]
-        product_name = existing_product.get("name", f"Product {product_id}")
-        
-        # Delete the product from the database
-        delete_response = supabase_client.table("products").delete().eq("id", product_id).execute()
+        product_name = deleted[0].get("name", f"Product {product_id}")
         
-        if not delete_response.data:
-            logger.error(f"Failed to delete product with ID {product_id}")
-            raise HTTPException(status_code=500, detail="Failed to delete product")
+        # Keep the in-memory catalog in sync
+        product_catalog.remove_products([product_id])
         
         # Log admin activity for deleting product
         await log_admin_activity(current_user, "deleted", product_name)
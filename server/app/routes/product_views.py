@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Path
+from app.utils.product_catalog import product_catalog
+from app.utils.view_counter import view_counter
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Product Views"])
+
+@router.post("/record_product_view/{product_id}", status_code=202)
+async def record_product_view(product_id: int = Path(..., ge=1)):
+    """
+    Record a view of a product.
+
+    The view is counted in memory and written to products.views by the periodic
+    batched flush, so this endpoint never touches the database. Once the catalog
+    is loaded, views of products it does not know are refused.
+    """
+    if product_catalog.loaded and product_id not in product_catalog.products:
+        raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+
+    try:
+        if not view_counter.increment(product_id):
+            raise HTTPException(status_code=429, detail="Too many pending product views; try again later")
+        return {"message": "View recorded"}
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error recording product view: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error recording product view: {str(e)}")
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException
+from app.utils.product_catalog import product_catalog
+from app.utils.recommendations import item_recommender
+from app.utils.rating_stats import attach_rating_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/recommendations", tags=["Recommendations"])
+
+@router.get("/{product_id}")
+async def fetch_recommendations(product_id: int):
+    """
+    Get products that were rated by the same reviewers as a product.
+
+    Served from the precomputed item-item cosine neighbours of the review matrix.
+    """
+    try:
+        if not item_recommender.loaded or not product_catalog.loaded:
+            raise HTTPException(status_code=503, detail="Recommendations are not ready yet")
+
+        products = []
+        for recommended_id, similarity in item_recommender.recommend(product_id):
+            # Skip products that were archived or deleted since the model was built
+            product = product_catalog.product_with_store(recommended_id)
+            if product is not None:
+                product["similarity"] = round(similarity, 4)
+                products.append(product)
+
+        attach_rating_stats(products)
+
+        return {"recommendations": products}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching recommendations for product {product_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching recommendations: {str(e)}")
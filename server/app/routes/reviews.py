@@ -3,6 +3,8 @@ import logging
 from app.db.database import supabase_client
 from app.schemas.review import ReviewCreate, ReviewResponse
 from app.auth.auth_handler import get_current_user
+from app.utils.product_catalog import product_catalog
+from app.utils.recommendations import item_recommender
 from typing import List
 
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
@@ -30,6 +32,20 @@ async def create_review(review: ReviewCreate, user=Depends(get_current_user)):
         )
         logger.debug(f"Insert response: {response.data}")
 
+        # Keep the in-memory rating stats and recommendations in sync
+        if response.data:
+            # The stats are read back rather than added to, so a catalog reload can apply them again
+            stats_response = (
+                supabase_client.table("product_rating_stats")
+                .select("review_count, rating_sum")
+                .eq("product_id", review.product_id)
+                .execute()
+            )
+            if stats_response.data:
+                stats = stats_response.data[0]
+                product_catalog.set_rating_stats(review.product_id, stats["review_count"], stats["rating_sum"])
+            item_recommender.add_review(user["id"], review.product_id, review.rating)
+
         return {"message": "Review submitted successfully", "review": response.data[0] if response.data else response.data}
     except HTTPException as e:
         raise e
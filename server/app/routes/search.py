@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.utils.product_catalog import product_catalog
+from app.utils.search_index import product_search_index
+from app.utils.rating_stats import attach_rating_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+@router.get("/products")
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """
+    Full-text search over product name, description, category and store name.
+
+    Answered from the in-memory inverted index with prefix matching and BM25 ranking.
+    """
+    try:
+        if not product_catalog.loaded:
+            raise HTTPException(status_code=503, detail="Search index is not ready yet")
+
+        results = product_search_index.search(q, limit)
+
+        products = []
+        for product_id, score in results:
+            product = product_catalog.product_with_store(product_id)
+            if product is not None:
+                product["score"] = round(score, 4)
+                products.append(product)
+
+        # Fetch ratings for the returned products in one query
+        attach_rating_stats(products)
+
+        return {"products": products}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error searching products: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error searching products: {str(e)}")
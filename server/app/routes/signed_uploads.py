@@ -0,0 +1,232 @@
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel
+from app.db.database import supabase_client
+from app.auth.auth_handler import get_current_user
+from app.routes.store_user_auth import get_store_user_identity
+from app.utils.activity_logger import log_admin_activity
+from app.utils.conditional_writes import update_where, row_exists
+from app.utils.image_hashes import image_hash_index
+from app.utils.product_catalog import product_catalog
+from app.utils.rate_limit import RateLimiter
+from app.utils.signed_uploads import (
+    create_upload_grant, decode_grant, verify_uploaded_object, remove_object, SignedUploadError,
+    APPLICANT_OWNER, DOCUMENT_KINDS
+)
+from typing import Optional
+import asyncio
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Signed Uploads"])
+
+# Kinds that attach to a product or a store
+PRODUCT_KINDS = ("product_image", "ar_asset")
+STORE_KINDS = ("store_image",)
+
+# Document upload URLs each client address may request per window; the endpoint needs no login
+DOCUMENT_UPLOAD_URL_LIMIT = int(os.getenv("DOCUMENT_UPLOAD_URL_LIMIT", "20"))
+DOCUMENT_UPLOAD_URL_WINDOW_SECONDS = float(os.getenv("DOCUMENT_UPLOAD_URL_WINDOW_SECONDS", "3600"))
+
+document_upload_url_limiter = RateLimiter(DOCUMENT_UPLOAD_URL_LIMIT, DOCUMENT_UPLOAD_URL_WINDOW_SECONDS)
+
+class UploadUrlRequest(BaseModel):
+    kind: str
+    target_id: str  # Product id for product_image/ar_asset, store_id for store_image
+    content_type: str
+    size: Optional[int] = None
+
+class DocumentUploadUrlRequest(BaseModel):
+    kind: str  # business_permit, valid_id or dti_registration
+    content_type: str
+    size: Optional[int] = None
+
+class UploadFinalize(BaseModel):
+    upload_token: str
+
+def upload_http_error(e: SignedUploadError) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail)
+
+def check_upload_target(body: UploadUrlRequest) -> None:
+    """Reject unknown kinds and product targets that are not product ids."""
+    if body.kind not in PRODUCT_KINDS + STORE_KINDS:
+        raise SignedUploadError(400, f"Unknown upload kind: {body.kind}")
+    if body.kind in PRODUCT_KINDS:
+        try:
+            int(body.target_id)
+        except ValueError:
+            raise SignedUploadError(400, f"target_id must be a product ID for {body.kind}")
+
+def attach_upload(grant: dict, store_id: Optional[str] = None) -> dict:
+    """
+    Verify a finished direct upload and attach it to its product or store.
+
+    With store_id the product or store must belong to that store. Returns the
+    updated row under "product" or "store".
+    """
+    meta = verify_uploaded_object(grant)
+    bucket, path, kind = grant["bucket"], grant["path"], grant["kind"]
+    url = supabase_client.storage.from_(bucket).get_public_url(path)
+
+    if kind in STORE_KINDS:
+        filters = {"store_id": grant["target"]}
+        updated = update_where("stores", {"store_image": url}, **filters)
+        if not updated:
+            remove_object(bucket, path)
+            raise SignedUploadError(404, f"Store with ID {grant['target']} not found")
+        product_catalog.upsert_stores(updated)
+        return {"store": updated[0], "url": url, **meta}
+
+    product_id = int(grant["target"])
+    filters = {"id": product_id}
+    if store_id is not None:
+        filters["store_id"] = store_id
+
+    if kind == "ar_asset":
+        updated = update_where("products", {"ar_asset_url": url}, **filters)
+    else:
+        # Append in the database so concurrent uploads to one product all keep their image
+        params = {"p_product_id": product_id, "p_image_url": url}
+        if store_id is not None:
+            params["p_store_id"] = store_id
+        updated = supabase_client.rpc("append_product_image", params).execute().data or []
+
+    if not updated:
+        remove_object(bucket, path)
+        if store_id is not None and row_exists("products", "id", product_id):
+            raise SignedUploadError(403, "You don't have permission to update this product")
+        raise SignedUploadError(404, f"Product with ID {product_id} not found")
+
+    # Keep the in-memory catalog in sync
+    product_catalog.upsert_products(updated)
+
+    # Hash the new image in the background for duplicate detection
+    if kind == "product_image":
+        image_hash_index.schedule_stored_image(
+            product_id, updated[0].get("store_id"), bucket, path, url, updated[0].get("image_urls") or []
+        )
+
+    logger.info(f"Attached direct upload {bucket}/{path} to product {product_id}")
+    return {"product": updated[0], "url": url, **meta}
+
+# Admin endpoints
+
+@router.post("/upload-urls")
+async def create_upload_url(body: UploadUrlRequest, current_user: dict = Depends(get_current_user)):
+    """
+    Issue a signed URL to upload a product image, AR asset or store image straight to storage.
+
+    Upload the file to upload_url (with storage_token), then call
+    /upload-urls/finalize with upload_token to attach it.
+    """
+    try:
+        check_upload_target(body)
+        return await asyncio.to_thread(
+            create_upload_grant, body.kind, body.target_id, f"admin:{current_user.get('id')}", body.content_type, body.size
+        )
+    except SignedUploadError as e:
+        raise upload_http_error(e)
+    except Exception as e:
+        logger.error(f"Error creating upload URL: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error creating upload URL: {str(e)}")
+
+@router.post("/upload-urls/finalize")
+async def finalize_upload(body: UploadFinalize, current_user: dict = Depends(get_current_user)):
+    """Check a direct upload's type and size and attach it to its product or store."""
+    try:
+        grant = decode_grant(body.upload_token, f"admin:{current_user.get('id')}")
+        result = await asyncio.to_thread(attach_upload, grant)
+
+        # Log admin activity for the edited product or store
+        if "store" in result:
+            await log_admin_activity(current_user, "edited", result["store"].get("name", "Store"), "Store")
+        else:
+            await log_admin_activity(current_user, "edited", result["product"].get("name", "Product"))
+
+        return {"message": "Upload attached successfully", **result}
+    except SignedUploadError as e:
+        raise upload_http_error(e)
+    except Exception as e:
+        logger.error(f"Error finalizing upload: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error finalizing upload: {str(e)}")
+
+# Store user endpoints
+
+def store_user_owner(identity: dict) -> str:
+    return f"store_user:{identity['store_user'].get('id')}"
+
+@router.post("/store-user/upload-urls")
+async def create_store_user_upload_url(body: UploadUrlRequest, identity: dict = Depends(get_store_user_identity)):
+    """Issue a signed URL to upload media of the store user's products or store straight to storage."""
+    try:
+        store_id = identity["store_id"]
+        if not store_id:
+            raise SignedUploadError(400, "You don't have a store")
+
+        check_upload_target(body)
+        if body.kind in STORE_KINDS:
+            if body.target_id != store_id:
+                raise SignedUploadError(403, "You do not have permission to update this store")
+        else:
+            response = await asyncio.to_thread(
+                lambda: supabase_client.table("products").select("id").eq("id", body.target_id).eq(
+                    "store_id", store_id
+                ).execute()
+            )
+            if not response.data:
+                raise SignedUploadError(403, "You don't have permission to update this product")
+
+        return await asyncio.to_thread(
+            create_upload_grant, body.kind, body.target_id, store_user_owner(identity), body.content_type, body.size
+        )
+    except SignedUploadError as e:
+        raise upload_http_error(e)
+    except Exception as e:
+        logger.error(f"Error creating upload URL: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error creating upload URL: {str(e)}")
+
+@router.post("/store-user/upload-urls/finalize")
+async def finalize_store_user_upload(body: UploadFinalize, identity: dict = Depends(get_store_user_identity)):
+    """Check a direct upload's type and size and attach it to the store user's product or store."""
+    try:
+        store_id = identity["store_id"]
+        if not store_id:
+            raise SignedUploadError(400, "You don't have a store")
+
+        grant = decode_grant(body.upload_token, store_user_owner(identity))
+        result = await asyncio.to_thread(attach_upload, grant, store_id)
+        return {"message": "Upload attached successfully", **result}
+    except SignedUploadError as e:
+        raise upload_http_error(e)
+    except Exception as e:
+        logger.error(f"Error finalizing upload: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error finalizing upload: {str(e)}")
+
+# Seller application documents
+
+@router.post("/seller-application/upload-urls")
+async def create_document_upload_url(body: DocumentUploadUrlRequest, request: Request):
+    """
+    Issue a signed URL to upload a seller application document straight to storage.
+
+    Pass the returned upload_token to /seller-application in place of the file.
+    Requests are limited per client address, and documents that are never
+    submitted are removed by the application document sweeper.
+    """
+    client = request.client.host if request.client else "unknown"
+    if not document_upload_url_limiter.allow(client):
+        raise HTTPException(status_code=429, detail="Too many upload requests; try again later")
+
+    try:
+        if body.kind not in DOCUMENT_KINDS:
+            raise SignedUploadError(400, f"Unknown document kind: {body.kind}")
+        return await asyncio.to_thread(
+            create_upload_grant, body.kind, str(uuid.uuid4()), APPLICANT_OWNER, body.content_type, body.size
+        )
+    except SignedUploadError as e:
+        raise upload_http_error(e)
+    except Exception as e:
+        logger.error(f"Error creating document upload URL: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error creating upload URL: {str(e)}")
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, HTTPException, Query
+from app.utils.product_catalog import product_catalog
+from app.utils.store_clusters import store_cluster_index, MIN_CLUSTER_ZOOM, MAX_CLUSTER_ZOOM
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/stores", tags=["Store Clusters"])
+
+@router.get("/clusters")
+async def fetch_store_clusters(
+    west: float = Query(..., ge=-180, le=180),
+    south: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    zoom: int = Query(..., ge=MIN_CLUSTER_ZOOM, le=22)
+):
+    """
+    Get store clusters for a map viewport.
+
+    Returns one entry per occupied grid cell of the zoom level inside the bounding
+    box: clusters carry their store count, centroid and highest rated store, and
+    cells with a single store return that store. Zooms above the deepest cluster
+    level use the deepest level.
+    """
+    try:
+        if south > north:
+            raise HTTPException(status_code=400, detail="south must not be greater than north")
+
+        if not product_catalog.loaded:
+            raise HTTPException(status_code=503, detail="Store clusters are not ready yet")
+
+        clusters = store_cluster_index.clusters(
+            min(zoom, MAX_CLUSTER_ZOOM), west, south, east, north, product_catalog
+        )
+        return {"zoom": zoom, "clusters": clusters}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching store clusters: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error fetching store clusters: {str(e)}")
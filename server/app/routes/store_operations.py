@@ -1,9 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Path
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Path, Query, BackgroundTasks
 from app.db.database import supabase_client
-from app.schemas.stores import Store
+from app.schemas.stores import Store, StorePatch
 from app.auth.auth_handler import get_current_user
 from app.utils.activity_logger import log_admin_activity
+from app.utils.product_catalog import product_catalog
+from app.utils.jobs import job_registry
+from app.utils.store_stats import STORE_STATS_SELECT, store_stats_cache, with_store_stats
+from app.utils.conditional_writes import update_where, changed_values, unchanged_row
+from app.utils.storage import storage_path_from_public_url, remove_storage_objects, list_storage_folder
 from typing import List, Optional
+import asyncio
 import uuid
 import json
 import logging
@@ -17,6 +23,9 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Number of products archived or deleted per batch when deleting a store
+STORE_DELETION_BATCH_SIZE = 100
+
 @router.post("/add_store")
 async def add_store(
     name: str = Form(...),
@@ -78,6 +87,9 @@ async def add_store(
             logger.error("Supabase returned no data after store insert")
             raise HTTPException(status_code=500, detail="Failed to add store")
         
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_stores(response.data)
+        
         # Log admin activity for adding store
         await log_admin_activity(current_user, "added", name, "Store")
         
@@ -93,8 +105,8 @@ async def fetch_store(store_id: str = Path(...), current_user: dict = Depends(ge
     try:
         logger.info(f"Fetching store with ID: {store_id}")
         
-        # Query the store from the database
-        response = supabase_client.table("stores").select("*").eq("store_id", store_id).execute()
+        # Query the store and its precomputed statistics from the database
+        response = supabase_client.table("stores").select(f"*, {STORE_STATS_SELECT}").eq("store_id", store_id).execute()
         
         if not response.data or len(response.data) == 0:
             logger.error(f"Store with ID {store_id} not found")
@@ -103,7 +115,7 @@ async def fetch_store(store_id: str = Path(...), current_user: dict = Depends(ge
         # Fetch products for this store
         products_response = supabase_client.table("products").select("*").eq("store_id", store_id).execute()
         
-        store = response.data[0]
+        store = with_store_stats(response.data[0])
         store['products'] = products_response.data or []
         
         logger.info(f"Successfully fetched store with ID: {store_id}")
@@ -134,19 +146,9 @@ async def update_store(
     try:
         logger.info(f"Starting store update for store_id: {store_id}")
         
-        # First, check if the store exists
-        store_response = supabase_client.table("stores").select("*").eq("store_id", store_id).execute()
-        
-        if not store_response.data or len(store_response.data) == 0:
-            logger.error(f"Store with ID {store_id} not found")
-            raise HTTPException(status_code=404, detail=f"Store with ID {store_id} not found")
-        
-        existing_store = store_response.data[0]
-        
-        # Handle store image
-        store_image_url = existing_store.get("store_image", "") if keep_image else ""
-        
         # Upload new store image if provided and not keeping existing
+        image_path = None
+        store_image_url = ""
         if store_image and not keep_image:
             try:
                 image_path = f"store-images/{store_id}/{uuid.uuid4()}"
@@ -165,71 +167,296 @@ async def update_store(
                 logger.error(f"Failed to upload new store image: {str(img_error)}", exc_info=True)
                 raise
         
-        # Prepare store update data
+        # Prepare store update data; the current image and rating are kept by
+        # leaving their columns out, so the store does not have to be read first
         store_data = {
             "name": name,
             "description": description,
             "latitude": latitude,
             "longitude": longitude,
-            "rating": rating or existing_store.get("rating", 0.0),
-            "store_image": store_image_url,
             "type": type,
             "operating_hours": operating_hours,
             "phone": phone
         }
+        if rating:
+            store_data["rating"] = rating
+        if not keep_image:
+            store_data["store_image"] = store_image_url
         
         logger.debug(f"Updating store data: {json.dumps(store_data)}")
-        response = supabase_client.table("stores").update(store_data).eq("store_id", store_id).execute()
+        updated = update_where("stores", store_data, store_id=store_id)
         
-        if not response.data:
-            logger.error("Supabase returned no data after store update")
-            raise HTTPException(status_code=500, detail="Failed to update store")
+        if not updated:
+            logger.error(f"Store with ID {store_id} not found")
+            if image_path:
+                remove_storage_objects([image_path])
+            raise HTTPException(status_code=404, detail=f"Store with ID {store_id} not found")
+        
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_stores(updated)
         
         # Log admin activity for updating store
         await log_admin_activity(current_user, "edited", name, "Store")
         
         logger.info(f"Successfully updated store with ID: {store_id}")
-        return {"message": "Store updated successfully", "store": response.data[0]}
+        return {"message": "Store updated successfully", "store": updated[0]}
         
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
     except Exception as e:
         logger.error(f"Error updating store: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error updating store: {str(e)}")
 
-@router.delete("/delete_store/{store_id}")
-async def delete_store(store_id: str = Path(...), current_user: dict = Depends(get_current_user)):
+@router.patch("/update_store/{store_id}")
+async def patch_store(
+    changes: StorePatch,
+    store_id: str = Path(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Partially update a store.
+
+    Only the fields present in the body are written; the write is skipped when the
+    database already holds them all. New store images are uploaded with the PUT endpoint.
+    """
     try:
-        logger.info(f"Starting store deletion for store_id: {store_id}")
-        
-        # First, check if the store exists and get its name for logging
-        store_response = supabase_client.table("stores").select("*").eq("store_id", store_id).execute()
-        
-        if not store_response.data or len(store_response.data) == 0:
+        values = changes.model_dump(mode="json", exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="No fields to update")
+
+        current = product_catalog.stores.get(store_id)
+        # The cached row may be stale; only skip the write when the database agrees
+        if not changed_values(current, values):
+            unchanged = unchanged_row("stores", values, store_id=store_id)
+            if unchanged is not None:
+                logger.info(f"No changes for store with ID: {store_id}")
+                return {"message": "Store is unchanged", "store": unchanged}
+
+        logger.debug(f"Patching store {store_id}: {json.dumps(values)}")
+        updated = update_where("stores", values, store_id=store_id)
+
+        if not updated:
             logger.error(f"Store with ID {store_id} not found")
             raise HTTPException(status_code=404, detail=f"Store with ID {store_id} not found")
-        
-        existing_store = store_response.data[0]
-        store_name = existing_store.get("name", f"Store {store_id}")
-        
-        # Delete associated products first
-        products_delete_response = supabase_client.table("products").delete().eq("store_id", store_id).execute()
-        logger.info(f"Deleted {len(products_delete_response.data or [])} associated products")
-        
-        # Delete the store from the database
-        delete_response = supabase_client.table("stores").delete().eq("store_id", store_id).execute()
-        
+
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_stores(updated)
+
+        # Log admin activity for updating store
+        await log_admin_activity(current_user, "edited", updated[0].get("name", f"Store {store_id}"), "Store")
+
+        logger.info(f"Successfully patched store with ID: {store_id} ({', '.join(values)})")
+        return {"message": "Store updated successfully", "store": updated[0]}
+
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        logger.error(f"Error patching store: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error updating store: {str(e)}")
+
+def product_storage_paths(products: List[dict]) -> List[str]:
+    """Collect the storage object paths of the images and AR assets of products."""
+    paths = []
+    for product in products:
+        for image_url in product.get("image_urls") or []:
+            paths.append(storage_path_from_public_url(image_url))
+        paths.append(storage_path_from_public_url(product.get("ar_asset_url")))
+    return [path for path in paths if path]
+
+async def run_store_deletion(job_id: str, store: dict, permanent: bool, current_user: dict):
+    """
+    Background task that removes a store's products in batches and then the store itself.
+
+    By default products are archived so they can still be restored. With permanent=True
+    their reviews, rows and storage objects are deleted instead. Products that already
+    have an archived copy are left in place, together with the store, and reported in
+    the job result.
+    """
+    store_id = store["store_id"]
+    store_name = store.get("name", f"Store {store_id}")
+    job_registry.update(job_id, status="running")
+
+    products_done = 0
+    products_gone = 0
+    reviews_found = 0
+    objects_removed = 0
+    conflict_ids: List[int] = []
+
+    try:
+        count_response = await asyncio.to_thread(
+            lambda: supabase_client.table("products").select("id", count="exact").eq("store_id", store_id).execute()
+        )
+        total_products = count_response.count or 0
+        job_registry.set_progress(job_id, total_products=total_products, products_done=0)
+
+        while True:
+            # Always take the first page; processed products no longer match the filter
+            def fetch_batch():
+                query = supabase_client.table("products").select("id, name, image_urls, ar_asset_url").eq("store_id", store_id)
+                if conflict_ids:
+                    query = query.not_.in_("id", conflict_ids)
+                return query.limit(STORE_DELETION_BATCH_SIZE).execute()
+
+            batch_response = await asyncio.to_thread(fetch_batch)
+            batch = batch_response.data or []
+            if not batch:
+                break
+
+            product_ids = [product["id"] for product in batch]
+
+            reviews_response = await asyncio.to_thread(
+                lambda: supabase_client.table("reviews").select("id", count="exact").in_("product_id", product_ids).execute()
+            )
+            reviews_found += reviews_response.count or 0
+
+            conflicts = []
+            if permanent:
+                # Reviews and products go in one transaction; storage follows once the rows are gone
+                delete_response = await asyncio.to_thread(
+                    lambda: supabase_client.rpc("delete_products_with_reviews", {"p_product_ids": product_ids}).execute()
+                )
+                deleted = delete_response.data or []
+                processed = len(deleted)
+                # Products missing from the result were deleted by someone else in the meantime
+                gone = len(product_ids) - processed
+                objects_removed += await asyncio.to_thread(remove_storage_objects, product_storage_paths(deleted))
+            else:
+                archive_response = await asyncio.to_thread(
+                    lambda: supabase_client.rpc("archive_products", {
+                        "p_product_ids": product_ids,
+                        "p_archived_by": current_user["id"],
+                        "p_archived_by_type": "admin"
+                    }).execute()
+                )
+                results = archive_response.data or []
+                processed = sum(1 for result in results if result["status"] == "archived")
+                # Products deleted or archived by someone else in the meantime are already gone
+                gone = sum(1 for result in results if result["status"] == "not_found")
+
+                # Rows that already have an archived copy cannot be archived again; leave them
+                # and the store in place and report them instead of deleting live products
+                conflicts = [result["id"] for result in results if result["status"] == "already_archived"]
+                conflict_ids.extend(conflicts)
+
+            # Keep the in-memory catalog in sync
+            product_catalog.remove_products([product_id for product_id in product_ids if product_id not in conflict_ids])
+
+            if processed == 0 and gone == 0 and not conflicts:
+                raise RuntimeError(f"No progress while removing products of store {store_id}")
+
+            products_done += processed
+            products_gone += gone
+            job_registry.set_progress(
+                job_id,
+                total_products=max(total_products, products_done + products_gone),
+                products_done=products_done,
+                products_already_gone=products_gone,
+                reviews_found=reviews_found,
+                storage_objects_removed=objects_removed
+            )
+
+        if conflict_ids:
+            # Keep the store so the conflicting products still belong somewhere
+            if products_done:
+                await log_admin_activity(current_user, "archived", f"{products_done} products of {store_name}")
+            job_registry.set_progress(job_id, storage_objects_removed=objects_removed)
+            job_registry.update(job_id, status="failed", result={
+                "error": f"{len(conflict_ids)} products of the store already have an archived copy; resolve them and delete the store again",
+                "conflicting_product_ids": conflict_ids,
+                "products_removed": products_done
+            })
+            logger.warning(f"Store deletion job {job_id} stopped: products {conflict_ids} already have archived copies")
+            return
+
+        # Remove the store image objects
+        objects_removed += await asyncio.to_thread(remove_storage_objects, list_storage_folder(f"store-images/{store_id}"))
+
+        delete_response = await asyncio.to_thread(
+            lambda: supabase_client.table("stores").delete().eq("store_id", store_id).execute()
+        )
         if not delete_response.data:
-            logger.error(f"Failed to delete store with ID {store_id}")
-            raise HTTPException(status_code=500, detail="Failed to delete store")
-        
-        # Log admin activity for deleting store
+            raise RuntimeError(f"Failed to delete store with ID {store_id}")
+        product_catalog.remove_store(store_id)
+
+        # Log admin activity for the products and the store
+        if products_done:
+            product_activity = "permanently deleted" if permanent else "archived"
+            await log_admin_activity(current_user, product_activity, f"{products_done} products of {store_name}")
         await log_admin_activity(current_user, "deleted", store_name, "Store")
+
+        job_registry.set_progress(job_id, storage_objects_removed=objects_removed)
+        job_registry.update(job_id, status="completed", result={"products_removed": products_done})
+        logger.info(f"Successfully deleted store with ID: {store_id} ({products_done} products)")
+
+    except Exception as e:
+        logger.error(f"Store deletion job {job_id} failed: {str(e)}", exc_info=True)
+        job_registry.update(job_id, status="failed", result={"error": str(e)})
+
+@router.delete("/delete_store/{store_id}", status_code=202)
+async def delete_store(
+    background_tasks: BackgroundTasks,
+    store_id: str = Path(...),
+    permanent: bool = Query(False),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Start deleting a store in the background.
+
+    Its products are archived (or deleted with their reviews and images when permanent
+    is true) in batches. Poll /delete_store_status/{job_id} for progress.
+    """
+    try:
+        logger.info(f"Starting store deletion for store_id: {store_id}")
         
-        logger.info(f"Successfully deleted store with ID: {store_id}")
-        return {"message": "Store deleted successfully"}
+        # Check in the database that the store still exists; the catalog of this
+        # worker may still hold a store deleted through another one
+        store_response = supabase_client.table("stores").select("store_id, name").eq("store_id", store_id).execute()
+        if not store_response.data:
+            logger.error(f"Store with ID {store_id} not found")
+            product_catalog.remove_store(store_id)
+            raise HTTPException(status_code=404, detail=f"Store with ID {store_id} not found")
+        existing_store = store_response.data[0]
+
+        job = await job_registry.create("store_deletion", store_id=store_id, store_name=existing_store.get("name"), permanent=permanent)
+        background_tasks.add_task(run_store_deletion, job["job_id"], existing_store, permanent, current_user)
+
+        logger.info(f"Queued store deletion job {job['job_id']} for store_id: {store_id}")
+        return {"message": "Store deletion started", "job_id": job["job_id"]}
         
     except HTTPException as he:
         # Re-raise HTTP exceptions
         raise he
     except Exception as e:
         logger.error(f"Error deleting store: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Error deleting store: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error deleting store: {str(e)}")
+
+@router.get("/delete_store_status/{job_id}")
+async def get_store_deletion_status(job_id: str = Path(...), _: dict = Depends(get_current_user)):
+    """
+    Get the progress of a store deletion job.
+    """
+    job = await job_registry.get(job_id)
+    if not job or job["type"] != "store_deletion":
+        raise HTTPException(status_code=404, detail=f"Store deletion job {job_id} not found")
+    return {"job": job}
+
+@router.post("/rebuild_store_stats")
+async def rebuild_store_stats(current_user: dict = Depends(get_current_user)):
+    """
+    Recompute the store_stats table from scratch.
+
+    The table is kept current by triggers on every write; a rebuild is only needed
+    after loading data with the triggers disabled or to repair drift.
+    """
+    try:
+        response = await asyncio.to_thread(lambda: supabase_client.rpc("rebuild_store_stats", {}).execute())
+        store_stats_cache.clear()
+
+        logger.info(f"Rebuilt statistics of {response.data} stores")
+        return {"message": "Store statistics rebuilt", "stores": response.data}
+
+    except Exception as e:
+        logger.error(f"Error rebuilding store statistics: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error rebuilding store statistics: {str(e)}")
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, Path, Request
+from fastapi import APIRouter, HTTPException, Depends, Path
 from app.db.database import supabase_client
-from app.routes.store_user_auth import verify_store_user_session
+from app.routes.store_user_auth import get_store_user_identity
+from app.utils.product_catalog import product_catalog
+from app.utils.conditional_writes import delete_where, row_exists
 from typing import Optional
 import logging
-from datetime import datetime
 import uuid
 
 logging.basicConfig(
@@ -16,25 +17,12 @@ logger = logging.getLogger(__name__)
 router = APIRouter(tags=["Store User Archived Product Operations"])
 
 @router.put("/store-user/archive-product/{product_id}")
-async def archive_product(request: Request, product_id: int = Path(...)):
+async def archive_product(product_id: int = Path(...), identity: dict = Depends(get_store_user_identity)):
     """
     Archive a product by moving it from the products table to the archived_products table.
     """
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
         store_user_id = store_user.get("id")
         store_id = store_user.get("store_owned")
 
@@ -43,76 +31,36 @@ async def archive_product(request: Request, product_id: int = Path(...)):
 
         logger.info(f"Starting product archiving for product_id: {product_id}")
 
-        # Check if the product is already in the archived_products table
-        archived_check = supabase_client.table("archived_products").select("*").eq("original_product_id", product_id).execute()
+        # Move the product to archived_products in a single transactional call,
+        # restricted to products owned by the store user's store
+        archive_response = supabase_client.rpc("archive_product", {
+            "p_product_id": product_id,
+            "p_archived_by": store_user_id,
+            "p_archived_by_type": "store_user",
+            "p_store_id": store_id
+        }).execute()
 
-        if archived_check.data and len(archived_check.data) > 0:
+        result = archive_response.data or {}
+        status = result.get("status")
+
+        if status == "already_archived":
             logger.info(f"Product with ID {product_id} is already archived")
             return {"message": "Product is already archived"}
 
-        # First, check if the product exists and get its data
-        product_response = supabase_client.table("products").select("*").eq("id", product_id).execute()
-
-        if not product_response.data or len(product_response.data) == 0:
+        if status == "not_found":
             logger.error(f"Product with ID {product_id} not found")
             raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
 
-        existing_product = product_response.data[0]
-
-        # Verify that the product belongs to the store user's store
-        if str(existing_product["store_id"]) != str(store_id):
+        if status == "forbidden":
             logger.error(f"Product with ID {product_id} does not belong to store {store_id}")
             raise HTTPException(status_code=403, detail="You don't have permission to archive this product")
 
-        # Store the original product ID for reference
-        original_product_id = existing_product["id"]
-
-        # Log the original product ID
-        logger.info(f"Archiving product with ID: {original_product_id}")
-
-        # Prepare data for archived_products table
-        archived_product_data = {
-            # Don't include ID field since it's a serial/auto-increment field
-            "original_product_id": original_product_id,  # Store the original ID for reference
-            "name": existing_product["name"],
-            "description": existing_product["description"],
-            "category": existing_product["category"],
-            "location_name": existing_product.get("location_name", ""),
-            "address": existing_product["address"],
-            "latitude": existing_product.get("latitude"),
-            "longitude": existing_product.get("longitude"),
-            "ar_asset_url": existing_product.get("ar_asset_url", ""),
-            "image_urls": existing_product.get("image_urls", []),
-            "in_stock": False,  # Archived products are set to not in stock
-            "store_id": existing_product["store_id"],
-            "town": existing_product.get("town"),
-            "price_min": existing_product.get("price_min"),
-            "price_max": existing_product.get("price_max"),
-            "views": existing_product.get("views", 0),
-            "archived_at": datetime.now().isoformat(),
-            "archived_by": store_user_id,
-            "archived_by_type": "store_user"
-        }
-
-        # Insert into archived_products table
-        archive_response = supabase_client.table("archived_products").insert(archived_product_data).execute()
-
-        if not archive_response.data:
-            logger.error("Failed to insert into archived_products table")
+        if status != "archived":
+            logger.error(f"Unexpected archive result for product {product_id}: {result}")
             raise HTTPException(status_code=500, detail="Failed to archive product")
 
-        # Delete from products table
-        delete_response = supabase_client.table("products").delete().eq("id", product_id).execute()
-
-        if not delete_response.data:
-            logger.error(f"Failed to delete product with ID {product_id} from products table")
-            # Try to delete from archived_products to maintain consistency
-            # We can now use the original_product_id to find the archived product
-            cleanup_response = supabase_client.table("archived_products").select("id").eq("original_product_id", product_id).execute()
-            if cleanup_response.data and len(cleanup_response.data) > 0:
-                archived_id = cleanup_response.data[0]["id"]
-                supabase_client.table("archived_products").delete().eq("id", archived_id).execute()
-            raise HTTPException(status_code=500, detail="Failed to complete product archiving")
+        # Keep the in-memory catalog in sync
+        product_catalog.remove_products([result["product_id"]])
 
         logger.info(f"Successfully archived product with ID: {product_id}")
         return {"message": "Product archived successfully"}
@@ -125,25 +73,12 @@ async def archive_product(request: Request, product_id: int = Path(...)):
         raise HTTPException(status_code=500, detail=f"Error archiving product: {str(e)}")
 
 @router.put("/store-user/restore-product/{product_id}")
-async def restore_product(request: Request, product_id: int = Path(...)):
+async def restore_product(product_id: int = Path(...), identity: dict = Depends(get_store_user_identity)):
     """
     Restore a product by moving it from the archived_products table back to the products table.
     """
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
         store_id = store_user.get("store_owned")
 
         if not store_id:
@@ -151,59 +86,34 @@ async def restore_product(request: Request, product_id: int = Path(...)):
 
         logger.info(f"Starting product restoration for product_id: {product_id}")
 
-        # First, check if the archived product exists and get its data
-        # We can use either the ID directly or the original_product_id field
-        # For this endpoint, we'll use the ID directly since that's what the client will have
-        archived_product_response = supabase_client.table("archived_products").select("*").eq("id", product_id).execute()
+        # Move the product back to products in a single transactional call,
+        # restricted to products owned by the store user's store
+        restore_response = supabase_client.rpc("restore_product", {
+            "p_archived_id": product_id,
+            "p_store_id": store_id
+        }).execute()
 
-        if not archived_product_response.data or len(archived_product_response.data) == 0:
+        result = restore_response.data or {}
+        status = result.get("status")
+
+        if status == "not_found":
             logger.error(f"Archived product with ID {product_id} not found")
             raise HTTPException(status_code=404, detail=f"Archived product with ID {product_id} not found")
 
-        archived_product = archived_product_response.data[0]
-
-        # Verify that the product belongs to the store user's store
-        if str(archived_product["store_id"]) != str(store_id):
+        if status == "forbidden":
             logger.error(f"Archived product with ID {product_id} does not belong to store {store_id}")
             raise HTTPException(status_code=403, detail="You don't have permission to restore this product")
 
-        # Prepare data for products table
-        product_data = {
-            "id": archived_product["original_product_id"],  # Use the original product ID
-            "name": archived_product["name"],
-            "description": archived_product["description"],
-            "category": archived_product["category"],
-            "location_name": archived_product.get("location_name", ""),
-            "address": archived_product["address"],
-            "latitude": archived_product.get("latitude"),
-            "longitude": archived_product.get("longitude"),
-            "ar_asset_url": archived_product.get("ar_asset_url", ""),
-            "image_urls": archived_product.get("image_urls", []),
-            "in_stock": True,  # Restored products are set to in stock by default
-            "store_id": archived_product["store_id"],
-            "town": archived_product.get("town"),
-            "price_min": archived_product.get("price_min"),
-            "price_max": archived_product.get("price_max"),
-            "views": archived_product.get("views", 0)
-        }
-
-        # Insert into products table
-        restore_response = supabase_client.table("products").insert(product_data).execute()
-
-        if not restore_response.data:
-            logger.error("Failed to insert into products table")
-            raise HTTPException(status_code=500, detail="Failed to restore product")
+        if status == "conflict":
+            logger.error(f"A product with the original ID of archived product {product_id} already exists")
+            raise HTTPException(status_code=409, detail="A product with the same ID already exists")
 
-        # Delete from archived_products table using the archived product's actual ID
-        delete_response = supabase_client.table("archived_products").delete().eq("id", archived_product["id"]).execute()
+        if status != "restored":
+            logger.error(f"Unexpected restore result for product {product_id}: {result}")
+            raise HTTPException(status_code=500, detail="Failed to restore product")
 
-        if not delete_response.data:
-            logger.error(f"Failed to delete product with ID {product_id} from archived_products table")
-            # Try to delete from products to maintain consistency
-            # We can use the original_product_id directly
-            original_id = archived_product["original_product_id"]
-            supabase_client.table("products").delete().eq("id", original_id).execute()
-            raise HTTPException(status_code=500, detail="Failed to complete product restoration")
+        # Keep the in-memory catalog in sync
+        product_catalog.schedule_refresh_products([result["product_id"]])
 
         logger.info(f"Successfully restored product with ID: {product_id}")
         return {"message": "Product restored successfully"}
@@ -216,25 +126,12 @@ async def restore_product(request: Request, product_id: int = Path(...)):
         raise HTTPException(status_code=500, detail=f"Error restoring product: {str(e)}")
 
 @router.get("/store-user/fetch-archived-products")
-async def fetch_archived_products(request: Request):
+async def fetch_archived_products(identity: dict = Depends(get_store_user_identity)):
     """
     Fetch all archived products for the current store user.
     """
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
         store_id = store_user.get("store_owned")
 
         if not store_id:
@@ -275,25 +172,12 @@ async def fetch_archived_products(request: Request):
         raise HTTPException(status_code=500, detail=f"Error fetching archived products: {str(e)}")
 
 @router.delete("/store-user/permanently-delete-product/{product_id}")
-async def permanently_delete_product(request: Request, product_id: int = Path(...)):
+async def permanently_delete_product(product_id: int = Path(...), identity: dict = Depends(get_store_user_identity)):
     """
     Permanently delete a product from the archived_products table.
     """
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
         store_id = store_user.get("store_owned")
 
         if not store_id:
@@ -301,29 +185,16 @@ async def permanently_delete_product(request: Request, product_id: int = Path(..
 
         logger.info(f"Starting permanent deletion for product_id: {product_id}")
 
-        # First, check if the archived product exists and get its data
-        # We can use either the ID directly or the original_product_id field
-        # For this endpoint, we'll use the ID directly since that's what the client will have
-        archived_product_response = supabase_client.table("archived_products").select("*").eq("id", product_id).execute()
+        # Delete from archived_products only if it belongs to the store user's store
+        deleted = delete_where("archived_products", id=product_id, store_id=store_id)
 
-        if not archived_product_response.data or len(archived_product_response.data) == 0:
+        if not deleted:
+            if row_exists("archived_products", "id", product_id):
+                logger.error(f"Archived product with ID {product_id} does not belong to store {store_id}")
+                raise HTTPException(status_code=403, detail="You don't have permission to delete this product")
             logger.error(f"Archived product with ID {product_id} not found")
             raise HTTPException(status_code=404, detail=f"Archived product with ID {product_id} not found")
 
-        archived_product = archived_product_response.data[0]
-
-        # Verify that the product belongs to the store user's store
-        if str(archived_product["store_id"]) != str(store_id):
-            logger.error(f"Archived product with ID {product_id} does not belong to store {store_id}")
-            raise HTTPException(status_code=403, detail="You don't have permission to delete this product")
-
-        # Delete from archived_products table using the archived product's actual ID
-        delete_response = supabase_client.table("archived_products").delete().eq("id", archived_product["id"]).execute()
-
-        if not delete_response.data:
-            logger.error(f"Failed to delete product with ID {product_id} from archived_products table")
-            raise HTTPException(status_code=500, detail="Failed to permanently delete product")
-
         logger.info(f"Successfully permanently deleted product with ID: {product_id}")
         return {"message": "Product permanently deleted successfully"}
 
@@ -34,6 +34,13 @@ def delete_session_cookie(response: Response):
         samesite="lax",  # Use 'lax' for better compatibility in development
     )
 
+def session_expired(session: dict) -> bool:
+    created_at = datetime.fromisoformat(session["created_at"].replace("Z", "+00:00"))
+    expiry_time = created_at + timedelta(minutes=SESSION_EXPIRY_MINUTES)
+    # Convert utcnow to an offset-aware datetime to match expiry_time
+    current_time = datetime.utcnow().replace(tzinfo=created_at.tzinfo)
+    return current_time > expiry_time
+
 async def verify_store_user_session(request: Request) -> dict:
     """Verify the session ID from the cookie and retrieve session data from Supabase."""
     session_id = request.cookies.get(SESSION_COOKIE_NAME)
@@ -51,20 +58,45 @@ async def verify_store_user_session(request: Request) -> dict:
         session = session_response.data[0]
         
         # Check session expiry
-        created_at = datetime.fromisoformat(session["created_at"].replace("Z", "+00:00"))
-        expiry_time = created_at + timedelta(minutes=SESSION_EXPIRY_MINUTES)
-        # Convert utcnow to an offset-aware datetime to match expiry_time
-        current_time = datetime.utcnow().replace(tzinfo=created_at.tzinfo)
-        if current_time > expiry_time:
+        if session_expired(session):
             logger.info(f"Store user session expired for session_id: {session_id}")
             supabase_client.table("store_user_sessions").delete().eq("session_id", session_id).execute()
             raise HTTPException(status_code=403, detail="Session expired")
 
         return session
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error verifying store user session: {str(e)}")
         raise HTTPException(status_code=500, detail="Session verification failed")
 
+async def get_store_user_identity(request: Request) -> dict:
+    """
+    Resolve the session, store user and owned store_id of a seller request.
+
+    The result is memoized on request.state, so handlers and the helpers they
+    call resolve it once per request. It is not reused across requests: logout,
+    store creation and status changes must take effect on every worker at once.
+    Returns {"session", "store_user", "store_id"}.
+    """
+    identity = getattr(request.state, "store_user_identity", None)
+    if identity is not None:
+        return identity
+
+    session = await verify_store_user_session(request)
+    user_email = session.get("email")
+    if not user_email:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
+    if not user_response.data:
+        raise HTTPException(status_code=404, detail="Store user not found")
+
+    store_user = user_response.data[0]
+    identity = {"session": session, "store_user": store_user, "store_id": store_user.get("store_owned")}
+    request.state.store_user_identity = identity
+    return identity
+
 @router.post("/store-user/login")
 async def login_store_user(response: Response, email: str = Body(...), password: str = Body(...)):
     """Login a store user and create a session"""
@@ -111,26 +143,10 @@ async def login_store_user(response: Response, email: str = Body(...), password:
         logger.exception(f"Store user login error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
 @router.get("/store-user/profile")
-async def get_store_user_profile(request: Request):
+async def get_store_user_profile(identity: dict = Depends(get_store_user_identity)):
     """Get the profile of the currently logged in store user"""
     try:
-        # Verify session
-        session = await verify_store_user_session(request)
-        
-        # Get store user details
-        user_response = supabase_client.table("store_user").select("*").eq("email", session.get("email")).execute()
-        
-        if not user_response.data or len(user_response.data) == 0:
-            raise HTTPException(status_code=404, detail="Store user not found")
-        
-        store_user = user_response.data[0]
-        
-        # Get store details if store_owned is not null
-        store_details = None
-        if store_user.get("store_owned"):
-            store_response = supabase_client.table("stores").select("*").eq("store_id", store_user.get("store_owned")).execute()
-            if store_response.data and len(store_response.data) > 0:
-                store_details = store_response.data[0]
+        store_user = identity["store_user"]
         
         # Create profile response
         profile = {
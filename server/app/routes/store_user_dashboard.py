@@ -1,27 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from app.db.database import supabase_client
-from app.auth.auth_handler import get_current_user
+from app.routes.store_user_auth import get_store_user_identity
+from app.utils.store_stats import store_stats_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Store User Dashboard"])
 
+# Number of most viewed products shown on the dashboard
+TOP_PRODUCTS_LIMIT = 5
+
 @router.get("/store-user/stats")
-async def get_store_user_stats(current_user: dict = Depends(get_current_user)):
+async def get_store_user_stats(identity: dict = Depends(get_store_user_identity)):
     """Fetch dashboard statistics for a store user"""
     try:
-        # Verify the user is a store user
-        if not current_user or 'email' not in current_user:
-            raise HTTPException(status_code=401, detail="Authentication required")
-        
-        # Get the store user record
-        store_user_response = supabase_client.table("store_user").select("*").eq("email", current_user["email"]).execute()
-        
-        if not store_user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-        
-        store_user = store_user_response.data[0]
+        store_user = identity["store_user"]
         
         # Check if the store user is approved
         if store_user.get("status") != "accepted":
@@ -43,74 +37,45 @@ async def get_store_user_stats(current_user: dict = Depends(get_current_user)):
                 "recentOrders": []
             }
         
-        # Fetch products for this store
-        products_response = supabase_client.table("products").select("*").eq("store_id", store_id).execute()
-        products = products_response.data or []
-        
-        # Calculate total products
-        total_products = len(products)
-        
-        # Calculate unique categories
-        unique_categories = set()
-        for product in products:
-            if product.get("category"):
-                unique_categories.add(product["category"])
-        total_categories = len(unique_categories)
-        
-        # Calculate total product views
-        product_views = sum([p.get("views", 0) for p in products]) if products else 0
-        
-        # Fetch reviews for this store's products
-        product_ids = [p.get("id") for p in products if p.get("id")]
-        total_reviews = 0
-        avg_rating = 0
-        
-        if product_ids:
-            reviews_response = supabase_client.table("reviews").select("*").in_("product_id", product_ids).execute()
-            reviews = reviews_response.data or []
-            total_reviews = len(reviews)
-            
-            if total_reviews > 0:
-                ratings = [r.get("rating", 0) for r in reviews]
-                avg_rating = round(sum(ratings) / len(ratings), 1) if ratings else 0
-        
-        # Get top products (by views or sales)
-        top_products = []
-        if products:
-            # Sort products by views (descending)
-            sorted_products = sorted(products, key=lambda p: p.get("views", 0), reverse=True)
-            top_products = sorted_products[:5]  # Get top 5 products
-            
-            # Format top products for frontend
-            top_products = [
-                {
-                    "id": p.get("id"),
-                    "name": p.get("name", "Unknown Product"),
-                    "category": p.get("category", "Uncategorized"),
-                    "sales": p.get("sales_count", 0),
-                    "growth": 0,  # Placeholder for growth percentage
-                    "price": p.get("price", 0)
-                } for p in top_products
-            ]
+        cached = store_stats_cache.get(store_id)
+        if cached is not None:
+            return cached
+
+        # Aggregate everything in the database with one call
+        stats_response = supabase_client.rpc("store_dashboard_stats", {
+            "p_store_id": store_id,
+            "p_top_limit": TOP_PRODUCTS_LIMIT
+        }).execute()
+        stats = stats_response.data or {}
+
+        # Format top products for frontend
+        top_products = [
+            {
+                "id": p.get("id"),
+                "name": p.get("name", "Unknown Product"),
+                "category": p.get("category") or "Uncategorized",
+                "sales": 0,
+                "growth": 0,  # Placeholder for growth percentage
+                "price": p.get("price_min") or 0
+            } for p in stats.get("top_products") or []
+        ]
         
         # Get recent orders (placeholder - would be implemented with actual orders table)
         recent_orders = []
         
-        # Get store details
-        store_response = supabase_client.table("stores").select("*").eq("store_id", store_id).execute()
-        store_details = store_response.data[0] if store_response.data else {}
-        
-        return {
+        result = {
             "store_owned": store_id,
-            "store_details": store_details,
-            "totalProducts": total_products,
-            "totalCategories": total_categories,
-            "productViews": product_views,
-            "totalReviews": total_reviews,
-            "averageRating": avg_rating,
+            "store_details": stats.get("store") or {},
+            "totalProducts": stats.get("total_products", 0),
+            "totalCategories": stats.get("total_categories", 0),
+            "productViews": stats.get("product_views", 0),
+            "totalReviews": stats.get("total_reviews", 0),
+            "averageRating": float(stats.get("average_rating") or 0),
             "topProducts": top_products,
             "recentOrders": recent_orders
         }
+        store_stats_cache.set(store_id, result)
+        return result
         
     except Exception as e:
         logger.exception(f"Error fetching store user stats: {str(e)}")
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Path, Request
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Path
 from app.db.database import supabase_client
-from app.schemas.product import Products
-from app.routes.store_user_auth import verify_store_user_session
+from app.schemas.product import Products, ProductPatch
+from app.routes.store_user_auth import get_store_user_identity
+from app.utils.product_catalog import product_catalog
+from app.utils.image_hashes import image_hash_index
+from app.utils.conditional_writes import update_where, row_exists, changed_values, unchanged_row
+from app.utils.storage import remove_storage_objects
 from typing import List, Optional
 import uuid
 import json
@@ -18,7 +22,6 @@ router = APIRouter(tags=["Store User Product Operations"])
 
 @router.post("/store-user/add-product")
 async def add_store_user_product(
-    request: Request,
     name: str = Form(...),
     description: str = Form(...),
     category: str = Form(...),
@@ -32,22 +35,10 @@ async def add_store_user_product(
     town: Optional[str] = Form(None),
     images: List[UploadFile] = File(...),
     ar_asset: Optional[UploadFile] = File(None),
+    identity: dict = Depends(get_store_user_identity),
 ):
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
 
         # Check if the store user is approved
         if store_user.get("status") != "accepted":
@@ -80,6 +71,7 @@ async def add_store_user_product(
 
         # Upload images to 'product-images' folder in test-bucket
         image_urls = []
+        uploaded_images = []
         for i, image in enumerate(images):
             try:
                 image_path = f"product-images/products/{product_id}/{i}_{uuid.uuid4()}"
@@ -94,6 +86,7 @@ async def add_store_user_product(
 
                 image_url = supabase_client.storage.from_("test-bucket").get_public_url(image_path)
                 image_urls.append(image_url)
+                uploaded_images.append((image_url, content))
                 logger.debug(f"Successfully uploaded image {i}: {image_url}")
             except Exception as img_error:
                 logger.error(f"Failed to upload image {i}: {str(img_error)}", exc_info=True)
@@ -143,6 +136,14 @@ async def add_store_user_product(
             logger.error("Supabase returned no data after insert")
             raise HTTPException(status_code=500, detail="Failed to add product")
 
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_products(response.data)
+
+        # Hash the uploaded images in the background for duplicate detection
+        image_hash_index.schedule_product_images(
+            response.data[0]["id"], response.data[0].get("store_id"), uploaded_images, image_urls
+        )
+
         logger.info(f"Successfully added product with ID: {product_id}")
         return {"message": "Product added successfully", "product": response.data[0]}
 
@@ -154,22 +155,9 @@ async def add_store_user_product(
         raise HTTPException(status_code=500, detail=f"Error adding product: {str(e)}")
 
 @router.get("/store-user/fetch-product/{product_id}")
-async def fetch_store_user_product(request: Request, product_id: int = Path(...)):
+async def fetch_store_user_product(product_id: int = Path(...), identity: dict = Depends(get_store_user_identity)):
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
         store_id = store_user.get("store_owned")
 
         if not store_id:
@@ -177,27 +165,20 @@ async def fetch_store_user_product(request: Request, product_id: int = Path(...)
 
         logger.info(f"Fetching product with ID: {product_id}")
 
-        # Query the product from the database
-        response = supabase_client.table("products").select("*").eq("id", product_id).execute()
+        # Query the product together with its store, restricted to the store user's store
+        response = supabase_client.table("products").select("*, stores(*)").eq("id", product_id).eq(
+            "store_id", store_id
+        ).execute()
 
-        if not response.data or len(response.data) == 0:
+        if not response.data:
+            if row_exists("products", "id", product_id):
+                logger.error(f"Product with ID {product_id} does not belong to store {store_id}")
+                raise HTTPException(status_code=403, detail="You don't have permission to access this product")
             logger.error(f"Product with ID {product_id} not found")
             raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
 
-        # Get the product data
         product = response.data[0]
 
-        # Verify that the product belongs to the store user's store
-        if str(product["store_id"]) != str(store_id):
-            logger.error(f"Product with ID {product_id} does not belong to store {store_id}")
-            raise HTTPException(status_code=403, detail="You don't have permission to access this product")
-
-        # Fetch the store information for this product
-        store_response = supabase_client.table("stores").select("*").eq("store_id", product["store_id"]).execute()
-
-        if store_response.data and len(store_response.data) > 0:
-            product["stores"] = store_response.data[0]
-
         logger.info(f"Successfully fetched product with ID: {product_id}")
         return {"product": product}
 
@@ -210,7 +191,6 @@ async def fetch_store_user_product(request: Request, product_id: int = Path(...)
 
 @router.put("/store-user/update-product/{product_id}")
 async def update_store_user_product(
-    request: Request,
     product_id: int = Path(...),
     name: str = Form(...),
     description: str = Form(...),
@@ -227,22 +207,10 @@ async def update_store_user_product(
     images: List[UploadFile] = File([]),  # New images to add
     keep_ar_asset: bool = Form(...),  # Whether to keep existing AR asset
     ar_asset: Optional[UploadFile] = File(None),  # New AR asset if not keeping existing
+    identity: dict = Depends(get_store_user_identity),
 ):
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
         store_id = store_user.get("store_owned")
 
         if not store_id:
@@ -250,19 +218,16 @@ async def update_store_user_product(
 
         logger.info(f"Starting product update for product_id: {product_id}")
 
-        # First, check if the product exists
-        product_response = supabase_client.table("products").select("*").eq("id", product_id).execute()
-
-        if not product_response.data or len(product_response.data) == 0:
-            logger.error(f"Product with ID {product_id} not found")
-            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
-
-        existing_product = product_response.data[0]
-
-        # Verify that the product belongs to the store user's store
-        if str(existing_product["store_id"]) != str(store_id):
-            logger.error(f"Product with ID {product_id} does not belong to store {store_id}")
-            raise HTTPException(status_code=403, detail="You don't have permission to update this product")
+        # Refuse before uploading anything into the product's folders when it belongs to another store
+        if images or ar_asset:
+            current = product_catalog.products.get(product_id)
+            if current is None:
+                response = supabase_client.table("products").select("store_id").eq("id", product_id).execute()
+                current = response.data[0] if response.data else None
+            if current is None:
+                raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+            if str(current.get("store_id")) != str(store_id):
+                raise HTTPException(status_code=403, detail="You don't have permission to update this product")
 
         # Parse the keep_images JSON string to get the list of image URLs to keep
         try:
@@ -274,6 +239,8 @@ async def update_store_user_product(
 
         # Upload new images
         new_image_urls = []
+        uploaded_images = []
+        uploaded_paths = []
         for i, image in enumerate(images):
             try:
                 image_path = f"product-images/products/{product_id}/{i}_{uuid.uuid4()}"
@@ -288,6 +255,8 @@ async def update_store_user_product(
 
                 image_url = supabase_client.storage.from_("test-bucket").get_public_url(image_path)
                 new_image_urls.append(image_url)
+                uploaded_images.append((image_url, content))
+                uploaded_paths.append(image_path)
                 logger.debug(f"Successfully uploaded new image {i}: {image_url}")
             except Exception as img_error:
                 logger.error(f"Failed to upload new image {i}: {str(img_error)}", exc_info=True)
@@ -296,8 +265,8 @@ async def update_store_user_product(
         # Combine kept images and new images
         combined_image_urls = keep_image_urls + new_image_urls
 
-        # Handle AR asset
-        ar_asset_url = existing_product.get("ar_asset_url", "") if keep_ar_asset else ""
+        # Handle AR asset; the existing one is kept by leaving the column out of the update
+        ar_asset_url = ""
 
         # Upload new AR asset if provided
         if ar_asset and not keep_ar_asset:
@@ -312,6 +281,7 @@ async def update_store_user_product(
                     file_options={"content-type": ar_asset.content_type}
                 )
                 ar_asset_url = supabase_client.storage.from_("test-bucket").get_public_url(ar_asset_path)
+                uploaded_paths.append(ar_asset_path)
                 logger.debug(f"Successfully uploaded new AR asset: {ar_asset_url}")
             except Exception as ar_error:
                 logger.error(f"Failed to upload new AR asset: {str(ar_error)}", exc_info=True)
@@ -328,21 +298,35 @@ async def update_store_user_product(
             "address": address,
             "latitude": latitude,
             "longitude": longitude,
-            "ar_asset_url": ar_asset_url,
             "image_urls": combined_image_urls,
             "in_stock": in_stock,
             "town": town
         }
+        if not keep_ar_asset:
+            product_data["ar_asset_url"] = ar_asset_url
 
+        # Update only if the product belongs to the store user's store
         logger.debug(f"Updating product data: {json.dumps(product_data)}")
-        response = supabase_client.table("products").update(product_data).eq("id", product_id).execute()
+        updated = update_where("products", product_data, id=product_id, store_id=store_id)
 
-        if not response.data:
-            logger.error("Supabase returned no data after update")
-            raise HTTPException(status_code=500, detail="Failed to update product")
+        if not updated:
+            remove_storage_objects(uploaded_paths)
+            if row_exists("products", "id", product_id):
+                logger.error(f"Product with ID {product_id} does not belong to store {store_id}")
+                raise HTTPException(status_code=403, detail="You don't have permission to update this product")
+            logger.error(f"Product with ID {product_id} not found")
+            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_products(updated)
+
+        # Hash the uploaded images in the background for duplicate detection
+        image_hash_index.schedule_product_images(
+            product_id, updated[0].get("store_id"), uploaded_images, combined_image_urls
+        )
 
         logger.info(f"Successfully updated product with ID: {product_id}")
-        return {"message": "Product updated successfully", "product": response.data[0]}
+        return {"message": "Product updated successfully", "product": updated[0]}
 
     except HTTPException as he:
         # Re-raise HTTP exceptions
@@ -351,8 +335,70 @@ async def update_store_user_product(
         logger.error(f"Error updating product: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error updating product: {str(e)}")
 
+@router.patch("/store-user/update-product/{product_id}")
+async def patch_store_user_product(
+    changes: ProductPatch,
+    product_id: int = Path(...),
+    identity: dict = Depends(get_store_user_identity),
+):
+    """
+    Partially update one of the store user's products.
+
+    Only the fields present in the body are written; the write is skipped when the
+    database already holds them all. New images are uploaded with the PUT endpoint.
+    """
+    try:
+        store_id = identity["store_id"]
+
+        if not store_id:
+            raise HTTPException(status_code=400, detail="You don't have a store")
+
+        values = changes.model_dump(mode="json", exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="No fields to update")
+
+        current = product_catalog.products.get(product_id)
+        if current is not None and str(current.get("store_id")) != str(store_id):
+            logger.error(f"Product with ID {product_id} does not belong to store {store_id}")
+            raise HTTPException(status_code=403, detail="You don't have permission to update this product")
+
+        # The cached row may be stale; only skip the write when the database agrees
+        if not changed_values(current, values):
+            unchanged = unchanged_row("products", values, id=product_id, store_id=store_id)
+            if unchanged is not None:
+                logger.info(f"No changes for product with ID: {product_id}")
+                return {"message": "Product is unchanged", "product": unchanged}
+
+        # Update only if the product belongs to the store user's store
+        logger.debug(f"Patching product {product_id}: {json.dumps(values)}")
+        updated = update_where("products", values, id=product_id, store_id=store_id)
+
+        if not updated:
+            if row_exists("products", "id", product_id):
+                logger.error(f"Product with ID {product_id} does not belong to store {store_id}")
+                raise HTTPException(status_code=403, detail="You don't have permission to update this product")
+            logger.error(f"Product with ID {product_id} not found")
+            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_products(updated)
+
+        # Drop the hashes of images the product no longer uses
+        if "image_urls" in values:
+            image_hash_index.schedule_product_images(product_id, store_id, [], values["image_urls"])
+
+        logger.info(f"Successfully patched product with ID: {product_id} ({', '.join(values)})")
+        return {"message": "Product updated successfully", "product": updated[0]}
+
+    except HTTPException as he:
+        # Re-raise HTTP exceptions
+        raise he
+    except Exception as e:
+        logger.error(f"Error patching product: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error updating product: {str(e)}")
+
 @router.delete("/store-user/delete-product/{product_id}")
-async def delete_store_user_product(request: Request, product_id: int = Path(...)):
+async def delete_store_user_product(product_id: int = Path(...), identity: dict = Depends(get_store_user_identity)):
     """
     This endpoint is now a wrapper around the archive-product endpoint.
     It archives the product instead of deleting it permanently.
@@ -361,8 +407,8 @@ async def delete_store_user_product(request: Request, product_id: int = Path(...
         # Import the archive_product function from store_user_archived_products
         from app.routes.store_user_archived_products import archive_product
 
-        # Call the archive_product function
-        await archive_product(request, product_id)
+        # Call the archive_product function with the identity already resolved for this request
+        await archive_product(product_id, identity)
 
         # Return a success message
         return {"message": "Product archived successfully"}
@@ -375,22 +421,9 @@ async def delete_store_user_product(request: Request, product_id: int = Path(...
         raise HTTPException(status_code=500, detail=f"Error archiving product: {str(e)}")
 
 @router.get("/store-user/fetch-products")
-async def fetch_store_user_products(request: Request):
+async def fetch_store_user_products(identity: dict = Depends(get_store_user_identity)):
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
         store_id = store_user.get("store_owned")
 
         if not store_id:
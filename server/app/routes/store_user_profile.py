@@ -1,6 +1,6 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from app.db.database import supabase_client
-from app.routes.store_user_auth import verify_store_user_session
+from app.routes.store_user_auth import get_store_user_identity
 from typing import Optional
 from pydantic import BaseModel
 import logging
@@ -24,24 +24,16 @@ class ProfileUpdate(BaseModel):
 @router.put("/store-user/update-profile")
 async def update_store_user_profile(
     request: Request,
-    profile_data: ProfileUpdate
+    profile_data: ProfileUpdate,
+    identity: dict = Depends(get_store_user_identity)
 ):
     """
     Update the profile of the currently logged in store user.
     This endpoint updates the user's first_name, last_name, and phone_number in the database.
     """
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-
-        # Check if the store user exists
-        check_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-        if not check_response.data or len(check_response.data) == 0:
-            raise HTTPException(status_code=404, detail="Store user not found")
+        # The identity dependency has already checked that the store user exists
+        user_email = identity["store_user"].get("email")
 
         # Update the store user in the database
         response = supabase_client.table("store_user").update({
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Path, Request
 from app.db.database import supabase_client
-from app.schemas.stores import Store
-from app.routes.store_user_auth import verify_store_user_session
+from app.schemas.stores import Store, StorePatch
+from app.routes.store_user_auth import get_store_user_identity
+from app.utils.product_catalog import product_catalog
+from app.utils.conditional_writes import update_where, changed_values, unchanged_row
+from app.utils.storage import remove_storage_objects
 from typing import List, Optional
 import uuid
 import json
@@ -18,7 +21,6 @@ router = APIRouter(tags=["Store User Store Operations"])
 
 @router.put("/store-user/update-store/{store_id}")
 async def update_seller_store(
-    request: Request,
     store_id: str = Path(...),
     name: str = Form(...),
     description: str = Form(...),
@@ -31,22 +33,11 @@ async def update_seller_store(
     town: Optional[str] = Form(None),
     keep_image: bool = Form(True),
     store_image: Optional[UploadFile] = File(None),
+    identity: dict = Depends(get_store_user_identity),
 ):
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-        
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-        
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-        
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-        
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
+        user_email = store_user.get("email")
         
         # Check if the store user is approved
         if store_user.get("status") != "accepted":
@@ -58,19 +49,9 @@ async def update_seller_store(
         
         logger.info(f"Starting store update for seller: {user_email}, store_id: {store_id}")
         
-        # First, check if the store exists
-        store_response = supabase_client.table("stores").select("*").eq("store_id", store_id).execute()
-        
-        if not store_response.data or len(store_response.data) == 0:
-            logger.error(f"Store with ID {store_id} not found")
-            raise HTTPException(status_code=404, detail=f"Store with ID {store_id} not found")
-        
-        existing_store = store_response.data[0]
-        
-        # Handle store image
-        store_image_url = existing_store.get("store_image", "") if keep_image else ""
-        
         # Upload new store image if provided and not keeping existing
+        image_path = None
+        store_image_url = ""
         if store_image and not keep_image:
             try:
                 image_path = f"store-images/{store_id}/{uuid.uuid4()}"
@@ -89,29 +70,37 @@ async def update_seller_store(
                 logger.error(f"Failed to upload new store image: {str(img_error)}", exc_info=True)
                 raise
         
-        # Prepare store update data
+        # Prepare store update data; the current image and rating are kept by
+        # leaving their columns out, so the store does not have to be read first
         store_data = {
             "name": name,
             "description": description,
             "latitude": latitude,
             "longitude": longitude,
-            "rating": rating or existing_store.get("rating", 0.0),
-            "store_image": store_image_url,
             "type": type,
             "operating_hours": operating_hours,
             "phone": phone,
             "town": town
         }
+        if rating:
+            store_data["rating"] = rating
+        if not keep_image:
+            store_data["store_image"] = store_image_url
         
         logger.debug(f"Updating store data: {json.dumps(store_data)}")
-        response = supabase_client.table("stores").update(store_data).eq("store_id", store_id).execute()
+        updated = update_where("stores", store_data, store_id=store_id)
         
-        if not response.data:
-            logger.error("Supabase returned no data after store update")
-            raise HTTPException(status_code=500, detail="Failed to update store")
+        if not updated:
+            logger.error(f"Store with ID {store_id} not found")
+            if image_path:
+                remove_storage_objects([image_path])
+            raise HTTPException(status_code=404, detail=f"Store with ID {store_id} not found")
+        
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_stores(updated)
         
         logger.info(f"Successfully updated store with ID: {store_id} for seller: {user_email}")
-        return {"message": "Store updated successfully", "store": response.data[0]}
+        return {"message": "Store updated successfully", "store": updated[0]}
         
     except HTTPException as he:
         raise he
@@ -119,6 +108,60 @@ async def update_seller_store(
         logger.error(f"Error updating store: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error updating store: {str(e)}")
 
+@router.patch("/store-user/update-store/{store_id}")
+async def patch_seller_store(
+    changes: StorePatch,
+    store_id: str = Path(...),
+    identity: dict = Depends(get_store_user_identity),
+):
+    """
+    Partially update the store user's store.
+
+    Only the fields present in the body are written; the write is skipped when the
+    database already holds them all. New store images are uploaded with the PUT endpoint.
+    """
+    try:
+        store_user = identity["store_user"]
+        
+        # Check if the store user is approved
+        if store_user.get("status") != "accepted":
+            raise HTTPException(status_code=403, detail="Your account must be approved to update a store")
+        
+        # Check if the user owns the store
+        if store_user.get("store_owned") != store_id:
+            raise HTTPException(status_code=403, detail="You do not have permission to update this store")
+        
+        values = changes.model_dump(mode="json", exclude_unset=True)
+        if not values:
+            raise HTTPException(status_code=400, detail="No fields to update")
+        
+        current = product_catalog.stores.get(store_id)
+        # The cached row may be stale; only skip the write when the database agrees
+        if not changed_values(current, values):
+            unchanged = unchanged_row("stores", values, store_id=store_id)
+            if unchanged is not None:
+                logger.info(f"No changes for store with ID: {store_id}")
+                return {"message": "Store is unchanged", "store": unchanged}
+        
+        logger.debug(f"Patching store {store_id}: {json.dumps(values)}")
+        updated = update_where("stores", values, store_id=store_id)
+        
+        if not updated:
+            logger.error(f"Store with ID {store_id} not found")
+            raise HTTPException(status_code=404, detail=f"Store with ID {store_id} not found")
+        
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_stores(updated)
+        
+        logger.info(f"Successfully patched store with ID: {store_id} for seller: {store_user.get('email')} ({', '.join(values)})")
+        return {"message": "Store updated successfully", "store": updated[0]}
+        
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error patching store: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error updating store: {str(e)}")
+
 @router.post("/store-user/create-store")
 async def create_seller_store(
     request: Request,
@@ -132,28 +175,17 @@ async def create_seller_store(
     phone: Optional[str] = Form(None),
     town: Optional[str] = Form(None),
     store_image: Optional[UploadFile] = File(None),
+    identity: dict = Depends(get_store_user_identity),
 ):
     try:
-        # Verify the store user session
-        session = await verify_store_user_session(request)
-        user_email = session.get("email")
-        
-        if not user_email:
-            raise HTTPException(status_code=401, detail="Authentication required")
-        
-        # Get the store user record
-        user_response = supabase_client.table("store_user").select("*").eq("email", user_email).execute()
-        
-        if not user_response.data:
-            raise HTTPException(status_code=404, detail="Store user not found")
-        
-        store_user = user_response.data[0]
+        store_user = identity["store_user"]
+        user_email = store_user.get("email")
         
         # Check if the store user is approved
         if store_user.get("status") != "accepted":
             raise HTTPException(status_code=403, detail="Your account must be approved to create a store")
         
-        # Check if the user already has a store
+        # Fail early when the user already has a store; the claim below is what enforces it
         if store_user.get("store_owned"):
             raise HTTPException(status_code=400, detail="You already have a store. You can only own one store.")
         
@@ -165,6 +197,7 @@ async def create_seller_store(
         
         # Upload store image if provided
         store_image_url = ""
+        image_path = None
         if store_image:
             try:
                 image_path = f"store-images/{store_id}/{uuid.uuid4()}"
@@ -205,16 +238,19 @@ async def create_seller_store(
             logger.error("Supabase returned no data after store insert")
             raise HTTPException(status_code=500, detail="Failed to add store")
         
-        # Update the store_user record with the new store_id
-        update_response = supabase_client.table("store_user").update(
-            {"store_owned": store_id}
-        ).eq("email", user_email).execute()
+        # Claim the new store only while the user owns none, so concurrent requests cannot both succeed
+        claimed = update_where("store_user", {"store_owned": store_id}, email=user_email, store_owned=None)
         
-        if not update_response.data:
-            logger.error(f"Failed to update store_user with store_id: {store_id}")
-            # If we can't update the user, we should delete the store to maintain consistency
+        if not claimed:
+            logger.warning(f"Store user {user_email} already owns a store, discarding store {store_id}")
+            # Another request claimed a store first, so this one is discarded
             supabase_client.table("stores").delete().eq("store_id", store_id).execute()
-            raise HTTPException(status_code=500, detail="Failed to associate store with your account")
+            if image_path:
+                remove_storage_objects([image_path])
+            raise HTTPException(status_code=400, detail="You already have a store. You can only own one store.")
+        
+        # Keep the in-memory catalog in sync
+        product_catalog.upsert_stores(response.data)
         
         logger.info(f"Successfully added store with ID: {store_id} for seller: {user_email}")
         return {"message": "Store added successfully", "store": response.data[0]}
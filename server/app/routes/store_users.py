@@ -4,6 +4,8 @@ from typing import Optional
 from app.db.database import supabase_client
 from app.auth.auth_handler import get_current_user
 from app.utils.simple_email_service import send_seller_application_status_email
+from app.utils.signed_uploads import finalize_document, SignedUploadError
+import asyncio
 import bcrypt
 import logging
 from uuid import uuid4
@@ -47,13 +49,18 @@ async def submit_seller_application(
     password: str = Form(...),
     phone_number: Optional[str] = Form(None),
     status: str = Form("pending"),  # Default to 'pending'
-    business_permit: UploadFile = File(...),
-    valid_id: UploadFile = File(...),
-    dti_registration: Optional[UploadFile] = File(None)
+    business_permit: Optional[UploadFile] = File(None),
+    valid_id: Optional[UploadFile] = File(None),
+    dti_registration: Optional[UploadFile] = File(None),
+    # Upload tokens from /seller-application/upload-urls, for documents uploaded straight to storage
+    business_permit_upload: Optional[str] = Form(None),
+    valid_id_upload: Optional[str] = Form(None),
+    dti_registration_upload: Optional[str] = Form(None)
 ):
     """
     Submit a seller application.
     Handles form data and file uploads, storing them in Supabase and inserting a record into the store_user table.
+    Each document can be sent as a file or, when it was uploaded with a signed URL, as its upload token.
     """
     try:
         # Validate form data using Pydantic schema
@@ -66,6 +73,11 @@ async def submit_seller_application(
             status=status
         )
 
+        if business_permit is None and not business_permit_upload:
+            raise HTTPException(status_code=400, detail="A business permit is required")
+        if valid_id is None and not valid_id_upload:
+            raise HTTPException(status_code=400, detail="A valid ID is required")
+
         # Validate file types and sizes (max 5MB)
         max_size_bytes = 5 * 1024 * 1024
         for file in [business_permit, valid_id, dti_registration]:
@@ -123,9 +135,20 @@ async def submit_seller_application(
                 logger.error(f"Failed to upload file to {bucket}: {str(e)}")
                 raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
 
-        business_permit_path = await upload_file(business_permit, "permits")
-        valid_id_path = await upload_file(valid_id, "valid-ids")
-        dti_registration_path = await upload_file(dti_registration, "dti") if dti_registration else None
+        async def document_path(file: Optional[UploadFile], upload_token: Optional[str], kind: str, bucket: str) -> Optional[str]:
+            if file is not None:
+                return await upload_file(file, bucket)
+            if not upload_token:
+                return None
+            # Already in storage; only check its type and size
+            try:
+                return await asyncio.to_thread(finalize_document, upload_token, kind)
+            except SignedUploadError as e:
+                raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        business_permit_path = await document_path(business_permit, business_permit_upload, "business_permit", "permits")
+        valid_id_path = await document_path(valid_id, valid_id_upload, "valid_id", "valid-ids")
+        dti_registration_path = await document_path(dti_registration, dti_registration_upload, "dti_registration", "dti")
 
         # Insert into store_user table
         user_data = {
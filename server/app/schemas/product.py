@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import List, Union, Optional
 from uuid import UUID
 
@@ -19,3 +19,40 @@ class Products(BaseModel):
     store_id: Union[UUID, str]
     town: Optional[str] = None
     views: Optional[int] = 0
+
+class ProductPatch(BaseModel):
+    """Fields of a product that a partial update may change; unset fields are left alone."""
+    name: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[str] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    location_name: Optional[str] = None
+    address: Optional[str] = None
+    latitude: Optional[str] = None
+    longitude: Optional[str] = None
+    ar_asset_url: Optional[str] = None
+    image_urls: Optional[List[str]] = None
+    in_stock: Optional[bool] = None
+    town: Optional[str] = None
+
+    # These columns are NOT NULL, so an explicit null is a 422 rather than a failed update
+    @field_validator(
+        "name", "description", "category", "price_min", "price_max", "location_name", "address",
+        "latitude", "longitude", "ar_asset_url", "image_urls", "in_stock"
+    )
+    @classmethod
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("may not be null; leave the field out to keep it")
+        return value
+
+class AdminProductPatch(ProductPatch):
+    store_id: Optional[Union[UUID, str]] = None
+
+    @field_validator("store_id")
+    @classmethod
+    def reject_null_store(cls, value):
+        if value is None:
+            raise ValueError("may not be null; leave the field out to keep it")
+        return value
@@ -1,6 +1,13 @@
 from typing import Optional, Union
 from uuid import UUID
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+
+class StoreStats(BaseModel):
+    product_count: int = 0
+    category_count: int = 0
+    total_views: int = 0
+    review_count: int = 0
+    average_rating: float = 0
 
 class Store(BaseModel):
     store_id: Union[UUID, str]  # Accept UUID or string
@@ -12,4 +19,26 @@ class Store(BaseModel):
     store_image: Optional[str] = None  # Make it optional
     type: Optional[str] = None  # Make it optional as well based on previous error
     operating_hours: Optional[str] = None  # For highlights
-    phone: Optional[str] = None           # For highlights
\ No newline at end of file
+    phone: Optional[str] = None           # For highlights
+    stats: Optional[StoreStats] = None    # Maintained in store_stats
+
+class StorePatch(BaseModel):
+    """Fields of a store that a partial update may change; unset fields are left alone."""
+    name: Optional[str] = None
+    description: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    rating: Optional[float] = None
+    store_image: Optional[str] = None
+    type: Optional[str] = None
+    operating_hours: Optional[str] = None
+    phone: Optional[str] = None
+    town: Optional[str] = None
+
+    # These columns are NOT NULL, so an explicit null is a 422 rather than a failed update
+    @field_validator("name", "description", "latitude", "longitude", "rating")
+    @classmethod
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("may not be null; leave the field out to keep it")
+        return value
@@ -1,10 +1,248 @@
 from app.db.database import supabase_client
+from postgrest.exceptions import APIError
+import asyncio
+import json
 import logging
-from typing import Optional
+import os
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
 from uuid import UUID
 
 logger = logging.getLogger(__name__)
 
+# Buffer configuration
+ACTIVITY_FLUSH_INTERVAL_MS = int(os.getenv("ACTIVITY_FLUSH_INTERVAL_MS", "500"))
+ACTIVITY_FLUSH_BATCH_SIZE = int(os.getenv("ACTIVITY_FLUSH_BATCH_SIZE", "50"))
+ACTIVITY_BUFFER_MAX_ENTRIES = int(os.getenv("ACTIVITY_BUFFER_MAX_ENTRIES", "5000"))
+ACTIVITY_SPILL_FILE = Path(os.getenv("ACTIVITY_SPILL_FILE", "admin_activities_spill.jsonl"))
+
+# Longest wait between attempts to replay the spill file while the database is down
+ACTIVITY_REPLAY_MAX_BACKOFF_SECONDS = float(os.getenv("ACTIVITY_REPLAY_MAX_BACKOFF_SECONDS", "60"))
+
+# SQLSTATE classes of rows the database rejects (data exceptions, integrity violations)
+REJECTED_ROW_SQLSTATE_CLASSES = ("22", "23")
+
+def _rejected_by_database(e: Exception) -> bool:
+    """Whether an insert failed because of the row itself rather than an unreachable database."""
+    return isinstance(e, APIError) and str(e.code or "")[:2] in REJECTED_ROW_SQLSTATE_CLASSES
+
+class ActivityBuffer:
+    """
+    In-process buffer for admin activity rows.
+
+    Handlers append rows without waiting on the database. A background task flushes
+    them with multi-row inserts every flush interval or as soon as a full batch is
+    queued. Rows that cannot be inserted, or that arrive while the buffer is full,
+    are appended to a local spill file and replayed once the database is reachable,
+    backing off while it is not. When a batch fails its rows are retried one by
+    one, and rows the database rejects are moved to a quarantine file next to the
+    spill file so they cannot block the rows behind them.
+    """
+
+    def __init__(self, flush_interval_ms: int, batch_size: int, max_entries: int, spill_file: Path):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self.spill_file = spill_file
+        self.quarantine_file = spill_file.with_name(f"{spill_file.name}.rejected")
+        self._replay_backoff = 0.0
+        self._next_replay = 0.0
+        self._entries = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def add(self, activity_data: dict) -> None:
+        """Queue an activity row for the next flush."""
+        if len(self._entries) >= self.max_entries:
+            logger.warning("Admin activity buffer is full, spilling entry to disk")
+            self._spill([activity_data])
+            return
+
+        self._entries.append(activity_data)
+        if len(self._entries) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """Start the background flush task."""
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Admin activity buffer started")
+
+    async def stop(self) -> None:
+        """Stop the background task and flush everything that is still queued."""
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info("Admin activity buffer stopped")
+
+    async def _run(self) -> None:
+        # Replay anything left over from a previous run before taking new entries
+        async with self._lock:
+            self._adopt_orphaned_replays()
+            await self._replay_spill()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Insert all queued rows in batches of at most batch_size."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while self._entries:
+                batch = [self._entries.popleft() for _ in range(min(self.batch_size, len(self._entries)))]
+                if not await self._insert(batch):
+                    self._spill(batch)
+                    return
+
+            if self.spill_file.exists() and time.monotonic() >= self._next_replay:
+                await self._replay_spill()
+
+    async def _insert_rows(self, rows: List[dict]) -> None:
+        response = await asyncio.to_thread(
+            lambda: supabase_client.table("admin_activities").insert(rows).execute()
+        )
+        if not response.data:
+            raise RuntimeError(f"Failed to log {len(rows)} admin activities")
+
+    async def _insert(self, batch: List[dict]) -> bool:
+        """
+        Insert a batch, falling back to one row at a time when the batch fails.
+
+        Rows the database rejects are quarantined. Returns False when the
+        database could not be reached; the caller then keeps the whole batch.
+        """
+        try:
+            await self._insert_rows(batch)
+            logger.info(f"Flushed {len(batch)} admin activities")
+            return True
+        except Exception as e:
+            if not _rejected_by_database(e):
+                logger.error(f"Error flushing admin activities: {str(e)}")
+                return False
+            logger.warning(f"Admin activity batch was rejected, retrying row by row: {str(e)}")
+
+        inserted = 0
+        for index, row in enumerate(batch):
+            try:
+                await self._insert_rows([row])
+                inserted += 1
+            except Exception as e:
+                if not _rejected_by_database(e):
+                    logger.error(f"Error flushing admin activities: {str(e)}")
+                    # Rows inserted so far are in; keep only the rest for the next attempt
+                    del batch[:index]
+                    return False
+                logger.error(f"Quarantining admin activity the database rejected: {str(e)}")
+                self._quarantine(row)
+        logger.info(f"Flushed {inserted} admin activities one by one")
+        return True
+
+    def _quarantine(self, row: dict) -> None:
+        try:
+            with open(self.quarantine_file, "a", encoding="utf-8") as quarantine:
+                quarantine.write(json.dumps(row) + "\n")
+        except Exception as e:
+            logger.error(f"Error writing admin activity quarantine file: {str(e)}")
+
+    def _spill(self, batch: List[dict]) -> None:
+        try:
+            with open(self.spill_file, "a", encoding="utf-8") as spill:
+                for activity_data in batch:
+                    spill.write(json.dumps(activity_data) + "\n")
+            logger.warning(f"Spilled {len(batch)} admin activities to {self.spill_file}")
+        except Exception as e:
+            logger.error(f"Error writing admin activity spill file: {str(e)}")
+
+    def _adopt_orphaned_replays(self) -> None:
+        """Move replay files of crashed processes back into the spill file."""
+        for orphan in self.spill_file.parent.glob(f"{self.spill_file.name}.*.replay"):
+            pid = orphan.name[len(self.spill_file.name) + 1:-len(".replay")]
+            if pid.isdigit() and int(pid) != os.getpid() and _process_alive(int(pid)):
+                continue
+            # Claim the file first so two starting workers never adopt it both
+            adopted = orphan.with_name(f"{orphan.name}.{os.getpid()}.adopted")
+            try:
+                os.replace(orphan, adopted)
+                with open(adopted, "r", encoding="utf-8") as source, open(self.spill_file, "a", encoding="utf-8") as spill:
+                    spill.write(source.read())
+                adopted.unlink()
+                logger.warning(f"Recovered spilled admin activities from {orphan}")
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.error(f"Error recovering admin activity replay file {orphan}: {str(e)}")
+
+    def _replay_failed(self) -> None:
+        self._replay_backoff = min(max(self._replay_backoff * 2, self.flush_interval), ACTIVITY_REPLAY_MAX_BACKOFF_SECONDS)
+        self._next_replay = time.monotonic() + self._replay_backoff
+
+    async def _replay_spill(self) -> None:
+        """Insert the rows of the spill file; the caller must hold self._lock."""
+        if not self.spill_file.exists():
+            return
+
+        # Move the file aside first so rows spilled while replaying go to a fresh file
+        replaying = self.spill_file.with_name(f"{self.spill_file.name}.{os.getpid()}.replay")
+        try:
+            os.replace(self.spill_file, replaying)
+            with open(replaying, "r", encoding="utf-8") as spill:
+                spilled = [json.loads(line) for line in spill if line.strip()]
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Error reading admin activity spill file: {str(e)}")
+            return
+
+        for start in range(0, len(spilled), self.batch_size):
+            batch = spilled[start:start + self.batch_size]
+            if not await self._insert(batch):
+                # Keep the rows that were not inserted for the next attempt
+                self._spill(batch + spilled[start + self.batch_size:])
+                replaying.unlink(missing_ok=True)
+                self._replay_failed()
+                return
+
+        replaying.unlink(missing_ok=True)
+        self._replay_backoff = 0.0
+        self._next_replay = 0.0
+        logger.info(f"Replayed {len(spilled)} spilled admin activities")
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# Shared buffer used by log_admin_activity
+activity_buffer = ActivityBuffer(
+    ACTIVITY_FLUSH_INTERVAL_MS,
+    ACTIVITY_FLUSH_BATCH_SIZE,
+    ACTIVITY_BUFFER_MAX_ENTRIES,
+    ACTIVITY_SPILL_FILE
+)
+
 async def log_admin_activity(
     admin_user: dict,
     activity_type: str,
@@ -14,6 +252,10 @@ async def log_admin_activity(
     """
     Logs admin activities to the admin_activities table.
 
+    The row is queued on the in-process activity buffer and written by its background
+    flush task, so logging never adds a database round trip to the calling request
+    and never fails it.
+
     Args:
         admin_user: The admin user performing the action (from get_current_user)
         activity_type: The type of activity ('added', 'edited', 'deleted', 'archived', 'restored', 'permanently deleted')
@@ -59,21 +301,18 @@ async def log_admin_activity(
         # Format the object field
         object_field = f"{object_type}: {object_name}"
 
-        # Log to admin_activities table
+        # Queue for the admin_activities table
         activity_data = {
             "admin_id": str(admin_id),  # Convert UUID to string for Supabase
             "admin_name": admin_name,
             "activity": db_activity_type,  # Use the mapped activity type that's compatible with the database
-            "object": object_field
+            "object": object_field,
+            "created_at": datetime.utcnow().isoformat()  # Keep the time of the action, not of the flush
         }
 
-        response = supabase_client.table("admin_activities").insert(activity_data).execute()
-
-        if not response.data:
-            logger.error(f"Failed to log admin activity: {activity_type} (mapped to {db_activity_type}) {object_field}")
-        else:
-            logger.info(f"Admin activity logged: {admin_name} {activity_type} (mapped to {db_activity_type}) {object_field}")
+        activity_buffer.add(activity_data)
+        logger.info(f"Admin activity queued: {admin_name} {activity_type} (mapped to {db_activity_type}) {object_field}")
 
     except Exception as e:
+        # Audit logging must never fail the user's request
         logger.error(f"Error logging admin activity: {str(e)}")
-        raise  # Re-raise the exception to be handled by the caller if needed
\ No newline at end of file
@@ -0,0 +1,244 @@
+from app.utils.product_catalog import CatalogListener, ProductCatalog
+from typing import Dict, Hashable, List, Optional
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Initial number of rows allocated for the columns
+INITIAL_CAPACITY = 1024
+
+# Compact the columns when more than this fraction of the rows are deleted
+MAX_DELETED_FRACTION = 0.5
+
+def to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+class Encoder:
+    """Dictionary encoding of a categorical column; unknown or empty values encode to -1."""
+
+    def __init__(self):
+        self.values: List[Hashable] = []
+        self.codes: Dict[Hashable, int] = {}
+
+    def encode(self, value) -> int:
+        if value is None or value == "":
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value) -> int:
+        """Code of an existing value, or -2 when it has never been seen (matches no row)."""
+        return self.codes.get(value, -2)
+
+class CatalogColumns(CatalogListener):
+    """
+    Columnar NumPy snapshot of the product catalog.
+
+    Each product occupies one row of fixed-width arrays: prices, views, rating
+    and review count, stock flag and dictionary-encoded category, town and store.
+    Filters build boolean masks and sorts use argpartition/lexsort over the
+    masked rows, so catalog-wide counts, sums and top-N queries never touch the
+    database. Writes update rows in place; deleted rows are tombstoned and the
+    arrays are compacted once enough of them accumulate.
+    """
+
+    rebuild_in_thread = True
+
+    _COLUMNS = ("ids", "active", "price_min", "price_max", "views", "rating", "review_count",
+                "in_stock", "category", "town", "store")
+
+    def __init__(self):
+        self.categories = Encoder()
+        self.towns = Encoder()
+        self.stores = Encoder()
+        self.rows: Dict[int, int] = {}
+        self.size = 0
+        self._allocate(INITIAL_CAPACITY)
+
+    def _allocate(self, capacity: int) -> None:
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.price_min = np.full(capacity, np.nan)
+        self.price_max = np.full(capacity, np.nan)
+        self.views = np.zeros(capacity, dtype=np.int64)
+        self.rating = np.zeros(capacity, dtype=np.float64)
+        self.review_count = np.zeros(capacity, dtype=np.int64)
+        self.in_stock = np.zeros(capacity, dtype=bool)
+        self.category = np.full(capacity, -1, dtype=np.int32)
+        self.town = np.full(capacity, -1, dtype=np.int32)
+        self.store = np.full(capacity, -1, dtype=np.int32)
+
+    def _grow(self) -> None:
+        capacity = len(self.ids) * 2
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self.active[:self.size])
+        for name in self._COLUMNS:
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+        self.active[len(keep):self.size] = False
+        self.size = len(keep)
+        self.rows = {int(product_id): row for row, product_id in enumerate(self.ids[:self.size])}
+
+    def _write(self, product: dict, catalog: ProductCatalog) -> None:
+        row = self.rows.get(product["id"])
+        if row is None:
+            if self.size == len(self.ids):
+                self._grow()
+            row = self.rows[product["id"]] = self.size
+            self.size += 1
+
+        store = catalog.stores.get(product.get("store_id")) or {}
+        stats = catalog.ratings.get(product["id"]) or {}
+        self.ids[row] = product["id"]
+        self.active[row] = True
+        self.price_min[row] = to_float(product.get("price_min"))
+        self.price_max[row] = to_float(product.get("price_max"))
+        self.views[row] = product.get("views") or 0
+        self.rating[row] = catalog.average_rating(product["id"])
+        self.review_count[row] = stats.get("review_count") or 0
+        self.in_stock[row] = bool(product.get("in_stock"))
+        self.category[row] = self.categories.encode(product.get("category"))
+        self.town[row] = self.towns.encode(product.get("town") or store.get("town"))
+        self.store[row] = self.stores.encode(product.get("store_id"))
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        self.categories = Encoder()
+        self.towns = Encoder()
+        self.stores = Encoder()
+        self.rows = {}
+        self.size = 0
+        capacity = INITIAL_CAPACITY
+        while capacity < len(catalog.products):
+            capacity *= 2
+        self._allocate(capacity)
+        for product in catalog.products.values():
+            self._write(product, catalog)
+        logger.info(f"Catalog columns built: {self.size} products")
+
+    def products_changed(self, catalog: ProductCatalog, products: List[dict]) -> None:
+        for product in products:
+            self._write(product, catalog)
+
+    def products_removed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            row = self.rows.pop(product_id, None)
+            if row is not None:
+                self.active[row] = False
+        if self.size and (self.size - len(self.rows)) > self.size * MAX_DELETED_FRACTION:
+            self._compact()
+
+    def stores_changed(self, catalog: ProductCatalog, stores: List[dict]) -> None:
+        # Products without a town of their own use their store's town
+        store_codes = [self.stores.lookup(store["store_id"]) for store in stores]
+        for row in np.flatnonzero(np.isin(self.store[:self.size], store_codes) & self.active[:self.size]):
+            product = catalog.products.get(int(self.ids[row]))
+            if product is not None:
+                self._write(product, catalog)
+
+    def ratings_changed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            row = self.rows.get(product_id)
+            if row is not None:
+                self.rating[row] = catalog.average_rating(product_id)
+                self.review_count[row] = catalog.ratings[product_id]["review_count"]
+
+    def views_changed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            row = self.rows.get(product_id)
+            if row is not None:
+                self.views[row] = catalog.products[product_id].get("views") or 0
+
+    def mask(
+        self,
+        category: Optional[str] = None,
+        town: Optional[str] = None,
+        store_id: Optional[str] = None,
+        in_stock: Optional[bool] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_rating: Optional[float] = None
+    ) -> np.ndarray:
+        """Boolean mask over the first `size` rows of the products matching every given filter."""
+        mask = self.active[:self.size].copy()
+        if category is not None:
+            mask &= self.category[:self.size] == self.categories.lookup(category)
+        if town is not None:
+            mask &= self.town[:self.size] == self.towns.lookup(town)
+        if store_id is not None:
+            mask &= self.store[:self.size] == self.stores.lookup(store_id)
+        if in_stock is not None:
+            mask &= self.in_stock[:self.size] == in_stock
+        # Price filters match products whose price range overlaps the requested range
+        if min_price is not None:
+            mask &= ~(np.fmax(self.price_max[:self.size], self.price_min[:self.size]) < min_price)
+        if max_price is not None:
+            mask &= ~(self.price_min[:self.size] > max_price)
+        if min_rating is not None:
+            mask &= self.rating[:self.size] >= min_rating
+        return mask
+
+    def filter_ids(self, mask: np.ndarray) -> List[int]:
+        return self.ids[:self.size][mask].tolist()
+
+    def count(self, mask: np.ndarray) -> int:
+        return int(np.count_nonzero(mask))
+
+    def total(self, column: str, mask: np.ndarray) -> float:
+        """Sum of a numeric column over the masked rows, ignoring missing values."""
+        return np.nansum(getattr(self, column)[:self.size][mask]).item()
+
+    def distinct_count(self, column: str, mask: np.ndarray) -> int:
+        """Number of distinct non-empty values of an encoded column over the masked rows."""
+        codes = getattr(self, column)[:self.size][mask]
+        return int(np.unique(codes[codes >= 0]).size)
+
+    def value_counts(self, column: str, mask: np.ndarray) -> Dict[Hashable, int]:
+        """Counts per value of an encoded column over the masked rows, skipping empty values."""
+        encoder = {"category": self.categories, "town": self.towns, "store": self.stores}[column]
+        codes = getattr(self, column)[:self.size][mask]
+        counts = np.bincount(codes[codes >= 0], minlength=len(encoder.values))
+        return {encoder.values[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+
+    def band_counts(self, column: str, edges: List[float], mask: np.ndarray) -> List[int]:
+        """Counts of the masked rows per [edges[i], edges[i + 1]) band of a numeric column."""
+        values = getattr(self, column)[:self.size][mask]
+        counts, _ = np.histogram(values[~np.isnan(values)], bins=edges)
+        return counts.tolist()
+
+    def top(self, sort_by: List[str], limit: int, mask: np.ndarray, descending: bool = True) -> List[int]:
+        """
+        Product ids of the first `limit` masked rows ordered by one or more numeric columns.
+
+        The first column is the primary sort key; later columns break ties. Missing
+        values sort last.
+        """
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0 or limit <= 0:
+            return []
+        sign = -1 if descending else 1
+        keys = [np.nan_to_num(sign * getattr(self, name)[:self.size][rows].astype(np.float64), nan=np.inf)
+                for name in sort_by]
+
+        # Narrow down to the rows that can reach the top on the primary key before the full sort
+        if len(rows) > limit and len(sort_by) == 1:
+            candidates = np.argpartition(keys[0], limit - 1)[:limit]
+        else:
+            candidates = np.arange(len(rows))
+        order = np.lexsort([key[candidates] for key in reversed(keys)])[:limit]
+        return self.ids[:self.size][rows[candidates[order]]].tolist()
+
+# Shared columnar snapshot, registered with the product catalog on startup
+catalog_columns = CatalogColumns()
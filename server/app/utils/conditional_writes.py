@@ -0,0 +1,69 @@
+from app.db.database import supabase_client
+from postgrest.types import ReturnMethod
+from typing import Any, List, Optional
+
+def _filtered(query, filters: dict):
+    # A None filter matches rows where the column is NULL
+    for column, value in filters.items():
+        query = query.is_(column, "null") if value is None else query.eq(column, value)
+    return query
+
+def update_where(table: str, values: dict, **filters: Any) -> List[dict]:
+    """
+    Update the rows matching every filter and return them in one round trip.
+
+    Ownership is checked by the filters themselves (for example id and store_id),
+    so an empty result means the row is missing or not owned.
+    """
+    query = supabase_client.table(table).update(values, returning=ReturnMethod.representation)
+    return _filtered(query, filters).execute().data or []
+
+def delete_where(table: str, **filters: Any) -> List[dict]:
+    """Delete the rows matching every filter and return them; empty when nothing matched."""
+    query = supabase_client.table(table).delete(returning=ReturnMethod.representation)
+    return _filtered(query, filters).execute().data or []
+
+def row_exists(table: str, column: str, value: Any) -> bool:
+    """
+    Whether a row with the given key exists.
+
+    Only used after a conditional write matched nothing, to tell a missing row
+    (404) from one owned by someone else (403).
+    """
+    response = supabase_client.table(table).select(column).eq(column, value).limit(1).execute()
+    return bool(response.data)
+
+def _same_value(current: Any, value: Any) -> bool:
+    # Numeric columns can come back as int, float or string depending on their type
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and current is not None:
+        try:
+            return float(current) == float(value)
+        except (TypeError, ValueError):
+            return False
+    return current == value
+
+def changed_values(current: Optional[dict], values: dict) -> dict:
+    """
+    The subset of values that differs from the current row.
+
+    Columns the current row does not hold (or every column, without a current
+    row) are kept, so a partial cached row never hides a change.
+    """
+    if current is None:
+        return dict(values)
+    return {
+        column: value for column, value in values.items()
+        if column not in current or not _same_value(current[column], value)
+    }
+
+def unchanged_row(table: str, values: dict, **filters: Any) -> Optional[dict]:
+    """
+    The row matching every filter, read from the database, when it already holds all values.
+
+    Cached rows can be stale, so a write they suggest is a no-op is only skipped
+    when this returns a row; None means the write is needed.
+    """
+    rows = _filtered(supabase_client.table(table).select("*"), filters).limit(1).execute().data
+    if rows and not changed_values(rows[0], values):
+        return rows[0]
+    return None
@@ -0,0 +1,154 @@
+from app.utils.product_catalog import CatalogListener, ProductCatalog
+from app.utils.search_index import tokenize
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+import zlib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# MinHash signature length, split into LSH bands of MINHASH_BAND_ROWS rows
+MINHASH_PERMUTATIONS = 64
+MINHASH_BAND_ROWS = 4
+
+# Minimum estimated Jaccard similarity for two listings to count as duplicates
+DUPLICATE_THRESHOLD = 0.6
+
+# Character shingle size for names
+NAME_SHINGLE_SIZE = 4
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+def product_shingles(product: dict) -> Set[int]:
+    """Hashed character shingles of the name and word bigrams of the description."""
+    shingles = set()
+    name = " ".join(tokenize(product.get("name")))
+    if name:
+        padded = f" {name} "
+        for i in range(max(1, len(padded) - NAME_SHINGLE_SIZE + 1)):
+            shingles.add(zlib.crc32(("n:" + padded[i:i + NAME_SHINGLE_SIZE]).encode("utf-8")))
+    words = tokenize(product.get("description"))
+    for i in range(len(words) - 1):
+        shingles.add(zlib.crc32(f"d:{words[i]} {words[i + 1]}".encode("utf-8")))
+    return shingles
+
+class DuplicateProductIndex(CatalogListener):
+    """
+    MinHash/LSH index of near-duplicate product listings.
+
+    Each listing is reduced to a MinHash signature of its name and description
+    shingles. Signatures are split into bands and every band is hashed into a
+    bucket, so a new listing is only compared with the listings sharing one of
+    its buckets instead of the whole catalog. Candidate pairs whose estimated
+    Jaccard similarity passes DUPLICATE_THRESHOLD are kept as duplicate edges,
+    and clusters are the connected components of those edges.
+    """
+
+    rebuild_in_thread = True
+
+    def __init__(self):
+        generator = np.random.RandomState(1)
+        self._a = generator.randint(1, np.iinfo(np.int64).max, MINHASH_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+        self._b = generator.randint(0, np.iinfo(np.int64).max, MINHASH_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.buckets: Dict[Tuple[int, bytes], Set[int]] = {}
+        self.duplicates: Dict[int, Dict[int, float]] = {}
+
+    def _signature(self, product: dict) -> Optional[np.ndarray]:
+        shingles = product_shingles(product)
+        if not shingles:
+            return None
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        with np.errstate(over="ignore"):
+            permuted = (np.outer(hashes, self._a) + self._b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * MINHASH_BAND_ROWS:(band + 1) * MINHASH_BAND_ROWS].tobytes())
+            for band in range(MINHASH_PERMUTATIONS // MINHASH_BAND_ROWS)
+        ]
+
+    def _link(self, first: int, second: int, similarity: float) -> None:
+        self.duplicates.setdefault(first, {})[second] = similarity
+        self.duplicates.setdefault(second, {})[first] = similarity
+
+    def _remove(self, product_id: int) -> None:
+        signature = self.signatures.pop(product_id, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(product_id)
+                if not bucket:
+                    del self.buckets[key]
+        for other_id in self.duplicates.pop(product_id, {}):
+            others = self.duplicates.get(other_id)
+            if others is not None:
+                others.pop(product_id, None)
+                if not others:
+                    del self.duplicates[other_id]
+
+    def _add(self, product: dict) -> None:
+        signature = self._signature(product)
+        if signature is None:
+            return
+        product_id = product["id"]
+        candidates = set()
+        for key in self._band_keys(signature):
+            bucket = self.buckets.setdefault(key, set())
+            candidates.update(bucket)
+            bucket.add(product_id)
+        self.signatures[product_id] = signature
+
+        for other_id in candidates:
+            similarity = float(np.mean(self.signatures[other_id] == signature))
+            if similarity >= DUPLICATE_THRESHOLD:
+                self._link(product_id, other_id, similarity)
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        self.signatures = {}
+        self.buckets = {}
+        self.duplicates = {}
+        for product in catalog.products.values():
+            self._add(product)
+        logger.info(f"Duplicate product index built: {len(self.signatures)} products, {len(self.duplicates)} with duplicates")
+
+    def products_changed(self, catalog: ProductCatalog, products: List[dict]) -> None:
+        for product in products:
+            self._remove(product["id"])
+            self._add(product)
+
+    def products_removed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            self._remove(product_id)
+
+    def duplicates_of(self, product_id: int) -> List[Tuple[int, float]]:
+        """Listings detected as duplicates of a product with their estimated similarity, best first."""
+        return sorted(self.duplicates.get(product_id, {}).items(), key=lambda item: -item[1])
+
+    def clusters(self) -> List[List[int]]:
+        """Connected components of the duplicate edges, largest first."""
+        seen: Set[int] = set()
+        clusters = []
+        for product_id in self.duplicates:
+            if product_id in seen:
+                continue
+            cluster = []
+            stack = [product_id]
+            seen.add(product_id)
+            while stack:
+                current = stack.pop()
+                cluster.append(current)
+                for other_id in self.duplicates.get(current, {}):
+                    if other_id not in seen:
+                        seen.add(other_id)
+                        stack.append(other_id)
+            clusters.append(sorted(cluster))
+        clusters.sort(key=lambda cluster: (-len(cluster), cluster[0]))
+        return clusters
+
+# Shared duplicate index, registered with the product catalog on startup
+duplicate_product_index = DuplicateProductIndex()
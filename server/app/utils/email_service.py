@@ -5,6 +5,7 @@ import logging
 from pathlib import Path
 import os
 from app.config import EMAIL_USERNAME, EMAIL_FROM, EMAILER_PASSWORD, CLIENT_URL
+from app.utils.email_templates import template_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -43,11 +44,6 @@ logger.info(f"Mail configuration: SERVER=smtp.gmail.com, PORT=587, USERNAME={EMA
 logger.info(f"Templates folder: {templates_dir}")
 logger.info(f"Templates exist: {templates_dir.exists()}")
 
-# List template files
-if templates_dir.exists():
-    template_files = list(templates_dir.glob("*.html"))
-    logger.info(f"Template files found: {[f.name for f in template_files]}")
-
 # Initialize FastMail
 fastmail = FastMail(conf)
 
@@ -76,23 +72,22 @@ async def send_email(
         logger.info(f"Subject: {subject}")
 
         if template_name and template_body:
-            # Check if template file exists
-            template_path = templates_dir / template_name
-            if not template_path.exists():
-                logger.error(f"Template file not found: {template_path}")
+            # Render from the compiled template cache
+            html_body = template_registry.render(template_name, template_body)
+            if html_body is None:
+                logger.error(f"Template could not be rendered: {template_name}")
                 return False
 
             logger.info(f"Using template: {template_name}")
-            logger.info(f"Template variables: {template_body}")
 
-            # Send email using HTML template
+            # Send email using the pre-rendered HTML template
             message = MessageSchema(
                 subject=subject,
                 recipients=recipients,
-                template_body=template_body,
+                body=html_body,
                 subtype="html"
             )
-            await fastmail.send_message(message, template_name=template_name)
+            await fastmail.send_message(message)
         else:
             # Send plain text email
             logger.info("Sending plain text email")
@@ -161,17 +156,8 @@ async def send_seller_application_status_email(
 
         logger.info(f"Client URL for email: {CLIENT_URL}")
 
-        # Create a fallback plain text message in case template fails
-        plain_text_body = f"""
-Dear {first_name} {last_name},
-
-Your seller application for Produkto Elyu-Kal has been {status}.
-
-{'Congratulations! You can now log in to your seller dashboard and start setting up your store.' if status == 'accepted' else 'We appreciate your interest and hope to welcome you as a seller in the future.'}
-
-Best regards,
-The Produkto Elyu-Kal Team
-        """
+        # Render the fallback plain text message in case the HTML template fails
+        plain_text_body = template_registry.render("seller_application_status.txt", template_body) or ""
 
         # Try to send with template first
         template_result = await send_email(
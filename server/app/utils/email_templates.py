@@ -0,0 +1,96 @@
+from jinja2 import Environment, FileSystemLoader, Template, TemplateError, select_autoescape
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Templates directory
+templates_dir = Path(__file__).parent.parent / "templates"
+
+# File types that are compiled into the registry
+TEMPLATE_PATTERNS = ("*.html", "*.txt")
+
+class EmailTemplateRegistry:
+    """
+    Loads and compiles every email template once and renders from the compiled cache.
+
+    Templates are parsed eagerly so syntax errors surface at startup instead of
+    on the first email that needs them.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.environment = Environment(
+            loader=FileSystemLoader(str(directory)),
+            autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+            auto_reload=False,
+            keep_trailing_newline=True
+        )
+        self._templates: Dict[str, Template] = {}
+        self._loaded = False
+
+    def load(self) -> Dict[str, Template]:
+        """
+        Compile all templates in the templates directory.
+
+        Raises:
+            TemplateError: If any template fails to parse
+        """
+        if not self.directory.exists():
+            logger.error(f"Templates directory not found: {self.directory}")
+            self._templates = {}
+            self._loaded = True
+            return self._templates
+
+        compiled = {}
+        for pattern in TEMPLATE_PATTERNS:
+            for template_path in sorted(self.directory.glob(pattern)):
+                try:
+                    compiled[template_path.name] = self.environment.get_template(template_path.name)
+                except TemplateError as e:
+                    logger.error(f"Failed to compile email template {template_path.name}: {str(e)}")
+                    raise
+
+        self._templates = compiled
+        self._loaded = True
+        logger.info(f"Compiled email templates: {sorted(compiled.keys())}")
+        return self._templates
+
+    def has_template(self, template_name: str) -> bool:
+        """Check whether a compiled template is available."""
+        if not self._loaded:
+            self.load()
+        return template_name in self._templates
+
+    def render(self, template_name: str, context: Dict[str, Any]) -> Optional[str]:
+        """
+        Render a compiled template.
+
+        Args:
+            template_name: File name of the template inside the templates directory
+            context: Variables to pass to the template
+
+        Returns:
+            Optional[str]: The rendered template, or None if it is not registered or fails to render
+        """
+        if not self._loaded:
+            self.load()
+
+        template = self._templates.get(template_name)
+        if template is None:
+            logger.error(f"Email template not registered: {template_name}")
+            return None
+
+        try:
+            return template.render(**context)
+        except Exception as e:
+            logger.error(f"Error rendering email template {template_name}: {str(e)}")
+            return None
+
+# Shared registry used by the email services
+template_registry = EmailTemplateRegistry(templates_dir)
+
+def load_email_templates() -> None:
+    """Compile the email templates. Called once on application startup."""
+    template_registry.load()
@@ -0,0 +1,142 @@
+from app.db.database import supabase_client
+from http.cookies import SimpleCookie
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from typing import Iterable, List, Optional, Set, Tuple
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# How long a response is replayed for retries with the same Idempotency-Key
+IDEMPOTENCY_KEY_SECONDS = int(os.getenv("IDEMPOTENCY_KEY_SECONDS", str(24 * 60 * 60)))
+
+# How long a claimed key waits for its first request before another request may claim it
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "600"))
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+class IdempotencyMiddleware:
+    """
+    Replays the stored response of a request retried with the same Idempotency-Key.
+
+    Only the given (method, path) routes take part. Keys are scoped to the route
+    and the caller's credentials (Authorization header and the given session
+    cookies), so one client can never replay another's response. Keys and
+    responses live in the idempotency_keys table, so a retry is recognized on
+    every worker. The first request claims its key. A retry that arrives while
+    it is still running gets a 409. Once it finishes with a status below 500,
+    retries get its response back for IDEMPOTENCY_KEY_SECONDS without their body
+    being read, so uploads are not received or stored again. When the table
+    cannot be reached, requests are processed without replay protection.
+    """
+
+    def __init__(self, app, routes: Iterable[Tuple[str, str]], credential_cookies: Iterable[str] = (),
+                 ttl_seconds: int = IDEMPOTENCY_KEY_SECONDS, lock_seconds: int = IDEMPOTENCY_LOCK_SECONDS):
+        self.app = app
+        self.routes: Set[Tuple[str, str]] = set(routes)
+        self.credential_cookies = list(credential_cookies)
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+
+    def _cache_key(self, scope, headers: Headers, key: str) -> str:
+        cookies = SimpleCookie()
+        try:
+            cookies.load(headers.get("cookie", ""))
+        except Exception:
+            pass
+        parts: List[str] = [scope["method"], scope["path"], headers.get("authorization", "")]
+        parts.extend(cookies[name].value if name in cookies else "" for name in self.credential_cookies)
+        parts.append(key)
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    async def _claim(self, key_hash: str) -> Optional[dict]:
+        try:
+            response = await asyncio.to_thread(
+                lambda: supabase_client.rpc("claim_idempotency_key", {
+                    "p_key_hash": key_hash,
+                    "p_ttl_seconds": self.ttl_seconds,
+                    "p_lock_seconds": self.lock_seconds
+                }).execute()
+            )
+            return response.data
+        except Exception as e:
+            logger.error(f"Error claiming idempotency key: {str(e)}")
+            return None
+
+    async def _complete(self, key_hash: str, status: int, headers: list, body: bytes) -> None:
+        try:
+            await asyncio.to_thread(
+                lambda: supabase_client.table("idempotency_keys").update({
+                    "status_code": status,
+                    "headers": [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers],
+                    "body": base64.b64encode(body).decode("ascii")
+                }).eq("key_hash", key_hash).execute()
+            )
+        except Exception as e:
+            logger.error(f"Error storing idempotent response: {str(e)}")
+
+    async def _release(self, key_hash: str) -> None:
+        try:
+            await asyncio.to_thread(
+                lambda: supabase_client.table("idempotency_keys").delete().eq("key_hash", key_hash).execute()
+            )
+        except Exception as e:
+            logger.error(f"Error releasing idempotency key: {str(e)}")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        key = headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            await JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)(scope, receive, send)
+            return
+
+        key_hash = self._cache_key(scope, headers, key)
+        claim = await self._claim(key_hash)
+        if claim is None:
+            await self.app(scope, receive, send)
+            return
+
+        if claim["status"] == "completed":
+            logger.info(f"Replaying stored response for {scope['method']} {scope['path']}")
+            response_headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in claim["headers"] or []]
+            await send({"type": "http.response.start", "status": claim["status_code"],
+                        "headers": response_headers + [(b"idempotent-replayed", b"true")]})
+            await send({"type": "http.response.body", "body": base64.b64decode(claim["body"] or "")})
+            return
+
+        if claim["status"] == "in_flight":
+            await JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"}, status_code=409
+            )(scope, receive, send)
+            return
+
+        response = {"status": None, "headers": [], "body": []}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            # Server errors are not stored so the client can retry them
+            if response["status"] is not None and response["status"] < 500:
+                await self._complete(key_hash, response["status"], response["headers"], b"".join(response["body"]))
+            else:
+                await self._release(key_hash)
@@ -0,0 +1,380 @@
+from app.db.database import supabase_client
+from app.utils.product_catalog import CatalogListener, ProductCatalog, product_catalog
+from app.utils.storage import STORAGE_BUCKET, storage_path_from_public_url
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import io
+import logging
+import os
+import numpy as np
+from PIL import Image
+from scipy.fft import dctn
+
+logger = logging.getLogger(__name__)
+
+# Processes used to hash uploaded images off the event loop
+IMAGE_HASH_WORKERS = int(os.getenv("IMAGE_HASH_WORKERS", "2"))
+
+# Images within this Hamming distance of each other are reported as duplicates
+DUPLICATE_IMAGE_DISTANCE = 6
+
+# Rows fetched per request when loading stored hashes
+IMAGE_HASH_PAGE_SIZE = 1000
+
+# Images downloaded at the same time, and images hashed per stored batch, when backfilling
+IMAGE_HASH_BACKFILL_CONCURRENCY = int(os.getenv("IMAGE_HASH_BACKFILL_CONCURRENCY", "4"))
+IMAGE_HASH_BACKFILL_BATCH_SIZE = 100
+
+def compute_phash(content: bytes) -> int:
+    """
+    64-bit DCT perceptual hash of an image.
+
+    The image is reduced to 32x32 grayscale, and each bit of the hash tells
+    whether one of the 8x8 lowest-frequency DCT coefficients is above their median.
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        pixels = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low_frequencies = dctn(pixels, norm="ortho")[:8, :8].ravel()
+    bits = low_frequencies > np.median(low_frequencies[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+def to_signed(phash: int) -> int:
+    """Store unsigned 64-bit hashes in a Postgres bigint."""
+    return phash - (1 << 64) if phash >= 1 << 63 else phash
+
+def to_unsigned(phash: int) -> int:
+    return phash + (1 << 64) if phash < 0 else phash
+
+class BKTree:
+    """
+    Burkhard-Keller tree over 64-bit hashes with Hamming distance.
+
+    Children are keyed by their distance to the parent, so a lookup within
+    distance d only descends into children whose key is within d of the query's
+    distance to the node (triangle inequality). Every node holds the set of
+    keys sharing its hash; removed keys leave empty nodes behind, which are
+    dropped the next time the tree is rebuilt.
+    """
+
+    def __init__(self):
+        self.root: Optional[list] = None  # [hash, keys, {distance: child}]
+        self.size = 0
+        self.empty_nodes = 0
+
+    def add(self, phash: int, key) -> None:
+        if self.root is None:
+            self.root = [phash, {key}, {}]
+            self.size += 1
+            return
+        node = self.root
+        while True:
+            distance = (node[0] ^ phash).bit_count()
+            if distance == 0:
+                if not node[1]:
+                    self.empty_nodes -= 1
+                node[1].add(key)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [phash, {key}, {}]
+                self.size += 1
+                return
+            node = child
+
+    def remove(self, phash: int, key) -> None:
+        node = self.root
+        while node is not None:
+            distance = (node[0] ^ phash).bit_count()
+            if distance == 0:
+                if key in node[1]:
+                    node[1].discard(key)
+                    if not node[1]:
+                        self.empty_nodes += 1
+                return
+            node = node[2].get(distance)
+
+    def search(self, phash: int, max_distance: int) -> List[Tuple[int, object]]:
+        """Return (distance, key) of every key within max_distance of phash."""
+        results = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = (node[0] ^ phash).bit_count()
+            if distance <= max_distance:
+                results.extend((distance, key) for key in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        results.sort(key=lambda item: item[0])
+        return results
+
+class ImageHashIndex(CatalogListener):
+    """
+    Perceptual hashes of product images with fast near-duplicate lookups.
+
+    Uploaded images are hashed in a process pool and stored in
+    product_image_hashes; the in-memory BK-tree answers Hamming-distance
+    queries without scanning every image. Images of products that leave the
+    catalog (archived or deleted) are dropped from the tree and reloaded from
+    the table if the product comes back.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.tree = BKTree()
+        self.images: Dict[str, Tuple[int, int, Optional[str]]] = {}  # url -> (phash, product_id, store_id)
+        self.product_images: Dict[int, Set[str]] = {}
+        self.loaded = False
+        self._dropped: Set[int] = set()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        """Load the stored hashes into the BK-tree."""
+        try:
+            rows = await asyncio.to_thread(self._fetch_rows)
+            self.tree = BKTree()
+            self.images = {}
+            self.product_images = {}
+            self._dropped = set()
+            for row in rows:
+                self._add(row["image_url"], to_unsigned(row["phash"]), row["product_id"], row.get("store_id"))
+            if product_catalog.loaded:
+                self.catalog_loaded(product_catalog)
+            self.loaded = True
+            logger.info(f"Image hash index loaded: {len(self.images)} images")
+        except Exception as e:
+            logger.error(f"Failed to load image hashes: {str(e)}", exc_info=True)
+
+    async def stop(self) -> None:
+        """Wait for pending hashing and shut the worker pool down."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @staticmethod
+    def _fetch_rows(product_ids: Optional[List[int]] = None) -> List[dict]:
+        rows = []
+        start = 0
+        while True:
+            query = supabase_client.table("product_image_hashes").select("image_url, product_id, store_id, phash")
+            if product_ids is not None:
+                query = query.in_("product_id", product_ids)
+            response = query.order("image_url").range(start, start + IMAGE_HASH_PAGE_SIZE - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < IMAGE_HASH_PAGE_SIZE:
+                return rows
+            start += IMAGE_HASH_PAGE_SIZE
+
+    def _add(self, image_url: str, phash: int, product_id: int, store_id: Optional[str]) -> None:
+        self._remove(image_url)
+        self.images[image_url] = (phash, product_id, store_id)
+        self.product_images.setdefault(product_id, set()).add(image_url)
+        self.tree.add(phash, image_url)
+
+    def _remove(self, image_url: str) -> None:
+        image = self.images.pop(image_url, None)
+        if image is None:
+            return
+        phash, product_id, _ = image
+        self.tree.remove(phash, image_url)
+        urls = self.product_images.get(product_id)
+        if urls is not None:
+            urls.discard(image_url)
+            if not urls:
+                del self.product_images[product_id]
+
+    def _remove_product(self, product_id: int) -> None:
+        if product_id in self.product_images:
+            self._dropped.add(product_id)
+        for image_url in list(self.product_images.get(product_id, ())):
+            self._remove(image_url)
+        # Rebuild once removed images leave most of the tree empty
+        if self.tree.empty_nodes > self.tree.size // 2:
+            tree = BKTree()
+            for image_url, (phash, _, _) in self.images.items():
+                tree.add(phash, image_url)
+            self.tree = tree
+
+    async def hash_image(self, content: bytes) -> Optional[int]:
+        """Hash an image in the worker pool, or None if it cannot be decoded."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, compute_phash, content)
+        except Exception as e:
+            logger.warning(f"Could not compute perceptual hash: {str(e)}")
+            return None
+
+    async def index_product_images(self, product_id: int, store_id: Optional[str],
+                                   uploads: List[Tuple[str, bytes]], image_urls: Iterable[str]) -> None:
+        """Hash newly uploaded images and drop hashes of images the product no longer uses."""
+        hashes = await asyncio.gather(*(self.hash_image(content) for _, content in uploads))
+
+        # The product may have been edited while hashing; index against its current images
+        current = product_catalog.products.get(product_id)
+        image_urls = set(current.get("image_urls") or []) if current is not None else set(image_urls)
+        rows = [
+            {"image_url": image_url, "product_id": product_id, "store_id": store_id, "phash": to_signed(phash)}
+            for (image_url, _), phash in zip(uploads, hashes) if phash is not None and image_url in image_urls
+        ]
+        stale = [image_url for image_url in self.product_images.get(product_id, ()) if image_url not in image_urls]
+
+        try:
+            if rows:
+                await asyncio.to_thread(
+                    lambda: supabase_client.table("product_image_hashes").upsert(rows).execute()
+                )
+            if stale:
+                await asyncio.to_thread(
+                    lambda: supabase_client.table("product_image_hashes").delete().in_("image_url", stale).execute()
+                )
+        except Exception as e:
+            logger.error(f"Failed to store image hashes of product {product_id}: {str(e)}")
+
+        for image_url in stale:
+            self._remove(image_url)
+        for row in rows:
+            self._add(row["image_url"], to_unsigned(row["phash"]), product_id, store_id)
+
+    def schedule_product_images(self, product_id: int, store_id: Optional[str],
+                                uploads: List[Tuple[str, bytes]], image_urls: Iterable[str]) -> None:
+        """Index a product's images in the background so the upload response does not wait for hashing."""
+        self._schedule(self.index_product_images(product_id, store_id, uploads, list(image_urls)))
+
+    async def index_stored_image(self, product_id: int, store_id: Optional[str], bucket: str, path: str,
+                                 image_url: str, image_urls: Iterable[str]) -> None:
+        """Hash an image that was uploaded straight to storage, downloading it first."""
+        try:
+            content = await asyncio.to_thread(lambda: supabase_client.storage.from_(bucket).download(path))
+        except Exception as e:
+            logger.error(f"Failed to download {bucket}/{path} for hashing: {str(e)}")
+            return
+        await self.index_product_images(product_id, store_id, [(image_url, content)], image_urls)
+
+    def schedule_stored_image(self, product_id: int, store_id: Optional[str], bucket: str, path: str,
+                              image_url: str, image_urls: Iterable[str]) -> None:
+        """Index a directly uploaded image in the background."""
+        self._schedule(self.index_stored_image(product_id, store_id, bucket, path, image_url, list(image_urls)))
+
+    async def _hash_stored(self, semaphore: asyncio.Semaphore, image_url: str) -> Optional[int]:
+        path = storage_path_from_public_url(image_url)
+        if path is None:
+            return None
+        async with semaphore:
+            try:
+                content = await asyncio.to_thread(lambda: supabase_client.storage.from_(STORAGE_BUCKET).download(path))
+            except Exception as e:
+                logger.warning(f"Failed to download {image_url} for hashing: {str(e)}")
+                return None
+            return await self.hash_image(content)
+
+    async def backfill(self, progress: Optional[Callable[..., None]] = None) -> dict:
+        """
+        Hash the stored images of catalog products that have no hash yet.
+
+        Covers images uploaded before hashing existed. Images outside our storage
+        bucket are skipped. Hashes are stored in batches, so an interrupted
+        backfill resumes where it stopped when it is run again.
+        """
+        if not self.loaded or not product_catalog.loaded:
+            raise RuntimeError("The image hash index and the product catalog must be loaded first")
+
+        missing = [
+            (product_id, image_url)
+            for product_id, product in list(product_catalog.products.items())
+            for image_url in product.get("image_urls") or []
+            if image_url not in self.images
+        ]
+        semaphore = asyncio.Semaphore(IMAGE_HASH_BACKFILL_CONCURRENCY)
+        hashed = 0
+        skipped = 0
+
+        for start in range(0, len(missing), IMAGE_HASH_BACKFILL_BATCH_SIZE):
+            batch = missing[start:start + IMAGE_HASH_BACKFILL_BATCH_SIZE]
+            hashes = await asyncio.gather(*(self._hash_stored(semaphore, image_url) for _, image_url in batch))
+
+            rows = []
+            for (product_id, image_url), phash in zip(batch, hashes):
+                # Skip images that failed or that their product dropped while hashing
+                product = product_catalog.products.get(product_id)
+                if phash is None or product is None or image_url not in (product.get("image_urls") or []):
+                    skipped += 1
+                    continue
+                rows.append({"image_url": image_url, "product_id": product_id,
+                             "store_id": product.get("store_id"), "phash": to_signed(phash)})
+
+            if rows:
+                await asyncio.to_thread(
+                    lambda: supabase_client.table("product_image_hashes").upsert(rows).execute()
+                )
+                for row in rows:
+                    self._add(row["image_url"], to_unsigned(row["phash"]), row["product_id"], row["store_id"])
+                hashed += len(rows)
+
+            if progress is not None:
+                progress(total_images=len(missing), images_hashed=hashed, images_skipped=skipped)
+
+        logger.info(f"Image hash backfill finished: {hashed} hashed, {skipped} skipped of {len(missing)}")
+        return {"images_hashed": hashed, "images_skipped": skipped}
+
+    def find_similar(self, phash: int, max_distance: int = DUPLICATE_IMAGE_DISTANCE) -> List[dict]:
+        """Images within max_distance of a hash, nearest first."""
+        matches = []
+        for distance, image_url in self.tree.search(phash, max_distance):
+            _, product_id, store_id = self.images[image_url]
+            matches.append({"image_url": image_url, "product_id": product_id, "store_id": store_id, "distance": distance})
+        return matches
+
+    def product_duplicates(self, product_id: int, max_distance: int = DUPLICATE_IMAGE_DISTANCE) -> List[dict]:
+        """For each image of a product, the images of other products that look the same."""
+        results = []
+        for image_url in sorted(self.product_images.get(product_id, ())):
+            matches = [
+                match for match in self.find_similar(self.images[image_url][0], max_distance)
+                if match["product_id"] != product_id
+            ]
+            if matches:
+                results.append({"image_url": image_url, "matches": matches})
+        return results
+
+    async def _reload_products(self, product_ids: List[int]) -> None:
+        try:
+            rows = await asyncio.to_thread(self._fetch_rows, product_ids)
+        except Exception as e:
+            logger.error(f"Failed to reload image hashes of products {product_ids}: {str(e)}")
+            return
+        for row in rows:
+            self._add(row["image_url"], to_unsigned(row["phash"]), row["product_id"], row.get("store_id"))
+
+    def _schedule(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        for product_id in list(self.product_images):
+            if product_id not in catalog.products:
+                self._remove_product(product_id)
+        returned = [product_id for product_id in self._dropped if product_id in catalog.products]
+        if returned:
+            self._dropped.difference_update(returned)
+            self._schedule(self._reload_products(returned))
+
+    def products_changed(self, catalog: ProductCatalog, products: List[dict]) -> None:
+        # Restored products get their stored hashes back
+        returned = [product["id"] for product in products if product["id"] in self._dropped]
+        if returned:
+            self._dropped.difference_update(returned)
+            self._schedule(self._reload_products(returned))
+
+    def products_removed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            self._remove_product(product_id)
+
+# Shared image hash index, loaded on startup
+image_hash_index = ImageHashIndex(IMAGE_HASH_WORKERS)
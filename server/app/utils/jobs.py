@@ -0,0 +1,160 @@
+from app.db.database import supabase_client
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set
+import asyncio
+import copy
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# How long finished jobs stay queryable
+JOB_RETENTION_MINUTES = 60
+
+# Maximum number of row-level errors kept per job
+MAX_JOB_ERRORS = 1000
+
+# Changes to a job within this many seconds are written to the database together
+JOB_PERSIST_INTERVAL_SECONDS = float(os.getenv("JOB_PERSIST_INTERVAL_SECONDS", "0.5"))
+
+class JobRegistry:
+    """
+    Registry for long-running background jobs, shared by all workers.
+
+    Jobs are plain dicts so they can be returned from endpoints as they are. The
+    worker running a job keeps it in memory and writes it to the background_jobs
+    table after every change, coalescing bursts of changes into one write, so a
+    poll that reaches any worker sees its progress. Finished jobs are pruned after
+    JOB_RETENTION_MINUTES.
+    """
+
+    def __init__(self, persist_interval: float):
+        self.persist_interval = persist_interval
+        self._jobs: Dict[str, dict] = {}
+        self._dirty: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._write_locks: Dict[str, asyncio.Lock] = {}
+
+    async def create(self, job_type: str, **details: Any) -> dict:
+        """Register a new queued job and return it."""
+        await self._prune()
+        now = datetime.utcnow().isoformat()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "type": job_type,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "finished_at": None,
+            "progress": {},
+            "errors": [],
+            "error_count": 0,
+            "result": None,
+            **details
+        }
+        self._jobs[job["job_id"]] = job
+        # Written right away so the first poll finds the job on any worker
+        await self._write(job)
+        logger.info(f"Created {job_type} job {job['job_id']}")
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """Return a job by id, or None if it does not exist or has been pruned."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None
+        try:
+            response = await asyncio.to_thread(
+                lambda: supabase_client.table("background_jobs").select("job").eq("job_id", job_id).execute()
+            )
+        except Exception as e:
+            logger.error(f"Error fetching job {job_id}: {str(e)}")
+            return None
+        return response.data[0]["job"] if response.data else None
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Update top-level job fields."""
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        job.update(fields)
+        job["updated_at"] = datetime.utcnow().isoformat()
+        if fields.get("status") in ("completed", "failed"):
+            job["finished_at"] = job["updated_at"]
+        self._changed(job_id)
+
+    def set_progress(self, job_id: str, **progress: Any) -> None:
+        """Update progress counters of a job."""
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        job["progress"].update(progress)
+        job["updated_at"] = datetime.utcnow().isoformat()
+        self._changed(job_id)
+
+    def add_error(self, job_id: str, error: dict) -> None:
+        """Record an error on a job, keeping at most MAX_JOB_ERRORS of them."""
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        job["error_count"] += 1
+        if len(job["errors"]) < MAX_JOB_ERRORS:
+            job["errors"].append(error)
+        self._changed(job_id)
+
+    def _changed(self, job_id: str) -> None:
+        if job_id in self._dirty:
+            return
+        self._dirty.add(job_id)
+        task = asyncio.get_running_loop().create_task(self._persist(job_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _persist(self, job_id: str) -> None:
+        await asyncio.sleep(self.persist_interval)
+        # Writes of one job run one at a time so an older snapshot never lands last
+        async with self._write_locks.setdefault(job_id, asyncio.Lock()):
+            self._dirty.discard(job_id)
+            job = self._jobs.get(job_id)
+            if job is not None:
+                await self._write(copy.deepcopy(job))
+
+    async def _write(self, job: dict) -> None:
+        row = {
+            "job_id": job["job_id"],
+            "type": job["type"],
+            "status": job["status"],
+            "job": job,
+            "updated_at": job["updated_at"],
+            "finished_at": job["finished_at"]
+        }
+        try:
+            await asyncio.to_thread(
+                lambda: supabase_client.table("background_jobs").upsert(row).execute()
+            )
+        except Exception as e:
+            logger.error(f"Error saving job {job['job_id']}: {str(e)}")
+
+    async def _prune(self) -> None:
+        cutoff = (datetime.utcnow() - timedelta(minutes=JOB_RETENTION_MINUTES)).isoformat()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._write_locks.pop(job_id, None)
+        try:
+            await asyncio.to_thread(
+                lambda: supabase_client.table("background_jobs").delete().lt("finished_at", cutoff).execute()
+            )
+        except Exception as e:
+            logger.error(f"Error pruning finished jobs: {str(e)}")
+
+# Shared registry used by the background job endpoints
+job_registry = JobRegistry(JOB_PERSIST_INTERVAL_SECONDS)
@@ -0,0 +1,296 @@
+from app.db.database import supabase_client
+import asyncio
+import logging
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per request when loading the catalog (PostgREST caps responses at 1000 rows)
+CATALOG_PAGE_SIZE = 1000
+
+# How often the whole catalog is reloaded to pick up writes made by other workers
+CATALOG_REFRESH_MINUTES = float(os.getenv("CATALOG_REFRESH_MINUTES", "10"))
+
+# Store columns embedded in product results, matching the product endpoints
+STORE_COLUMNS = "store_id, name, latitude, longitude, store_image, type, rating, town"
+
+class CatalogListener:
+    """
+    Base class for in-memory indexes that follow the product catalog.
+
+    Subclasses override the hooks they need; every hook receives plain rows as
+    they are stored in the catalog.
+
+    Listeners that set rebuild_in_thread are rebuilt on a full reload by running
+    catalog_loaded on a fresh() instance in a worker thread, whose state then
+    replaces theirs in one swap. Their catalog_loaded must then only touch the
+    instance and the catalog it is given.
+    """
+
+    rebuild_in_thread = False
+
+    def fresh(self) -> "CatalogListener":
+        """A new, empty listener configured like this one."""
+        return type(self)()
+
+    def replace_with(self, rebuilt: "CatalogListener") -> None:
+        """Take over the state of a rebuilt listener with one reference swap."""
+        self.__dict__ = rebuilt.__dict__
+
+    def catalog_loaded(self, catalog: "ProductCatalog") -> None:
+        """Called after a full load; rebuild the index from catalog.products."""
+
+    def products_changed(self, catalog: "ProductCatalog", products: List[dict]) -> None:
+        """Called after products were inserted or updated."""
+
+    def products_removed(self, catalog: "ProductCatalog", product_ids: List[int]) -> None:
+        """Called after products were deleted or archived."""
+
+    def stores_changed(self, catalog: "ProductCatalog", stores: List[dict]) -> None:
+        """Called after stores were inserted or updated."""
+
+    def stores_removed(self, catalog: "ProductCatalog", store_ids: List[str]) -> None:
+        """Called after stores were deleted."""
+
+    def ratings_changed(self, catalog: "ProductCatalog", product_ids: List[int]) -> None:
+        """Called after reviews changed the rating stats of products."""
+
+    def views_changed(self, catalog: "ProductCatalog", product_ids: List[int]) -> None:
+        """Called after flushed product views were added to catalog products."""
+
+class ProductCatalog:
+    """
+    In-process copy of the listed products and their stores.
+
+    The catalog is loaded once at startup and kept in sync from the write
+    endpoints, which pass it the rows they already have. Registered listeners
+    (search, similarity, spatial and other indexes) are notified of every change
+    so they can update incrementally instead of querying the database.
+    """
+
+    def __init__(self, refresh_minutes: float):
+        self.refresh_interval = refresh_minutes * 60
+        self.products: Dict[int, dict] = {}
+        self.stores: Dict[str, dict] = {}
+        self.ratings: Dict[int, dict] = {}
+        self.loaded = False
+        self._listeners: List[CatalogListener] = []
+        self._task: Optional[asyncio.Task] = None
+        self._pending_refreshes = set()
+        # Changes made while a reload is building, applied again once it is swapped in
+        self._journal: Optional[List[Tuple[Callable, tuple]]] = None
+
+    def add_listener(self, listener: CatalogListener) -> None:
+        """Register an index to be notified of catalog changes."""
+        self._listeners.append(listener)
+        if self.loaded:
+            listener.catalog_loaded(self)
+
+    def _call(self, listener: CatalogListener, hook: str, *args) -> None:
+        try:
+            getattr(listener, hook)(self, *args)
+        except Exception as e:
+            logger.error(f"Error in catalog listener {type(listener).__name__}.{hook}: {str(e)}", exc_info=True)
+
+    def _notify(self, hook: str, *args) -> None:
+        for listener in self._listeners:
+            self._call(listener, hook, *args)
+
+    def _record(self, method: Callable, *args) -> None:
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    async def start(self) -> None:
+        """Load the catalog and start the periodic full refresh."""
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Failed to load product catalog: {str(e)}", exc_info=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic refresh."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error(f"Failed to refresh product catalog: {str(e)}", exc_info=True)
+
+    async def load(self) -> None:
+        """
+        Reload every store and product and rebuild all listeners.
+
+        The new catalog and the listeners that rebuild in a thread are built off
+        the event loop while the current ones keep serving requests, then swapped
+        in together without yielding. Changes made from the first fetch on are
+        applied again on top of the new state; every journaled change is safe to
+        apply to rows that already contain it.
+        """
+        self._journal = []
+        try:
+            stores = await asyncio.to_thread(self._fetch_all, "stores", STORE_COLUMNS, "store_id")
+            products = await asyncio.to_thread(self._fetch_all, "products", "*", "id")
+            ratings = await asyncio.to_thread(
+                self._fetch_all, "product_rating_stats", "product_id, review_count, rating_sum", "product_id"
+            )
+
+            snapshot = ProductCatalog(self.refresh_interval / 60)
+            snapshot.stores = {store["store_id"]: store for store in stores}
+            snapshot.products = {product["id"]: product for product in products}
+            snapshot.ratings = {
+                stats["product_id"]: {"review_count": stats["review_count"], "rating_sum": float(stats["rating_sum"] or 0)}
+                for stats in ratings
+            }
+            snapshot.loaded = True
+
+            rebuilt = await asyncio.to_thread(self._rebuild_listeners, snapshot)
+        finally:
+            journal, self._journal = self._journal, None
+
+        self.stores, self.products, self.ratings = snapshot.stores, snapshot.products, snapshot.ratings
+        self.loaded = True
+        for listener, replacement in rebuilt:
+            listener.replace_with(replacement)
+        for listener in self._listeners:
+            if not listener.rebuild_in_thread:
+                self._call(listener, "catalog_loaded")
+        logger.info(f"Product catalog loaded: {len(self.products)} products, {len(self.stores)} stores")
+
+        for method, args in journal:
+            method(*args)
+        if journal:
+            logger.info(f"Applied {len(journal)} catalog changes made during the reload")
+
+    def _rebuild_listeners(self, snapshot: "ProductCatalog") -> List[Tuple[CatalogListener, CatalogListener]]:
+        """Build replacements of the thread-rebuilt listeners from a snapshot; runs in a worker thread."""
+        rebuilt = []
+        for listener in self._listeners:
+            if not listener.rebuild_in_thread:
+                continue
+            try:
+                replacement = listener.fresh()
+                replacement.catalog_loaded(snapshot)
+                rebuilt.append((listener, replacement))
+            except Exception as e:
+                # The listener keeps its current state until the next reload
+                logger.error(f"Error rebuilding catalog listener {type(listener).__name__}: {str(e)}", exc_info=True)
+        return rebuilt
+
+    @staticmethod
+    def _fetch_all(table: str, columns: str, order_column: str) -> List[dict]:
+        rows = []
+        start = 0
+        while True:
+            response = supabase_client.table(table).select(columns).order(order_column).range(
+                start, start + CATALOG_PAGE_SIZE - 1
+            ).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < CATALOG_PAGE_SIZE:
+                return rows
+            start += CATALOG_PAGE_SIZE
+
+    def upsert_products(self, products: Iterable[dict]) -> None:
+        """Insert or replace products using rows returned by a write."""
+        products = [product for product in products if product and product.get("id") is not None]
+        if not products:
+            return
+        self._record(self.upsert_products, products)
+        for product in products:
+            self.products[product["id"]] = product
+        self._notify("products_changed", products)
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        """Drop products that were deleted or archived."""
+        product_ids = list(product_ids)
+        self._record(self.remove_products, product_ids)
+        product_ids = [product_id for product_id in product_ids if self.products.pop(product_id, None) is not None]
+        if product_ids:
+            self._notify("products_removed", product_ids)
+
+    async def refresh_products(self, product_ids: Iterable[int]) -> None:
+        """Fetch products by id with one query and upsert them, e.g. after a restore."""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        try:
+            response = await asyncio.to_thread(
+                lambda: supabase_client.table("products").select("*").in_("id", product_ids).execute()
+            )
+            self.upsert_products(response.data or [])
+        except Exception as e:
+            logger.error(f"Failed to refresh catalog products {product_ids}: {str(e)}")
+
+    def schedule_refresh_products(self, product_ids: Iterable[int]) -> None:
+        """Refresh products in the background so the calling request does not wait for it."""
+        task = asyncio.create_task(self.refresh_products(list(product_ids)))
+        self._pending_refreshes.add(task)
+        task.add_done_callback(self._pending_refreshes.discard)
+
+    def upsert_stores(self, stores: Iterable[dict]) -> None:
+        """Insert or replace stores using rows returned by a write."""
+        stores = [store for store in stores if store and store.get("store_id")]
+        if not stores:
+            return
+        self._record(self.upsert_stores, stores)
+        for store in stores:
+            self.stores[store["store_id"]] = {key: store.get(key) for key in STORE_COLUMNS.split(", ")}
+        self._notify("stores_changed", [self.stores[store["store_id"]] for store in stores])
+
+    def remove_store(self, store_id: str) -> None:
+        """Drop a deleted store."""
+        self._record(self.remove_store, store_id)
+        if self.stores.pop(store_id, None) is not None:
+            self._notify("stores_removed", [store_id])
+
+    def set_rating_stats(self, product_id: int, review_count: int, rating_sum: float) -> None:
+        """
+        Store the rating stats of a product as read back after a new review.
+
+        Stats with fewer reviews than the catalog already has are older and ignored.
+        """
+        self._record(self.set_rating_stats, product_id, review_count, rating_sum)
+        stats = self.ratings.get(product_id)
+        if stats is not None and stats["review_count"] > review_count:
+            return
+        self.ratings[product_id] = {"review_count": review_count, "rating_sum": float(rating_sum or 0)}
+        self._notify("ratings_changed", [product_id])
+
+    def average_rating(self, product_id: int) -> float:
+        """Average review rating of a product, 0 when it has no reviews."""
+        stats = self.ratings.get(product_id)
+        if not stats or not stats["review_count"]:
+            return 0.0
+        return stats["rating_sum"] / stats["review_count"]
+
+    def set_views(self, totals: Dict[int, int]) -> None:
+        """Store the view totals returned by a flush; views only grow, so lower totals are ignored."""
+        self._record(self.set_views, dict(totals))
+        product_ids = []
+        for product_id, views in totals.items():
+            product = self.products.get(product_id)
+            if product is not None and views > (product.get("views") or 0):
+                product["views"] = views
+                product_ids.append(product_id)
+        if product_ids:
+            self._notify("views_changed", product_ids)
+
+    def product_with_store(self, product_id: int) -> Optional[dict]:
+        """Return a copy of a product with its store embedded like the product endpoints do."""
+        product = self.products.get(product_id)
+        if product is None:
+            return None
+        result = dict(product)
+        result["stores"] = self.stores.get(product.get("store_id"))
+        return result
+
+# Shared catalog used by the in-memory indexes
+product_catalog = ProductCatalog(CATALOG_REFRESH_MINUTES)
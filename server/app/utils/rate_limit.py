@@ -0,0 +1,30 @@
+from typing import Dict, Hashable, Tuple
+import time
+
+class RateLimiter:
+    """
+    Fixed-window request limiter.
+
+    Each key (usually a client address) may make `limit` requests per window of
+    `window_seconds`. Counts are kept per process, so with several workers a
+    client can make up to `limit` requests on each of them. The oldest keys are
+    evicted once max_keys is reached.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._windows: Dict[Hashable, Tuple[float, int]] = {}
+
+    def allow(self, key: Hashable) -> bool:
+        """Count a request for `key` and return whether it is within the limit."""
+        now = time.monotonic()
+        started_at, count = self._windows.pop(key, (now, 0))
+        if now - started_at >= self.window:
+            started_at, count = now, 0
+        if len(self._windows) >= self.max_keys:
+            # Dicts keep insertion order, so the first key is the least recently used
+            self._windows.pop(next(iter(self._windows)))
+        self._windows[key] = (started_at, count + 1)
+        return count < self.limit
@@ -0,0 +1,34 @@
+from app.db.database import supabase_client
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+def format_average_rating(average_rating, review_count: int) -> str:
+    """Format an average rating the way the product endpoints return it."""
+    return "{:.1f}".format(round(float(average_rating), 1)) if review_count else "0"
+
+def attach_rating_stats(products: List[dict]) -> List[dict]:
+    """
+    Add average_rating and total_reviews to products from the precomputed
+    product_rating_stats table, using one query for the whole list.
+    """
+    product_ids = [product["id"] for product in products if product.get("id") is not None]
+    stats_by_id = {}
+
+    if product_ids:
+        try:
+            stats_response = supabase_client.table("product_rating_stats").select(
+                "product_id, average_rating, review_count"
+            ).in_("product_id", product_ids).execute()
+            stats_by_id = {stats["product_id"]: stats for stats in stats_response.data or []}
+        except Exception as e:
+            logger.error(f"Error fetching product rating stats: {str(e)}")
+
+    for product in products:
+        stats = stats_by_id.get(product.get("id"))
+        review_count = stats["review_count"] if stats else 0
+        product["average_rating"] = format_average_rating(stats["average_rating"], review_count) if stats else "0"
+        product["total_reviews"] = review_count
+
+    return products
@@ -0,0 +1,200 @@
+from app.db.database import supabase_client
+from typing import Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import logging
+import math
+import os
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Number of neighbours kept per product
+RECOMMENDATIONS_LIMIT = 10
+
+# Rows fetched per request when loading reviews
+REVIEWS_PAGE_SIZE = 1000
+
+# How often the whole model is rebuilt to pick up reviews written by other workers
+RECOMMENDATIONS_REBUILD_MINUTES = float(os.getenv("RECOMMENDATIONS_REBUILD_MINUTES", "60"))
+
+# Most neighbour lists of other products updated for one new review
+RECOMMENDATIONS_MAX_UPDATES = int(os.getenv("RECOMMENDATIONS_MAX_UPDATES", "200"))
+
+class ItemRecommender:
+    """
+    Item-to-item recommendations from review co-occurrence.
+
+    Reviews form a sparse user x product rating matrix. A full build normalizes
+    the product columns and computes all item-item cosine similarities with one
+    sparse matrix product, keeping the top neighbours of every product. A new
+    review only changes the similarities between the reviewed product and the
+    products that share a reviewer with it. The reviewed product's row is
+    recomputed from the co-occurrence lists, and its new score is merged into the
+    lists of its max_updates most similar products; other lists catch up on the
+    next rebuild.
+    """
+
+    def __init__(self, limit: int, rebuild_minutes: float, max_updates: int = RECOMMENDATIONS_MAX_UPDATES):
+        self.limit = limit
+        self.max_updates = max_updates
+        self.rebuild_interval = rebuild_minutes * 60
+        self.neighbours: Dict[int, List[Tuple[int, float]]] = {}
+        self.loaded = False
+        self._item_ratings: Dict[int, Dict[str, float]] = {}
+        self._user_items: Dict[str, Set[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Reviews added while a rebuild runs, applied again to the rebuilt model
+        self._pending_reviews: Optional[List[Tuple[str, int, float]]] = None
+
+    async def start(self) -> None:
+        """Build the model and start the periodic rebuild."""
+        try:
+            await self.rebuild()
+        except Exception as e:
+            logger.error(f"Failed to build recommendations: {str(e)}", exc_info=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic rebuild."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.rebuild_interval)
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Failed to rebuild recommendations: {str(e)}", exc_info=True)
+
+    @staticmethod
+    def _fetch_reviews() -> List[dict]:
+        rows = []
+        start = 0
+        while True:
+            response = supabase_client.table("reviews").select("user_id, product_id, rating").order("id").range(
+                start, start + REVIEWS_PAGE_SIZE - 1
+            ).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < REVIEWS_PAGE_SIZE:
+                return rows
+            start += REVIEWS_PAGE_SIZE
+
+    async def rebuild(self) -> None:
+        """Reload every review and recompute all neighbour lists."""
+        self._pending_reviews = []
+        try:
+            item_ratings, user_items, neighbours = await self._build_snapshot()
+        finally:
+            pending, self._pending_reviews = self._pending_reviews, None
+
+        self._item_ratings = item_ratings
+        self._user_items = user_items
+        self.neighbours = neighbours
+        self.loaded = True
+        # Reviews that may have missed the snapshot; applying one twice changes nothing
+        for review in pending:
+            self.add_review(*review)
+        logger.info(f"Recommendations built: {len(item_ratings)} products, {len(user_items)} reviewers")
+
+    async def _build_snapshot(self) -> Tuple[Dict[int, Dict[str, float]], Dict[str, Set[int]], Dict[int, List[Tuple[int, float]]]]:
+        reviews = await asyncio.to_thread(self._fetch_reviews)
+        item_ratings: Dict[int, Dict[str, float]] = {}
+        user_items: Dict[str, Set[int]] = {}
+        for review in reviews:
+            if review.get("user_id") is None or review.get("product_id") is None:
+                continue
+            # A later review of the same product by the same user replaces the earlier one
+            item_ratings.setdefault(review["product_id"], {})[review["user_id"]] = float(review.get("rating") or 0)
+            user_items.setdefault(review["user_id"], set()).add(review["product_id"])
+
+        neighbours = await asyncio.to_thread(self._build, item_ratings)
+        return item_ratings, user_items, neighbours
+
+    def _build(self, item_ratings: Dict[int, Dict[str, float]]) -> Dict[int, List[Tuple[int, float]]]:
+        items = list(item_ratings)
+        users: Dict[str, int] = {}
+        rows, columns, data = [], [], []
+        for column, product_id in enumerate(items):
+            for user_id, rating in item_ratings[product_id].items():
+                rows.append(users.setdefault(user_id, len(users)))
+                columns.append(column)
+                data.append(rating)
+        if not items:
+            return {}
+
+        matrix = sparse.csr_matrix((data, (rows, columns)), shape=(len(users), len(items)))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+        norms[norms == 0] = 1.0
+        normalized = matrix @ sparse.diags(1.0 / norms)
+        similarities = (normalized.T @ normalized).tocsr()
+        similarities.setdiag(0)
+        similarities.eliminate_zeros()
+
+        neighbours = {}
+        for row, product_id in enumerate(items):
+            start, end = similarities.indptr[row], similarities.indptr[row + 1]
+            indices, scores = similarities.indices[start:end], similarities.data[start:end]
+            if len(scores) > self.limit:
+                top = np.argpartition(-scores, self.limit)[:self.limit]
+                indices, scores = indices[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            neighbours[product_id] = [(items[indices[i]], float(scores[i])) for i in order]
+        return neighbours
+
+    def _norm(self, product_id: int) -> float:
+        return math.sqrt(sum(rating * rating for rating in self._item_ratings.get(product_id, {}).values()))
+
+    def _scores(self, product_id: int) -> Dict[int, float]:
+        """Cosine similarities of one product with every product sharing a reviewer."""
+        ratings = self._item_ratings.get(product_id, {})
+        norm = self._norm(product_id)
+        if not norm:
+            return {}
+        dots: Dict[int, float] = {}
+        for user_id, rating in ratings.items():
+            for other_id in self._user_items.get(user_id, ()):
+                if other_id != product_id:
+                    dots[other_id] = dots.get(other_id, 0.0) + rating * self._item_ratings[other_id][user_id]
+        scores = {}
+        for other_id, dot in dots.items():
+            other_norm = self._norm(other_id)
+            if dot and other_norm:
+                scores[other_id] = dot / (norm * other_norm)
+        return scores
+
+    def _merge(self, product_id: int, other_id: int, score: float) -> None:
+        """Replace the similarity of other_id in the neighbour list of product_id."""
+        neighbours = [item for item in self.neighbours.get(product_id, []) if item[0] != other_id]
+        neighbours.append((other_id, score))
+        neighbours.sort(key=lambda item: -item[1])
+        self.neighbours[product_id] = neighbours[:self.limit]
+
+    def add_review(self, user_id: str, product_id: int, rating: float) -> None:
+        """Apply a new review to the neighbours of the reviewed product and its closest products."""
+        if user_id is None or product_id is None:
+            return
+        if self._pending_reviews is not None:
+            self._pending_reviews.append((user_id, product_id, rating))
+        self._item_ratings.setdefault(product_id, {})[user_id] = float(rating or 0)
+        self._user_items.setdefault(user_id, set()).add(product_id)
+
+        scores = self._scores(product_id)
+        self.neighbours[product_id] = heapq.nlargest(self.limit, scores.items(), key=lambda item: item[1])
+
+        # Only similarities with the reviewed product changed; the most similar products
+        # are the ones whose lists it can enter, so the update stays bounded
+        for other_id, score in heapq.nlargest(self.max_updates, scores.items(), key=lambda item: item[1]):
+            self._merge(other_id, product_id, score)
+
+    def recommend(self, product_id: int) -> List[Tuple[int, float]]:
+        """Return the precomputed (product_id, similarity) neighbours of a product, best first."""
+        return self.neighbours.get(product_id, [])
+
+# Shared recommender, built on startup
+item_recommender = ItemRecommender(RECOMMENDATIONS_LIMIT, RECOMMENDATIONS_REBUILD_MINUTES)
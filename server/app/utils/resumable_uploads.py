@@ -0,0 +1,240 @@
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional
+import base64
+import binascii
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Directory holding in-progress uploads; point it at a shared volume so any worker can resume an upload
+RESUMABLE_UPLOAD_DIR = os.getenv("RESUMABLE_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "resumable-uploads"))
+
+# Largest AR asset accepted, and largest chunk accepted per PATCH
+MAX_AR_ASSET_BYTES = int(os.getenv("MAX_AR_ASSET_BYTES", str(200 * 1024 * 1024)))
+MAX_UPLOAD_CHUNK_BYTES = int(os.getenv("MAX_UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+
+# Open sessions and declared bytes one owner may hold at a time
+MAX_UPLOAD_SESSIONS_PER_OWNER = int(os.getenv("MAX_UPLOAD_SESSIONS_PER_OWNER", "5"))
+MAX_UPLOAD_BYTES_PER_OWNER = int(os.getenv("MAX_UPLOAD_BYTES_PER_OWNER", str(1024 * 1024 * 1024)))
+
+# Unfinished uploads are discarded after this many hours
+UPLOAD_SESSION_HOURS = float(os.getenv("UPLOAD_SESSION_HOURS", "24"))
+
+# Block size used when hashing a finished upload
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Checksum algorithms accepted in Upload-Checksum headers
+CHECKSUM_ALGORITHMS = ("sha256", "sha1", "md5")
+
+class UploadError(Exception):
+    """Upload failure carrying the HTTP status the route should answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def parse_checksum(header: Optional[str]) -> Optional[tuple]:
+    """Parse a tus Upload-Checksum header ("<algorithm> <base64 digest>") into (algorithm, digest)."""
+    if not header:
+        return None
+    try:
+        algorithm, encoded = header.strip().split(" ", 1)
+        digest = base64.b64decode(encoded.strip(), validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError(400, "Invalid Upload-Checksum header")
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(400, f"Unsupported checksum algorithm: {algorithm}")
+    return algorithm, digest
+
+class ResumableUploadStore:
+    """
+    Upload sessions for large files, following the tus protocol.
+
+    Every session is a data file plus a JSON metadata file in `directory`. The
+    offset of an upload is the size of its data file, so a client that loses its
+    connection asks for the offset and continues from there. Chunks are streamed
+    to disk and may carry a checksum; a chunk whose checksum does not match is
+    cut off again. Memory use is bounded by the request body pieces, not by the
+    asset size. Appends hold an exclusive lock on the data file, so workers
+    sharing the directory never write to the same upload at once. Each owner may
+    hold at most `max_sessions` open sessions declaring `max_owner_bytes` in total.
+    """
+
+    def __init__(self, directory: str, max_length: int, max_chunk: int, session_hours: float,
+                 max_sessions: int, max_owner_bytes: int):
+        self.directory = directory
+        self.max_length = max_length
+        self.max_chunk = max_chunk
+        self.session_lifetime = timedelta(hours=session_hours)
+        self.max_sessions = max_sessions
+        self.max_owner_bytes = max_owner_bytes
+
+    def _paths(self, upload_id: str) -> tuple:
+        try:
+            upload_id = str(uuid.UUID(upload_id))
+        except ValueError:
+            raise UploadError(404, "Upload not found")
+        return os.path.join(self.directory, f"{upload_id}.part"), os.path.join(self.directory, f"{upload_id}.json")
+
+    def _remove(self, upload_id: str) -> None:
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _sweep(self) -> List[dict]:
+        """Delete expired sessions and return the ones still open."""
+        now = datetime.utcnow()
+        sessions = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            try:
+                with open(os.path.join(self.directory, name)) as meta_file:
+                    session = json.load(meta_file)
+                if datetime.fromisoformat(session["expires_at"]) < now:
+                    self._remove(upload_id)
+                else:
+                    sessions.append(session)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Could not check upload session {upload_id}: {str(e)}")
+        return sessions
+
+    def create(self, owner: str, length: int, metadata: dict) -> dict:
+        """Open a new upload session of `length` bytes for `owner`."""
+        if length <= 0:
+            raise UploadError(400, "Upload length must be positive")
+        if length > self.max_length:
+            raise UploadError(413, f"Upload exceeds the maximum size of {self.max_length} bytes")
+
+        os.makedirs(self.directory, exist_ok=True)
+        owned = [session for session in self._sweep() if session["owner"] == owner]
+        if len(owned) >= self.max_sessions:
+            raise UploadError(429, f"Too many open uploads; finish or delete one of your {len(owned)} uploads first")
+        if sum(session["length"] for session in owned) + length > self.max_owner_bytes:
+            raise UploadError(413, f"Open uploads would exceed {self.max_owner_bytes} bytes; finish or delete some first")
+
+        upload_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        session = {
+            "upload_id": upload_id,
+            "owner": owner,
+            "length": length,
+            "created_at": now.isoformat(),
+            "expires_at": (now + self.session_lifetime).isoformat(),
+            **metadata
+        }
+        data_path, meta_path = self._paths(upload_id)
+        open(data_path, "wb").close()
+        with open(meta_path, "w") as meta_file:
+            json.dump(session, meta_file)
+        logger.info(f"Created upload {upload_id} of {length} bytes for {owner}")
+        return {**session, "offset": 0}
+
+    def get(self, upload_id: str, owner: str) -> dict:
+        """Return a session with its current offset; sessions of other owners are reported as missing."""
+        data_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as meta_file:
+                session = json.load(meta_file)
+            offset = os.path.getsize(data_path)
+        except FileNotFoundError:
+            raise UploadError(404, "Upload not found")
+        if session["owner"] != owner:
+            raise UploadError(404, "Upload not found")
+        if datetime.fromisoformat(session["expires_at"]) < datetime.utcnow():
+            self._remove(session["upload_id"])
+            raise UploadError(404, "Upload not found")
+        return {**session, "offset": offset}
+
+    async def append(self, upload_id: str, owner: str, offset: int, chunks: AsyncIterator[bytes],
+                     checksum: Optional[tuple] = None) -> int:
+        """
+        Append one chunk at `offset` and return the new offset.
+
+        The offset must match the bytes already received. A chunk that would pass
+        the upload length or the chunk limit, or whose checksum does not match, is
+        discarded and the offset stays where it was. A chunk sent while another
+        request (on any worker) is still appending to the upload gets a 409.
+        """
+        session = self.get(upload_id, owner)
+        data_path, _ = self._paths(upload_id)
+        try:
+            data_file = open(data_path, "r+b")
+        except FileNotFoundError:
+            raise UploadError(404, "Upload not found")
+
+        with data_file:
+            try:
+                fcntl.flock(data_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadError(409, "Another chunk of this upload is still being written")
+
+            # Read the offset under the lock; the one seen by get() may have moved since
+            current_offset = os.fstat(data_file.fileno()).st_size
+            if offset != current_offset:
+                raise UploadError(409, f"Upload-Offset {offset} does not match the current offset {current_offset}")
+
+            data_file.seek(offset)
+            hasher = hashlib.new(checksum[0]) if checksum else None
+            written = 0
+            try:
+                async for piece in chunks:
+                    written += len(piece)
+                    if written > self.max_chunk:
+                        raise UploadError(413, f"Chunk exceeds the maximum size of {self.max_chunk} bytes")
+                    if offset + written > session["length"]:
+                        raise UploadError(413, "Chunk passes the declared upload length")
+                    if hasher is not None:
+                        hasher.update(piece)
+                    data_file.write(piece)
+                data_file.flush()
+                if hasher is not None and hasher.digest() != checksum[1]:
+                    # 460 Checksum Mismatch, as defined by the tus checksum extension
+                    raise UploadError(460, "Chunk checksum does not match")
+            except BaseException:
+                # Drop the partial chunk so the client can resend it from the same offset
+                data_file.flush()
+                data_file.truncate(offset)
+                raise
+            return offset + written
+
+    def finish(self, upload_id: str, owner: str, sha256: Optional[str] = None) -> dict:
+        """Check that an upload is complete (and matches `sha256`, when given) and return its session."""
+        session = self.get(upload_id, owner)
+        if session["offset"] != session["length"]:
+            raise UploadError(409, f"Upload is incomplete: {session['offset']} of {session['length']} bytes received")
+        if sha256:
+            hasher = hashlib.sha256()
+            with open(self.data_path(upload_id), "rb") as data_file:
+                for block in iter(lambda: data_file.read(HASH_BLOCK_SIZE), b""):
+                    hasher.update(block)
+            if hasher.hexdigest() != sha256.lower():
+                raise UploadError(460, "Upload checksum does not match")
+        return session
+
+    def data_path(self, upload_id: str) -> str:
+        return self._paths(upload_id)[0]
+
+    def delete(self, upload_id: str, owner: str) -> None:
+        """Discard an upload session and its data."""
+        session = self.get(upload_id, owner)
+        self._remove(session["upload_id"])
+
+# Shared store for resumable AR asset uploads
+ar_asset_uploads = ResumableUploadStore(
+    RESUMABLE_UPLOAD_DIR, MAX_AR_ASSET_BYTES, MAX_UPLOAD_CHUNK_BYTES, UPLOAD_SESSION_HOURS,
+    MAX_UPLOAD_SESSIONS_PER_OWNER, MAX_UPLOAD_BYTES_PER_OWNER
+)
@@ -0,0 +1,179 @@
+from app.utils.product_catalog import CatalogListener, ProductCatalog
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import heapq
+import logging
+import math
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Term frequency weight of each indexed field
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 2.0,
+    "store_name": 1.5,
+    "description": 1.0
+}
+
+# Prefix matches score lower than exact term matches
+PREFIX_MATCH_WEIGHT = 0.7
+
+# Maximum number of vocabulary terms a query prefix expands to
+MAX_PREFIX_EXPANSIONS = 50
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase, strip accents and split text into alphanumeric tokens."""
+    if not text:
+        return []
+    normalized = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return TOKEN_PATTERN.findall(normalized.lower())
+
+class ProductSearchIndex(CatalogListener):
+    """
+    Inverted index over product name, description, category and store name.
+
+    Postings map each term to the weighted term frequency per product. The sorted
+    vocabulary allows prefix lookups with a binary search, and results are ranked
+    with BM25. The index follows the product catalog, so product and store writes
+    update it incrementally.
+    """
+
+    rebuild_in_thread = True
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.vocabulary: List[str] = []
+        self.doc_terms: Dict[int, Dict[str, float]] = {}
+        self.doc_lengths: Dict[int, float] = {}
+        self.total_length = 0.0
+
+    def _document_terms(self, product: dict, catalog: ProductCatalog) -> Dict[str, float]:
+        store = catalog.stores.get(product.get("store_id")) or {}
+        fields = {
+            "name": product.get("name"),
+            "category": product.get("category"),
+            "store_name": store.get("name"),
+            "description": product.get("description")
+        }
+        terms = Counter()
+        for field, text in fields.items():
+            for token in tokenize(text):
+                terms[token] += FIELD_WEIGHTS[field]
+        return dict(terms)
+
+    def _add(self, product_id: int, terms: Dict[str, float], sorted_vocabulary: bool = True) -> None:
+        for term, frequency in terms.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                if sorted_vocabulary:
+                    insort(self.vocabulary, term)
+            self.postings[term][product_id] = frequency
+        length = sum(terms.values())
+        self.doc_terms[product_id] = terms
+        self.doc_lengths[product_id] = length
+        self.total_length += length
+
+    def _remove(self, product_id: int) -> None:
+        terms = self.doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self.postings[term]
+                index = bisect_left(self.vocabulary, term)
+                if index < len(self.vocabulary) and self.vocabulary[index] == term:
+                    self.vocabulary.pop(index)
+        self.total_length -= self.doc_lengths.pop(product_id, 0.0)
+
+    def index_product(self, product: dict, catalog: ProductCatalog) -> None:
+        """Add or re-index a single product."""
+        self._remove(product["id"])
+        self._add(product["id"], self._document_terms(product, catalog))
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        self.postings = {}
+        self.vocabulary = []
+        self.doc_terms = {}
+        self.doc_lengths = {}
+        self.total_length = 0.0
+        for product in catalog.products.values():
+            self._add(product["id"], self._document_terms(product, catalog), sorted_vocabulary=False)
+        # Sorted once here; inserting every new term in order would make the build quadratic
+        self.vocabulary = sorted(self.postings)
+        logger.info(f"Product search index built: {len(self.doc_terms)} products, {len(self.vocabulary)} terms")
+
+    def products_changed(self, catalog: ProductCatalog, products: List[dict]) -> None:
+        for product in products:
+            self.index_product(product, catalog)
+
+    def products_removed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            self._remove(product_id)
+
+    def stores_changed(self, catalog: ProductCatalog, stores: List[dict]) -> None:
+        # Store names are indexed with each product, so re-index the store's products
+        store_ids = {store["store_id"] for store in stores}
+        for product in catalog.products.values():
+            if product.get("store_id") in store_ids:
+                self.index_product(product, catalog)
+
+    def stores_removed(self, catalog: ProductCatalog, store_ids: List[str]) -> None:
+        self.stores_changed(catalog, [{"store_id": store_id} for store_id in store_ids])
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Return the exact term and vocabulary terms starting with token, with their weights."""
+        expansions = []
+        if token in self.postings:
+            expansions.append((token, 1.0))
+        index = bisect_left(self.vocabulary, token)
+        while index < len(self.vocabulary) and len(expansions) < MAX_PREFIX_EXPANSIONS:
+            term = self.vocabulary[index]
+            if not term.startswith(token):
+                break
+            if term != token:
+                expansions.append((term, PREFIX_MATCH_WEIGHT))
+            index += 1
+        return expansions
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """
+        Rank products for a query with BM25.
+
+        Every query token matches exact terms and terms it is a prefix of.
+
+        Returns:
+            List[Tuple[int, float]]: (product_id, score) pairs, best first
+        """
+        document_count = len(self.doc_terms)
+        if document_count == 0:
+            return []
+
+        average_length = self.total_length / document_count or 1.0
+        scores: Dict[int, float] = {}
+
+        for token in dict.fromkeys(tokenize(query)):
+            for term, weight in self._expand(token):
+                postings = self.postings[term]
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for product_id, frequency in postings.items():
+                    length_norm = 1 - BM25_B + BM25_B * self.doc_lengths[product_id] / average_length
+                    score = idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+                    scores[product_id] = scores.get(product_id, 0.0) + weight * score
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+# Shared search index, registered with the product catalog on startup
+product_search_index = ProductSearchIndex()
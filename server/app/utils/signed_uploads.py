@@ -0,0 +1,149 @@
+from app.db.database import supabase_client, SUPABASE_SERVICE_ROLE_KEY
+from app.utils.resumable_uploads import MAX_AR_ASSET_BYTES
+from app.utils.storage import STORAGE_BUCKET
+from typing import Optional
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import posixpath
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Key used to sign upload grants; every worker must share it
+UPLOAD_GRANT_SECRET = os.getenv("UPLOAD_GRANT_SECRET") or SUPABASE_SERVICE_ROLE_KEY or ""
+
+# How long a grant can be finalized
+UPLOAD_GRANT_MINUTES = float(os.getenv("UPLOAD_GRANT_MINUTES", "30"))
+
+# How long storage keeps a signed upload URL valid
+SIGNED_UPLOAD_URL_HOURS = 2
+
+# Size limits of directly uploaded images and seller application documents
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+MAX_DOCUMENT_BYTES = 5 * 1024 * 1024
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+AR_ASSET_TYPES = ("model/gltf-binary", "model/gltf+json", "model/vnd.usdz+zip", "model/obj", "application/octet-stream")
+DOCUMENT_TYPES = ("image/jpeg", "image/png")
+
+# Upload kinds: bucket, path prefix (formatted with the target id), accepted types and size limit
+UPLOAD_KINDS = {
+    "product_image": (STORAGE_BUCKET, "product-images/products/{target}/", IMAGE_TYPES, MAX_IMAGE_BYTES),
+    "ar_asset": (STORAGE_BUCKET, "ar-assets/{target}/", AR_ASSET_TYPES, MAX_AR_ASSET_BYTES),
+    "store_image": (STORAGE_BUCKET, "store-images/{target}/", IMAGE_TYPES, MAX_IMAGE_BYTES),
+    "business_permit": ("permits", "applications/{target}/", DOCUMENT_TYPES, MAX_DOCUMENT_BYTES),
+    "valid_id": ("valid-ids", "applications/{target}/", DOCUMENT_TYPES, MAX_DOCUMENT_BYTES),
+    "dti_registration": ("dti", "applications/{target}/", DOCUMENT_TYPES, MAX_DOCUMENT_BYTES),
+}
+
+DOCUMENT_KINDS = ("business_permit", "valid_id", "dti_registration")
+
+# Owner of seller application documents, which are uploaded before an account exists
+APPLICANT_OWNER = "applicant"
+
+class SignedUploadError(Exception):
+    """Upload grant failure carrying the HTTP status the route should answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def _sign(payload: bytes) -> str:
+    signature = hmac.new(UPLOAD_GRANT_SECRET.encode("utf-8"), payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(signature).decode("ascii").rstrip("=")
+
+def encode_grant(grant: dict) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps(grant, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{payload}.{_sign(payload.encode('ascii'))}"
+
+def decode_grant(token: str, owner: str) -> dict:
+    """Check a grant token's signature, expiry and owner and return the grant."""
+    try:
+        payload, signature = token.split(".", 1)
+        if not hmac.compare_digest(signature, _sign(payload.encode("ascii"))):
+            raise ValueError("bad signature")
+        grant = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (ValueError, UnicodeError):
+        raise SignedUploadError(400, "Invalid upload token")
+    if grant.get("owner") != owner:
+        raise SignedUploadError(403, "This upload belongs to someone else")
+    if grant.get("expires_at", 0) < time.time():
+        raise SignedUploadError(410, "Upload token has expired")
+    return grant
+
+def create_upload_grant(kind: str, target: str, owner: str, content_type: str, size: Optional[int] = None) -> dict:
+    """
+    Issue a signed upload URL for a new object under the kind's path prefix.
+
+    Returns the URL and storage token the client uploads with, and a grant
+    token to pass to the finalize call once the upload is done.
+    """
+    if kind not in UPLOAD_KINDS:
+        raise SignedUploadError(400, f"Unknown upload kind: {kind}")
+    bucket, prefix, content_types, max_size = UPLOAD_KINDS[kind]
+    if content_type not in content_types:
+        raise SignedUploadError(415, f"Content type {content_type} is not accepted for {kind}")
+    if size is not None and size > max_size:
+        raise SignedUploadError(413, f"Uploads of {kind} are limited to {max_size} bytes")
+
+    path = f"{prefix.format(target=target)}{uuid.uuid4()}"
+    signed = supabase_client.storage.from_(bucket).create_signed_upload_url(path)
+    grant = {
+        "kind": kind,
+        "bucket": bucket,
+        "path": path,
+        "target": target,
+        "owner": owner,
+        "expires_at": int(time.time() + UPLOAD_GRANT_MINUTES * 60),
+    }
+    return {
+        "upload_url": signed.get("signed_url") or signed.get("signedUrl"),
+        "storage_token": signed.get("token"),
+        "bucket": bucket,
+        "path": path,
+        "content_type": content_type,
+        "max_size": max_size,
+        "upload_token": encode_grant(grant),
+        "expires_at": grant["expires_at"],
+    }
+
+def remove_object(bucket: str, path: str) -> None:
+    try:
+        supabase_client.storage.from_(bucket).remove([path])
+    except Exception as e:
+        logger.error(f"Failed to remove rejected upload {bucket}/{path}: {str(e)}")
+
+def verify_uploaded_object(grant: dict) -> dict:
+    """
+    Check that the granted object was uploaded with an accepted type and size.
+
+    Objects that fail the check are removed. Returns the object's metadata.
+    """
+    bucket, _, content_types, max_size = UPLOAD_KINDS[grant["kind"]]
+    folder, name = posixpath.split(grant["path"])
+    items = supabase_client.storage.from_(bucket).list(path=folder, options={"search": name})
+    item = next((item for item in items or [] if item.get("name") == name), None)
+    if item is None:
+        raise SignedUploadError(404, "The upload has not been received")
+
+    metadata = item.get("metadata") or {}
+    size = metadata.get("size") or metadata.get("contentLength") or 0
+    content_type = metadata.get("mimetype") or metadata.get("contentType")
+    if content_type not in content_types or not 0 < size <= max_size:
+        remove_object(bucket, grant["path"])
+        raise SignedUploadError(422, f"Uploaded object is not an accepted {grant['kind']} ({content_type}, {size} bytes)")
+    return {"size": size, "content_type": content_type}
+
+def finalize_document(upload_token: str, kind: str) -> str:
+    """Verify an uploaded seller application document of the given kind and return its storage path."""
+    grant = decode_grant(upload_token, APPLICANT_OWNER)
+    if grant["kind"] != kind:
+        raise SignedUploadError(400, f"Upload token is not for a {kind} document")
+    verify_uploaded_object(grant)
+    return grant["path"]
@@ -0,0 +1,252 @@
+from app.utils.product_catalog import CatalogListener, ProductCatalog
+from app.utils.search_index import tokenize
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+import logging
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Number of neighbours kept per product
+SIMILAR_PRODUCTS_LIMIT = 10
+
+# Neighbours below this cosine similarity are not kept
+MIN_SIMILARITY = 0.05
+
+# Term frequency weight of each field in the TF-IDF vectors
+SIMILARITY_FIELD_WEIGHTS = {
+    "name": 2.0,
+    "category": 1.5,
+    "description": 1.0
+}
+
+# Upper bound on the similarity block (rows x products) computed at once
+SIMILARITY_BLOCK_CELLS = 4_000_000
+
+# Rows of replaced or removed products are kept zeroed until they pass this share of the matrix
+SIMILARITY_MAX_DEAD_ROWS_SHARE = 0.25
+
+class SimilarProductIndex(CatalogListener):
+    """
+    Precomputed nearest neighbours of every product by TF-IDF cosine similarity.
+
+    Products are vectorized from their name, category and description into an
+    L2-normalized sparse matrix, and the top neighbours of every row are computed
+    in blocks with one sparse matrix product per block. The products stay sparse,
+    so a product is only scored against the products sharing one of its terms.
+    Product writes zero the old rows of changed products and append their new
+    rows, then only recompute the changed rows and the rows that referenced
+    them; the matrix is compacted once dead rows pass
+    SIMILARITY_MAX_DEAD_ROWS_SHARE. The document frequencies used for IDF are
+    fully recomputed on every catalog reload, in a worker thread.
+    """
+
+    rebuild_in_thread = True
+
+    def __init__(self, limit: int = SIMILAR_PRODUCTS_LIMIT):
+        self.limit = limit
+        self.neighbours: Dict[int, List[Tuple[int, float]]] = {}
+        self._referenced_by: Dict[int, Set[int]] = {}
+        self._terms: Dict[str, int] = {}
+        self._df: List[int] = []
+        self._doc_terms: Dict[int, Counter] = {}
+        self._vectors: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._ids: List[Optional[int]] = []  # None for dead rows
+        self._rows: Dict[int, int] = {}
+        self._dead_rows = 0
+        self._matrix = sparse.csr_matrix((0, 0))
+
+    def fresh(self) -> "SimilarProductIndex":
+        return SimilarProductIndex(self.limit)
+
+    @staticmethod
+    def _product_terms(product: dict) -> Counter:
+        terms = Counter()
+        for field, weight in SIMILARITY_FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                terms[token] += weight
+        return terms
+
+    def _term_index(self, term: str) -> int:
+        index = self._terms.get(term)
+        if index is None:
+            index = self._terms[term] = len(self._df)
+            self._df.append(0)
+        return index
+
+    def _vectorize(self, terms: Counter) -> Tuple[np.ndarray, np.ndarray]:
+        """Build the normalized TF-IDF vector of one product from the current document frequencies."""
+        if not terms:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        document_count = len(self._doc_terms)
+        indices = np.fromiter((self._terms[term] for term in terms), dtype=np.int32, count=len(terms))
+        frequencies = np.fromiter(terms.values(), dtype=np.float64, count=len(terms))
+        df = np.fromiter((self._df[index] for index in indices), dtype=np.float64, count=len(indices))
+        weights = (1 + np.log(frequencies)) * (np.log((1 + document_count) / (1 + df)) + 1)
+        weights /= np.linalg.norm(weights)
+        order = np.argsort(indices)
+        return indices[order], weights[order]
+
+    def _vector_rows(self, product_ids: List[int]) -> sparse.csr_matrix:
+        lengths = [len(self._vectors[product_id][0]) for product_id in product_ids]
+        indptr = np.zeros(len(product_ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        if product_ids:
+            indices = np.concatenate([self._vectors[product_id][0] for product_id in product_ids])
+            data = np.concatenate([self._vectors[product_id][1] for product_id in product_ids])
+        else:
+            indices = np.empty(0, dtype=np.int32)
+            data = np.empty(0, dtype=np.float64)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(product_ids), len(self._df)))
+
+    def _rebuild_matrix(self) -> None:
+        self._ids = list(self._vectors)
+        self._rows = {product_id: row for row, product_id in enumerate(self._ids)}
+        self._dead_rows = 0
+        self._matrix = self._vector_rows(self._ids)
+
+    def _update_matrix(self, changed_ids: List[int], removed_ids: List[int]) -> None:
+        """Zero the rows of changed and removed products and append the new rows of changed ones."""
+        for product_id in changed_ids + removed_ids:
+            row = self._rows.pop(product_id, None)
+            if row is not None:
+                self._matrix.data[self._matrix.indptr[row]:self._matrix.indptr[row + 1]] = 0
+                self._ids[row] = None
+                self._dead_rows += 1
+
+        if self._dead_rows > SIMILARITY_MAX_DEAD_ROWS_SHARE * len(self._ids):
+            self._rebuild_matrix()
+            return
+
+        added = [product_id for product_id in dict.fromkeys(changed_ids) if product_id in self._vectors]
+        # New terms add columns; growing a CSR matrix's columns only changes its shape
+        self._matrix.resize((self._matrix.shape[0], len(self._df)))
+        if added:
+            self._matrix = sparse.vstack([self._matrix, self._vector_rows(added)], format="csr")
+            for product_id in added:
+                self._rows[product_id] = len(self._ids)
+                self._ids.append(product_id)
+
+    def _similarity_blocks(self, product_ids: List[int]) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        Yield (product_id, columns, similarities) with the nonzero cosine similarities of products.
+
+        Only products sharing a term with the product get a column; the product itself is left out.
+        """
+        product_count = len(self._ids)
+        if product_count == 0:
+            return
+        block_size = max(1, SIMILARITY_BLOCK_CELLS // product_count)
+        for start in range(0, len(product_ids), block_size):
+            block_ids = product_ids[start:start + block_size]
+            rows = [self._rows[product_id] for product_id in block_ids]
+            similarities = (self._matrix[rows] @ self._matrix.T).tocsr()
+            for i, (product_id, row) in enumerate(zip(block_ids, rows)):
+                columns = similarities.indices[similarities.indptr[i]:similarities.indptr[i + 1]]
+                scores = similarities.data[similarities.indptr[i]:similarities.indptr[i + 1]]
+                keep = columns != row
+                yield product_id, columns[keep], scores[keep]
+
+    def _top(self, columns: np.ndarray, scores: np.ndarray) -> List[Tuple[int, float]]:
+        keep = scores >= MIN_SIMILARITY
+        columns, scores = columns[keep], scores[keep]
+        if len(scores) > self.limit:
+            candidates = np.argpartition(-scores, self.limit)[:self.limit]
+            columns, scores = columns[candidates], scores[candidates]
+        order = np.argsort(-scores, kind="stable")
+        return [(self._ids[column], float(score)) for column, score in zip(columns[order], scores[order])]
+
+    def _set_neighbours(self, product_id: int, neighbours: List[Tuple[int, float]]) -> None:
+        for neighbour_id, _ in self.neighbours.get(product_id, []):
+            referrers = self._referenced_by.get(neighbour_id)
+            if referrers is not None:
+                referrers.discard(product_id)
+        self.neighbours[product_id] = neighbours
+        for neighbour_id, _ in neighbours:
+            self._referenced_by.setdefault(neighbour_id, set()).add(product_id)
+
+    def _drop_neighbours(self, product_id: int) -> None:
+        self._set_neighbours(product_id, [])
+        del self.neighbours[product_id]
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        self.neighbours = {}
+        self._referenced_by = {}
+        self._terms = {}
+        self._df = []
+        self._doc_terms = {}
+
+        for product in catalog.products.values():
+            terms = self._product_terms(product)
+            self._doc_terms[product["id"]] = terms
+            for term in terms:
+                self._df[self._term_index(term)] += 1
+
+        self._vectors = {product_id: self._vectorize(terms) for product_id, terms in self._doc_terms.items()}
+        self._rebuild_matrix()
+        for product_id, columns, scores in self._similarity_blocks(self._ids):
+            self._set_neighbours(product_id, self._top(columns, scores))
+        logger.info(f"Similar product index built: {len(self._ids)} products, {len(self._df)} terms")
+
+    def _update_document(self, product_id: int, terms: Optional[Counter]) -> None:
+        for term in self._doc_terms.pop(product_id, Counter()):
+            self._df[self._terms[term]] -= 1
+        if terms is None:
+            self._vectors.pop(product_id, None)
+            return
+        self._doc_terms[product_id] = terms
+        for term in terms:
+            self._df[self._term_index(term)] += 1
+        self._vectors[product_id] = self._vectorize(terms)
+
+    def _merge_neighbour(self, product_id: int, neighbour_id: int, score: float) -> None:
+        neighbours = self.neighbours.get(product_id, [])
+        if len(neighbours) >= self.limit and score <= neighbours[-1][1]:
+            return
+        neighbours = neighbours + [(neighbour_id, score)]
+        neighbours.sort(key=lambda item: -item[1])
+        self._set_neighbours(product_id, neighbours[:self.limit])
+
+    def _refresh(self, changed_ids: List[int], removed_ids: List[int]) -> None:
+        """Recompute the neighbour lists affected by changed and removed products."""
+        self._update_matrix(changed_ids, removed_ids)
+
+        # Rows that pointed at a changed or removed product may have lost a neighbour
+        stale = set(changed_ids)
+        for product_id in changed_ids + removed_ids:
+            stale.update(self._referenced_by.pop(product_id, set()))
+        stale = [product_id for product_id in stale if product_id in self._rows]
+        stale_set = set(stale)
+        changed_set = set(changed_ids)
+
+        for product_id, columns, scores in self._similarity_blocks(stale):
+            self._set_neighbours(product_id, self._top(columns, scores))
+            if product_id not in changed_set:
+                continue
+            # A changed product can also enter the lists of rows that were not recomputed
+            for column, score in zip(columns, scores):
+                neighbour_id = self._ids[column]
+                if score >= MIN_SIMILARITY and neighbour_id not in stale_set:
+                    self._merge_neighbour(neighbour_id, product_id, float(score))
+
+    def products_changed(self, catalog: ProductCatalog, products: List[dict]) -> None:
+        changed_ids = []
+        for product in products:
+            self._update_document(product["id"], self._product_terms(product))
+            changed_ids.append(product["id"])
+        self._refresh(changed_ids, [])
+
+    def products_removed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            self._update_document(product_id, None)
+            if product_id in self.neighbours:
+                self._drop_neighbours(product_id)
+        self._refresh([], list(product_ids))
+
+    def similar(self, product_id: int) -> List[Tuple[int, float]]:
+        """Return the precomputed (product_id, similarity) neighbours of a product, best first."""
+        return self.neighbours.get(product_id, [])
+
+# Shared similarity index, registered with the product catalog on startup
+similar_product_index = SimilarProductIndex()
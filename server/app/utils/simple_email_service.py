@@ -2,17 +2,14 @@ import smtplib
 import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional
 from app.config import EMAIL_USERNAME, EMAIL_FROM, EMAILER_PASSWORD, CLIENT_URL
+from app.utils.email_templates import template_registry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Templates directory
-templates_dir = Path(__file__).parent.parent / "templates"
-
 def send_email(
     recipients: List[str],
     subject: str,
@@ -99,27 +96,6 @@ def send_email(
         logger.error(f"Error details: {traceback.format_exc()}")
         return False
 
-def read_template_file(template_name: str) -> Optional[str]:
-    """Read an HTML template file and return its contents."""
-    try:
-        template_path = templates_dir / template_name
-        if not template_path.exists():
-            logger.error(f"Template file not found: {template_path}")
-            return None
-
-        with open(template_path, 'r', encoding='utf-8') as file:
-            return file.read()
-    except Exception as e:
-        logger.error(f"Error reading template file: {str(e)}")
-        return None
-
-def render_template(template_content: str, context: Dict[str, Any]) -> str:
-    """Simple template rendering function."""
-    result = template_content
-    for key, value in context.items():
-        result = result.replace(f"{{{{ {key} }}}}", str(value))
-    return result
-
 def send_seller_application_status_email(
     email: str,
     first_name: str,
@@ -155,32 +131,20 @@ def send_seller_application_status_email(
             subject = "Update on Your Seller Application"
             template_name = "seller_application_rejected.html"
 
-        # Create a plain text version
-        plain_text_body = f"""
-Dear {first_name} {last_name},
-
-Your seller application for Produkto Elyu-Kal has been {status}.
-
-{'Congratulations! You can now log in to your seller dashboard and start setting up your store.' if status == 'accepted' else 'We appreciate your interest and hope to welcome you as a seller in the future.'}
-
-Best regards,
-The Produkto Elyu-Kal Team
-        """
-
-        # Try to load and render HTML template
-        template_content = read_template_file(template_name)
-        if template_content:
-            # Prepare template variables
-            context = {
-                "first_name": first_name,
-                "last_name": last_name,
-                "status": status,
-                "app_url": CLIENT_URL
-            }
+        # Prepare template variables
+        context = {
+            "first_name": first_name,
+            "last_name": last_name,
+            "status": status,
+            "app_url": CLIENT_URL
+        }
 
-            # Render the template
-            html_body = render_template(template_content, context)
+        # Render the plain text version from the compiled template cache
+        plain_text_body = template_registry.render("seller_application_status.txt", context) or ""
 
+        # Render the HTML version from the compiled template cache
+        html_body = template_registry.render(template_name, context)
+        if html_body:
             # Send email with HTML
             return send_email(
                 recipients=[email],
@@ -0,0 +1,219 @@
+from app.utils.product_catalog import CatalogListener, ProductCatalog
+from typing import Callable, Dict, Hashable, List, Optional, Set, Tuple
+import heapq
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Size of a grid cell in degrees (about 5.5 km of latitude)
+GRID_CELL_DEGREES = 0.05
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def parse_coordinates(latitude, longitude) -> Optional[Tuple[float, float]]:
+    """Parse a latitude/longitude pair stored as numbers or strings, or None if invalid."""
+    try:
+        lat, lon = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or (lat == 0 and lon == 0):
+        return None
+    return lat, lon
+
+class SpatialGrid:
+    """
+    Uniform latitude/longitude grid of points.
+
+    Radius queries only visit the cells overlapping the search box. Nearest
+    neighbour queries visit rings of cells around the query point and stop once
+    no unvisited cell can hold a point closer than the current k-th result, or
+    scan the remaining occupied cells once the rings outgrow them.
+    """
+
+    def __init__(self, cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.points: Dict[Hashable, Tuple[float, float]] = {}
+        self.cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def clear(self) -> None:
+        self.points = {}
+        self.cells = {}
+
+    def set(self, key: Hashable, coordinates: Optional[Tuple[float, float]]) -> None:
+        """Insert, move or (with coordinates None) remove a point."""
+        self.remove(key)
+        if coordinates is None:
+            return
+        self.points[key] = coordinates
+        self.cells.setdefault(self._cell(*coordinates), set()).add(key)
+
+    def remove(self, key: Hashable) -> None:
+        coordinates = self.points.pop(key, None)
+        if coordinates is None:
+            return
+        cell = self._cell(*coordinates)
+        keys = self.cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.cells[cell]
+
+    def within(self, lat: float, lon: float, radius_km: float,
+               accept: Optional[Callable[[Hashable], bool]] = None) -> List[Tuple[float, Hashable]]:
+        """Return (distance_km, key) of accepted points within radius_km, nearest first."""
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(min(89.0, abs(lat) + lat_span))), 0.01))
+        min_row, min_col = self._cell(lat - lat_span, lon - lon_span)
+        max_row, max_col = self._cell(lat + lat_span, lon + lon_span)
+
+        results = []
+        # Scan the occupied cells directly when the box covers more cells than exist
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            cells = [keys for (row, col), keys in self.cells.items()
+                     if min_row <= row <= max_row and min_col <= col <= max_col]
+        else:
+            cells = [self.cells[(row, col)] for row in range(min_row, max_row + 1)
+                     for col in range(min_col, max_col + 1) if (row, col) in self.cells]
+        for keys in cells:
+            for key in keys:
+                if accept is not None and not accept(key):
+                    continue
+                distance = haversine_km(lat, lon, *self.points[key])
+                if distance <= radius_km:
+                    results.append((distance, key))
+        results.sort(key=lambda item: item[0])
+        return results
+
+    def nearest(self, lat: float, lon: float, k: int,
+                accept: Optional[Callable[[Hashable], bool]] = None) -> List[Tuple[float, Hashable]]:
+        """Return the k nearest accepted points as (distance_km, key), nearest first."""
+        if k <= 0 or not self.points:
+            return []
+
+        center_row, center_col = self._cell(lat, lon)
+        best: List[Tuple[float, Hashable]] = []  # max-heap of the k nearest via negated distances
+        visited = 0
+        ring = 0
+        while visited < len(self.points):
+            if (2 * ring + 1) ** 2 > len(self.cells):
+                # The box around the rings covers more cells than exist, so the
+                # remaining occupied cells are scanned directly in one last pass
+                ring_cells = [cell for cell in self.cells
+                              if max(abs(cell[0] - center_row), abs(cell[1] - center_col)) >= ring]
+            elif ring == 0:
+                ring_cells = [(center_row, center_col)]
+            else:
+                ring_cells = [(center_row + d_row, center_col + d_col)
+                              for d_row in range(-ring, ring + 1)
+                              for d_col in (range(-ring, ring + 1) if abs(d_row) == ring else (-ring, ring))]
+            for cell in ring_cells:
+                for key in self.cells.get(cell, ()):
+                    visited += 1
+                    if accept is not None and not accept(key):
+                        continue
+                    distance = haversine_km(lat, lon, *self.points[key])
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, key))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, key))
+
+            # Every unvisited point is at least `ring` cells away; use the narrowest cell width reached so far
+            cell_km = self.cell_degrees * KM_PER_DEGREE * max(
+                math.cos(math.radians(min(89.0, abs(lat) + (ring + 1) * self.cell_degrees))), 0.01
+            )
+            if (2 * ring + 1) ** 2 > len(self.cells) or (len(best) == k and -best[0][0] <= ring * cell_km):
+                break
+            ring += 1
+
+        return sorted(((-distance, key) for distance, key in best), key=lambda item: item[0])
+
+class NearbyIndex(CatalogListener):
+    """
+    Spatial grids over stores and products for nearest and radius queries.
+
+    Products are placed at their own coordinates and fall back to their store's
+    location when they have none. The grids follow the product catalog, so store
+    and product writes move points incrementally.
+    """
+
+    rebuild_in_thread = True
+
+    def __init__(self):
+        self.stores = SpatialGrid()
+        self.products = SpatialGrid()
+        self.store_products: Dict[str, Set[int]] = {}
+        self._product_store: Dict[int, str] = {}
+
+    def _product_coordinates(self, product: dict, catalog: ProductCatalog) -> Optional[Tuple[float, float]]:
+        coordinates = parse_coordinates(product.get("latitude"), product.get("longitude"))
+        if coordinates is None:
+            store = catalog.stores.get(product.get("store_id")) or {}
+            coordinates = parse_coordinates(store.get("latitude"), store.get("longitude"))
+        return coordinates
+
+    def _index_product(self, product: dict, catalog: ProductCatalog) -> None:
+        self._unlink_product(product["id"])
+        self.products.set(product["id"], self._product_coordinates(product, catalog))
+        if product.get("store_id"):
+            self.store_products.setdefault(product["store_id"], set()).add(product["id"])
+            self._product_store[product["id"]] = product["store_id"]
+
+    def _unlink_product(self, product_id: int) -> None:
+        store_id = self._product_store.pop(product_id, None)
+        product_ids = self.store_products.get(store_id)
+        if product_ids is not None:
+            product_ids.discard(product_id)
+            if not product_ids:
+                del self.store_products[store_id]
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        self.stores.clear()
+        self.products.clear()
+        self.store_products = {}
+        self._product_store = {}
+        for store in catalog.stores.values():
+            self.stores.set(store["store_id"], parse_coordinates(store.get("latitude"), store.get("longitude")))
+        for product in catalog.products.values():
+            self._index_product(product, catalog)
+        logger.info(f"Nearby index built: {len(self.stores)} stores, {len(self.products)} products")
+
+    def products_changed(self, catalog: ProductCatalog, products: List[dict]) -> None:
+        for product in products:
+            self._index_product(product, catalog)
+
+    def products_removed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        for product_id in product_ids:
+            self.products.remove(product_id)
+            self._unlink_product(product_id)
+
+    def stores_changed(self, catalog: ProductCatalog, stores: List[dict]) -> None:
+        for store in stores:
+            self.stores.set(store["store_id"], parse_coordinates(store.get("latitude"), store.get("longitude")))
+            # Products without coordinates of their own move with their store
+            for product_id in self.store_products.get(store["store_id"], ()):
+                product = catalog.products.get(product_id)
+                if product is not None:
+                    self.products.set(product_id, self._product_coordinates(product, catalog))
+
+    def stores_removed(self, catalog: ProductCatalog, store_ids: List[str]) -> None:
+        for store_id in store_ids:
+            self.stores.remove(store_id)
+
+# Shared spatial index, registered with the product catalog on startup
+nearby_index = NearbyIndex()
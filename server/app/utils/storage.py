@@ -0,0 +1,66 @@
+from app.db.database import supabase_client
+from typing import Iterable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bucket that holds product images, AR assets and store images
+STORAGE_BUCKET = "test-bucket"
+
+# Maximum number of objects removed per storage request
+STORAGE_REMOVE_BATCH_SIZE = 100
+
+# Objects returned per storage list request
+STORAGE_LIST_PAGE_SIZE = 100
+
+def storage_path_from_public_url(url: Optional[str], bucket: str = STORAGE_BUCKET) -> Optional[str]:
+    """Extract the object path from a public storage URL, or None if it is not one of ours."""
+    if not url:
+        return None
+    marker = f"/object/public/{bucket}/"
+    if marker not in url:
+        return None
+    return url.split(marker, 1)[1].split("?", 1)[0]
+
+def remove_storage_objects(paths: Iterable[str], bucket: str = STORAGE_BUCKET) -> int:
+    """
+    Remove objects from storage in batches.
+
+    Returns:
+        int: Number of objects that were removed
+    """
+    unique_paths: List[str] = list(dict.fromkeys(path for path in paths if path))
+    removed = 0
+    for start in range(0, len(unique_paths), STORAGE_REMOVE_BATCH_SIZE):
+        batch = unique_paths[start:start + STORAGE_REMOVE_BATCH_SIZE]
+        try:
+            supabase_client.storage.from_(bucket).remove(batch)
+            removed += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to remove {len(batch)} storage objects: {str(e)}")
+    return removed
+
+def list_storage_items(folder: str, bucket: str = STORAGE_BUCKET) -> List[dict]:
+    """
+    List every entry directly inside a storage folder, with its metadata.
+
+    Storage returns at most one page per request, so the folder is read page by page.
+    """
+    items: List[dict] = []
+    offset = 0
+    while True:
+        page = supabase_client.storage.from_(bucket).list(
+            path=folder, options={"limit": STORAGE_LIST_PAGE_SIZE, "offset": offset}
+        ) or []
+        items.extend(page)
+        if len(page) < STORAGE_LIST_PAGE_SIZE:
+            return items
+        offset += STORAGE_LIST_PAGE_SIZE
+
+def list_storage_folder(folder: str, bucket: str = STORAGE_BUCKET) -> List[str]:
+    """List the object paths directly inside a storage folder."""
+    try:
+        return [f"{folder}/{item['name']}" for item in list_storage_items(folder, bucket) if item.get("name")]
+    except Exception as e:
+        logger.error(f"Failed to list storage folder {folder}: {str(e)}")
+        return []
@@ -0,0 +1,165 @@
+from app.utils.product_catalog import CatalogListener, ProductCatalog
+from app.utils.spatial_index import parse_coordinates
+from typing import Dict, List, Tuple
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Zoom levels with precomputed clusters; deeper zooms return individual stores
+MIN_CLUSTER_ZOOM = 0
+MAX_CLUSTER_ZOOM = 16
+
+# Cluster cell size in screen pixels (256 px map tiles)
+CLUSTER_RADIUS_PX = 60
+TILE_SIZE_PX = 256
+
+# Web mercator latitude limit
+MAX_MERCATOR_LATITUDE = 85.05112878
+
+def project(lat: float, lon: float) -> Tuple[float, float]:
+    """Project a point to web mercator world coordinates in [0, 1)."""
+    lat = max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, lat))
+    x = (lon + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0 - 1e-12), min(max(y, 0.0), 1.0 - 1e-12)
+
+class StoreClusterIndex(CatalogListener):
+    """
+    Grid clusters of stores for every zoom level.
+
+    At each zoom the mercator world is divided into cells of CLUSTER_RADIUS_PX
+    screen pixels, and every cell keeps its store ids and the coordinate sums of
+    its centroid. Adding, moving or removing a store touches one cell per zoom,
+    so the hierarchy is built once from the stores and then updated
+    incrementally. Representative stores are chosen lazily and cached per cell.
+    """
+
+    rebuild_in_thread = True
+
+    def __init__(self):
+        self.locations: Dict[str, Tuple[float, float]] = {}
+        self.levels: Dict[int, Dict[Tuple[int, int], dict]] = {
+            zoom: {} for zoom in range(MIN_CLUSTER_ZOOM, MAX_CLUSTER_ZOOM + 1)
+        }
+
+    @staticmethod
+    def cells_per_side(zoom: int) -> int:
+        return max(1, int(TILE_SIZE_PX * 2 ** zoom / CLUSTER_RADIUS_PX))
+
+    def _cell(self, zoom: int, lat: float, lon: float) -> Tuple[int, int]:
+        x, y = project(lat, lon)
+        side = self.cells_per_side(zoom)
+        return int(x * side), int(y * side)
+
+    def _add(self, store_id: str, lat: float, lon: float) -> None:
+        self.locations[store_id] = (lat, lon)
+        for zoom, cells in self.levels.items():
+            cell = cells.setdefault(self._cell(zoom, lat, lon), {
+                "store_ids": set(), "lat_sum": 0.0, "lon_sum": 0.0, "representative": None
+            })
+            cell["store_ids"].add(store_id)
+            cell["lat_sum"] += lat
+            cell["lon_sum"] += lon
+            cell["representative"] = None
+
+    def _remove(self, store_id: str) -> None:
+        location = self.locations.pop(store_id, None)
+        if location is None:
+            return
+        lat, lon = location
+        for zoom, cells in self.levels.items():
+            key = self._cell(zoom, lat, lon)
+            cell = cells.get(key)
+            if cell is None:
+                continue
+            cell["store_ids"].discard(store_id)
+            if not cell["store_ids"]:
+                del cells[key]
+                continue
+            cell["lat_sum"] -= lat
+            cell["lon_sum"] -= lon
+            cell["representative"] = None
+
+    def _invalidate_representatives(self, store_id: str) -> None:
+        lat, lon = self.locations[store_id]
+        for zoom, cells in self.levels.items():
+            cell = cells.get(self._cell(zoom, lat, lon))
+            if cell is not None:
+                cell["representative"] = None
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        self.locations = {}
+        self.levels = {zoom: {} for zoom in self.levels}
+        for store in catalog.stores.values():
+            coordinates = parse_coordinates(store.get("latitude"), store.get("longitude"))
+            if coordinates is not None:
+                self._add(store["store_id"], *coordinates)
+        logger.info(f"Store cluster index built: {len(self.locations)} stores, {MAX_CLUSTER_ZOOM + 1} zoom levels")
+
+    def stores_changed(self, catalog: ProductCatalog, stores: List[dict]) -> None:
+        for store in stores:
+            coordinates = parse_coordinates(store.get("latitude"), store.get("longitude"))
+            if coordinates == self.locations.get(store["store_id"]):
+                # Same location, but the rating used to pick representatives may have changed
+                if coordinates is not None:
+                    self._invalidate_representatives(store["store_id"])
+                continue
+            self._remove(store["store_id"])
+            if coordinates is not None:
+                self._add(store["store_id"], *coordinates)
+
+    def stores_removed(self, catalog: ProductCatalog, store_ids: List[str]) -> None:
+        for store_id in store_ids:
+            self._remove(store_id)
+
+    def _cell_ranges(self, zoom: int, west: float, south: float, east: float, north: float) -> List[Tuple[range, range]]:
+        side = self.cells_per_side(zoom)
+        min_x, max_y = self._cell(zoom, south, west)
+        max_x, min_y = self._cell(zoom, north, east)
+        rows = range(min_y, max_y + 1)
+        if west <= east:
+            return [(range(min_x, max_x + 1), rows)]
+        # The bounding box crosses the antimeridian
+        return [(range(min_x, side), rows), (range(0, max_x + 1), rows)]
+
+    def clusters(self, zoom: int, west: float, south: float, east: float, north: float,
+                 catalog: ProductCatalog) -> List[dict]:
+        """Return the clusters and single stores of a zoom level inside a bounding box."""
+        zoom = max(MIN_CLUSTER_ZOOM, min(MAX_CLUSTER_ZOOM, zoom))
+        cells = self.levels[zoom]
+
+        keys: List[Tuple[int, int]] = []
+        for columns, rows in self._cell_ranges(zoom, west, south, east, north):
+            if len(columns) * len(rows) > len(cells):
+                keys.extend(key for key in cells if key[0] in columns and key[1] in rows)
+            else:
+                keys.extend((x, y) for x in columns for y in rows if (x, y) in cells)
+
+        results = []
+        for key in keys:
+            cell = cells[key]
+            count = len(cell["store_ids"])
+            if cell["representative"] is None:
+                cell["representative"] = max(
+                    cell["store_ids"],
+                    key=lambda store_id: ((catalog.stores.get(store_id) or {}).get("rating") or 0, store_id)
+                )
+            representative = catalog.stores.get(cell["representative"])
+
+            if count == 1:
+                results.append({"type": "store", "count": 1, "store": representative})
+                continue
+            results.append({
+                "type": "cluster",
+                "id": f"{zoom}/{key[0]}/{key[1]}",
+                "count": count,
+                "latitude": cell["lat_sum"] / count,
+                "longitude": cell["lon_sum"] / count,
+                "representative": representative
+            })
+        return results
+
+# Shared store cluster index, registered with the product catalog on startup
+store_cluster_index = StoreClusterIndex()
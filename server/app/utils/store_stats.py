@@ -0,0 +1,78 @@
+from app.utils.cache import TTLCache
+from app.utils.product_catalog import CatalogListener, ProductCatalog
+from typing import Dict, Iterable, List, Optional
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# How long seller dashboard statistics are served from the cache
+STORE_STATS_CACHE_SECONDS = float(os.getenv("STORE_STATS_CACHE_SECONDS", "60"))
+
+# Dashboard statistics per store_id
+store_stats_cache = TTLCache(STORE_STATS_CACHE_SECONDS)
+
+# Embeds the store_stats row of each store as "stats" in a stores select
+STORE_STATS_SELECT = "stats:store_stats(product_count, category_count, total_views, review_count, average_rating)"
+
+EMPTY_STORE_STATS = {"product_count": 0, "category_count": 0, "total_views": 0, "review_count": 0, "average_rating": 0}
+
+def with_store_stats(store: dict) -> dict:
+    """
+    Normalize the embedded store_stats of a store row.
+
+    The embed comes back as an object or a one-element list depending on the
+    PostgREST version, and is missing for stores that have never had a product.
+    """
+    stats = store.get("stats")
+    if isinstance(stats, list):
+        stats = stats[0] if stats else None
+    stats = {**EMPTY_STORE_STATS, **(stats or {})}
+    stats["average_rating"] = float(stats["average_rating"] or 0)
+    store["stats"] = stats
+    return store
+
+class StoreStatsInvalidator(CatalogListener):
+    """
+    Drops cached store statistics whenever the catalog reports a write that
+    touches one of the store's products, its ratings or views, or the store itself.
+    """
+
+    def __init__(self, cache: TTLCache):
+        self.cache = cache
+        self._product_stores: Dict[int, Optional[str]] = {}
+
+    def _invalidate(self, store_ids: Iterable[Optional[str]]) -> None:
+        for store_id in set(store_ids):
+            if store_id:
+                self.cache.invalidate(store_id)
+
+    def catalog_loaded(self, catalog: ProductCatalog) -> None:
+        self._product_stores = {product_id: product.get("store_id") for product_id, product in catalog.products.items()}
+
+    def products_changed(self, catalog: ProductCatalog, products: List[dict]) -> None:
+        store_ids = []
+        for product in products:
+            # A product moved to another store changes both stores
+            store_ids.append(self._product_stores.get(product["id"]))
+            store_ids.append(product.get("store_id"))
+            self._product_stores[product["id"]] = product.get("store_id")
+        self._invalidate(store_ids)
+
+    def products_removed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        self._invalidate(self._product_stores.pop(product_id, None) for product_id in product_ids)
+
+    def stores_changed(self, catalog: ProductCatalog, stores: List[dict]) -> None:
+        self._invalidate(store["store_id"] for store in stores)
+
+    def stores_removed(self, catalog: ProductCatalog, store_ids: List[str]) -> None:
+        self._invalidate(store_ids)
+
+    def ratings_changed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        self._invalidate(self._product_stores.get(product_id) for product_id in product_ids)
+
+    def views_changed(self, catalog: ProductCatalog, product_ids: List[int]) -> None:
+        self._invalidate(self._product_stores.get(product_id) for product_id in product_ids)
+
+# Shared invalidator, registered with the product catalog on startup
+store_stats_invalidator = StoreStatsInvalidator(store_stats_cache)
@@ -0,0 +1,107 @@
+from app.db.database import supabase_client
+from app.utils.signed_uploads import UPLOAD_KINDS, DOCUMENT_KINDS, SIGNED_UPLOAD_URL_HOURS
+from app.utils.storage import list_storage_items, remove_storage_objects
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# How often abandoned seller application documents are looked for
+DOCUMENT_SWEEP_INTERVAL_MINUTES = float(os.getenv("DOCUMENT_SWEEP_INTERVAL_MINUTES", "60"))
+
+# Folder that signed uploads of seller application documents go to
+APPLICATION_FOLDER = "applications"
+
+# Paths looked up in store_user per query
+REFERENCE_BATCH_SIZE = 100
+
+def _created_before(item: dict, cutoff: datetime) -> bool:
+    created_at = item.get("created_at")
+    if not created_at:
+        return False
+    return datetime.fromisoformat(created_at.replace("Z", "+00:00")) < cutoff
+
+def _referenced_paths(kind: str, paths: List[str]) -> set:
+    """Return the paths that a seller application stores in its `kind` column."""
+    referenced = set()
+    for start in range(0, len(paths), REFERENCE_BATCH_SIZE):
+        batch = paths[start:start + REFERENCE_BATCH_SIZE]
+        response = supabase_client.table("store_user").select(kind).in_(kind, batch).execute()
+        referenced.update(row[kind] for row in response.data or [])
+    return referenced
+
+def sweep_application_documents() -> int:
+    """
+    Delete seller application documents that were uploaded but never submitted.
+
+    Only objects older than the signed URL lifetime are considered; their grants
+    expired long before, so they can no longer be finalized. Returns the number
+    of objects removed.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=SIGNED_UPLOAD_URL_HOURS)
+    removed = 0
+    for kind in DOCUMENT_KINDS:
+        bucket = UPLOAD_KINDS[kind][0]
+        stale: List[str] = []
+        # Every grant uploads into its own applications/<uuid>/ folder
+        for folder in list_storage_items(APPLICATION_FOLDER, bucket):
+            if not folder.get("name") or folder.get("id") is not None:
+                continue
+            prefix = f"{APPLICATION_FOLDER}/{folder['name']}"
+            stale.extend(
+                f"{prefix}/{item['name']}" for item in list_storage_items(prefix, bucket)
+                if item.get("name") and _created_before(item, cutoff)
+            )
+        if not stale:
+            continue
+
+        referenced = _referenced_paths(kind, stale)
+        abandoned = [path for path in stale if path not in referenced]
+        if abandoned:
+            removed += remove_storage_objects(abandoned, bucket)
+            logger.info(f"Removed {len(abandoned)} abandoned {kind} uploads from {bucket}")
+    return removed
+
+class ApplicationDocumentSweeper:
+    """Background task that periodically removes abandoned seller application documents."""
+
+    def __init__(self, interval_minutes: float):
+        self.interval = interval_minutes * 60
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Start the background sweep task."""
+        if self._task is not None:
+            return
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Application document sweeper started")
+
+    async def stop(self) -> None:
+        """Stop the background sweep task."""
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        logger.info("Application document sweeper stopped")
+
+    async def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stop_event.is_set():
+                break
+            try:
+                await asyncio.to_thread(sweep_application_documents)
+            except Exception as e:
+                logger.error(f"Error sweeping abandoned application documents: {str(e)}")
+
+# Shared sweeper instance started with the app
+application_document_sweeper = ApplicationDocumentSweeper(DOCUMENT_SWEEP_INTERVAL_MINUTES)
@@ -0,0 +1,155 @@
+from app.db.database import supabase_client
+from app.utils.product_catalog import product_catalog
+import asyncio
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Counter configuration
+VIEW_COUNTER_SHARDS = int(os.getenv("VIEW_COUNTER_SHARDS", "16"))
+VIEW_FLUSH_INTERVAL_SECONDS = float(os.getenv("VIEW_FLUSH_INTERVAL_SECONDS", "5"))
+VIEW_SPILL_FILE = Path(os.getenv("VIEW_SPILL_FILE", "product_views_spill.jsonl"))
+
+# Most distinct products with unflushed views; views of further products are dropped until the next flush
+VIEW_MAX_PENDING_PRODUCTS = int(os.getenv("VIEW_MAX_PENDING_PRODUCTS", "100000"))
+
+class ViewCounter:
+    """
+    Sharded in-memory product view counter.
+
+    Increments only touch one shard's dict under that shard's lock, so they run at
+    memory speed from both the event loop and worker threads. A background task
+    periodically swaps the shards out, aggregates the deltas and applies them with a
+    single increment_product_views RPC. Deltas that cannot be flushed are written to
+    a local spill file and loaded back on the next start. At most max_pending
+    distinct products are held between flushes.
+    """
+
+    def __init__(self, shard_count: int, flush_interval: float, spill_file: Path, max_pending: int):
+        self.flush_interval = flush_interval
+        self.spill_file = spill_file
+        self.max_pending_per_shard = max(1, max_pending // shard_count)
+        self._shards: List[Dict[int, int]] = [{} for _ in range(shard_count)]
+        self._locks = [threading.Lock() for _ in range(shard_count)]
+        self._task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def increment(self, product_id: int, count: int = 1) -> bool:
+        """Record views for a product; returns False when too many products already have pending views."""
+        shard = product_id % len(self._shards)
+        with self._locks[shard]:
+            pending = self._shards[shard]
+            if product_id not in pending and len(pending) >= self.max_pending_per_shard:
+                return False
+            pending[product_id] = pending.get(product_id, 0) + count
+            return True
+
+    def _restore(self, product_id: int, count: int) -> None:
+        """Add back spilled views, regardless of the pending limit."""
+        shard = product_id % len(self._shards)
+        with self._locks[shard]:
+            self._shards[shard][product_id] = self._shards[shard].get(product_id, 0) + count
+
+    def pending(self, product_id: int) -> int:
+        """Views recorded for a product that have not been flushed yet."""
+        shard = product_id % len(self._shards)
+        with self._locks[shard]:
+            return self._shards[shard].get(product_id, 0)
+
+    async def start(self) -> None:
+        """Load spilled deltas and start the background flush task."""
+        if self._task is not None:
+            return
+        self._load_spill()
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Product view counter started")
+
+    async def stop(self) -> None:
+        """Stop the background task and flush the remaining deltas."""
+        if self._stop_event is not None:
+            self._stop_event.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+        logger.info("Product view counter stopped")
+
+    async def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def _drain(self) -> Dict[int, int]:
+        deltas: Dict[int, int] = {}
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                drained, self._shards[shard] = self._shards[shard], {}
+            for product_id, count in drained.items():
+                deltas[product_id] = deltas.get(product_id, 0) + count
+        return deltas
+
+    async def flush(self) -> None:
+        """Apply all pending deltas with one batched RPC."""
+        deltas = self._drain()
+        if not deltas:
+            return
+
+        try:
+            response = await asyncio.to_thread(
+                lambda: supabase_client.rpc("increment_product_views", {
+                    "p_deltas": {str(product_id): count for product_id, count in deltas.items()}
+                }).execute()
+            )
+            logger.info(f"Flushed views for {len(deltas)} products")
+            product_catalog.set_views({int(product_id): views for product_id, views in (response.data or {}).items()})
+        except Exception as e:
+            logger.error(f"Error flushing product views: {str(e)}")
+            self._spill(deltas)
+            return
+
+        # The database is reachable again; retry anything that was spilled earlier
+        if self.spill_file.exists():
+            self._load_spill()
+
+    def _spill(self, deltas: Dict[int, int]) -> None:
+        try:
+            with open(self.spill_file, "a", encoding="utf-8") as spill:
+                spill.write(json.dumps({str(product_id): count for product_id, count in deltas.items()}) + "\n")
+            logger.warning(f"Spilled views for {len(deltas)} products to {self.spill_file}")
+        except Exception as e:
+            logger.error(f"Error writing product view spill file: {str(e)}")
+
+    def _load_spill(self) -> None:
+        if not self.spill_file.exists():
+            return
+
+        # Move the file aside first so no other worker loads the same deltas and
+        # deltas spilled while loading go to a fresh file
+        loading = self.spill_file.with_name(f"{self.spill_file.name}.{os.getpid()}.replay")
+        try:
+            os.replace(self.spill_file, loading)
+            with open(loading, "r", encoding="utf-8") as spill:
+                lines = [line for line in spill if line.strip()]
+            loading.unlink()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Error reading product view spill file: {str(e)}")
+            return
+
+        for line in lines:
+            for product_id, count in json.loads(line).items():
+                self._restore(int(product_id), int(count))
+        logger.info(f"Loaded {len(lines)} spilled product view batches")
+
+# Shared counter used by the product view endpoint
+view_counter = ViewCounter(VIEW_COUNTER_SHARDS, VIEW_FLUSH_INTERVAL_SECONDS, VIEW_SPILL_FILE, VIEW_MAX_PENDING_PRODUCTS)
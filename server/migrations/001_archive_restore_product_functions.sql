@@ -0,0 +1,120 @@
+-- Atomic archive and restore of products.
+--
+-- Each function moves one row between products and archived_products inside a
+-- single transaction, so the API needs one RPC call instead of a check, a read,
+-- an insert and a delete with manual compensation on failure. Row locks make
+-- concurrent calls for the same product serialize instead of racing.
+--
+-- Pass p_store_id to restrict the move to products owned by that store (seller
+-- routes); leave it NULL for admin routes.
+--
+-- Both functions return a JSON object with a "status" field:
+--   archive_product: 'archived', 'already_archived', 'not_found', 'forbidden'
+--   restore_product: 'restored', 'not_found', 'forbidden', 'conflict'
+
+CREATE OR REPLACE FUNCTION archive_product(
+    p_product_id products.id%TYPE,
+    p_archived_by archived_products.archived_by%TYPE,
+    p_archived_by_type archived_products.archived_by_type%TYPE,
+    p_store_id products.store_id%TYPE DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_product products%ROWTYPE;
+    v_archived_id archived_products.id%TYPE;
+BEGIN
+    -- Lock the product row so concurrent archive calls wait for each other
+    SELECT * INTO v_product FROM products WHERE id = p_product_id FOR UPDATE;
+
+    IF NOT FOUND THEN
+        IF EXISTS (SELECT 1 FROM archived_products WHERE original_product_id = p_product_id) THEN
+            RETURN jsonb_build_object('status', 'already_archived');
+        END IF;
+        RETURN jsonb_build_object('status', 'not_found');
+    END IF;
+
+    IF p_store_id IS NOT NULL AND v_product.store_id::text <> p_store_id::text THEN
+        RETURN jsonb_build_object('status', 'forbidden');
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM archived_products WHERE original_product_id = p_product_id) THEN
+        RETURN jsonb_build_object('status', 'already_archived');
+    END IF;
+
+    INSERT INTO archived_products (
+        original_product_id, name, description, category, location_name, address,
+        latitude, longitude, ar_asset_url, image_urls, in_stock, store_id, town,
+        price_min, price_max, views, archived_at, archived_by, archived_by_type
+    )
+    VALUES (
+        v_product.id, v_product.name, v_product.description, v_product.category,
+        COALESCE(v_product.location_name, ''), v_product.address,
+        v_product.latitude, v_product.longitude, COALESCE(v_product.ar_asset_url, ''),
+        COALESCE(v_product.image_urls, '{}'), FALSE, v_product.store_id, v_product.town,
+        v_product.price_min, v_product.price_max, COALESCE(v_product.views, 0),
+        now(), p_archived_by, p_archived_by_type
+    )
+    RETURNING id INTO v_archived_id;
+
+    DELETE FROM products WHERE id = p_product_id;
+
+    RETURN jsonb_build_object(
+        'status', 'archived',
+        'archived_id', v_archived_id,
+        'product_id', v_product.id,
+        'name', v_product.name,
+        'store_id', v_product.store_id
+    );
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION restore_product(
+    p_archived_id archived_products.id%TYPE,
+    p_store_id archived_products.store_id%TYPE DEFAULT NULL
+)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_archived archived_products%ROWTYPE;
+BEGIN
+    -- Lock the archived row so concurrent restore calls wait for each other
+    SELECT * INTO v_archived FROM archived_products WHERE id = p_archived_id FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('status', 'not_found');
+    END IF;
+
+    IF p_store_id IS NOT NULL AND v_archived.store_id::text <> p_store_id::text THEN
+        RETURN jsonb_build_object('status', 'forbidden');
+    END IF;
+
+    IF EXISTS (SELECT 1 FROM products WHERE id = v_archived.original_product_id) THEN
+        RETURN jsonb_build_object('status', 'conflict');
+    END IF;
+
+    INSERT INTO products (
+        id, name, description, category, location_name, address, latitude, longitude,
+        ar_asset_url, image_urls, in_stock, store_id, town, price_min, price_max, views
+    )
+    VALUES (
+        v_archived.original_product_id, v_archived.name, v_archived.description,
+        v_archived.category, COALESCE(v_archived.location_name, ''), v_archived.address,
+        v_archived.latitude, v_archived.longitude, COALESCE(v_archived.ar_asset_url, ''),
+        COALESCE(v_archived.image_urls, '{}'), TRUE, v_archived.store_id, v_archived.town,
+        v_archived.price_min, v_archived.price_max, COALESCE(v_archived.views, 0)
+    );
+
+    DELETE FROM archived_products WHERE id = p_archived_id;
+
+    RETURN jsonb_build_object(
+        'status', 'restored',
+        'archived_id', v_archived.id,
+        'product_id', v_archived.original_product_id,
+        'name', v_archived.name,
+        'store_id', v_archived.store_id
+    );
+END;
+$$;
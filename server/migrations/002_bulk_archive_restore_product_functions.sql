@@ -0,0 +1,106 @@
+-- Set-based bulk archive and restore of products.
+--
+-- Each function moves every requested row between products and
+-- archived_products with a single INSERT ... SELECT and a single DELETE in one
+-- transaction, instead of one round trip per product. Rows are locked first so
+-- concurrent calls for the same products serialize.
+--
+-- Both functions return a JSON array with one {"id", "status", "name"} object
+-- per distinct requested id:
+--   archive_products: 'archived', 'already_archived', 'not_found'
+--   restore_products: 'restored', 'conflict', 'not_found'
+
+CREATE OR REPLACE FUNCTION archive_products(
+    p_product_ids products.id%TYPE[],
+    p_archived_by archived_products.archived_by%TYPE,
+    p_archived_by_type archived_products.archived_by_type%TYPE
+)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+    WITH requested AS (
+        SELECT DISTINCT id FROM unnest(p_product_ids) AS t(id)
+    ),
+    locked AS (
+        SELECT * FROM products WHERE id IN (SELECT id FROM requested) FOR UPDATE
+    ),
+    archivable AS (
+        SELECT l.* FROM locked l
+        WHERE NOT EXISTS (SELECT 1 FROM archived_products a WHERE a.original_product_id = l.id)
+    ),
+    inserted AS (
+        INSERT INTO archived_products (
+            original_product_id, name, description, category, location_name, address,
+            latitude, longitude, ar_asset_url, image_urls, in_stock, store_id, town,
+            price_min, price_max, views, archived_at, archived_by, archived_by_type
+        )
+        SELECT
+            id, name, description, category, COALESCE(location_name, ''), address,
+            latitude, longitude, COALESCE(ar_asset_url, ''), COALESCE(image_urls, '{}'),
+            FALSE, store_id, town, price_min, price_max, COALESCE(views, 0),
+            now(), p_archived_by, p_archived_by_type
+        FROM archivable
+        RETURNING original_product_id, name
+    ),
+    deleted AS (
+        DELETE FROM products p USING archivable a WHERE p.id = a.id RETURNING p.id
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'id', r.id,
+        'status', CASE
+            WHEN i.original_product_id IS NOT NULL THEN 'archived'
+            WHEN l.id IS NOT NULL THEN 'already_archived'
+            WHEN EXISTS (SELECT 1 FROM archived_products a WHERE a.original_product_id = r.id) THEN 'already_archived'
+            ELSE 'not_found'
+        END,
+        'name', COALESCE(i.name, l.name)
+    )), '[]'::jsonb)
+    FROM requested r
+    LEFT JOIN inserted i ON i.original_product_id = r.id
+    LEFT JOIN locked l ON l.id = r.id;
+$$;
+
+CREATE OR REPLACE FUNCTION restore_products(
+    p_archived_ids archived_products.id%TYPE[]
+)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+    WITH requested AS (
+        SELECT DISTINCT id FROM unnest(p_archived_ids) AS t(id)
+    ),
+    locked AS (
+        SELECT * FROM archived_products WHERE id IN (SELECT id FROM requested) FOR UPDATE
+    ),
+    restorable AS (
+        SELECT l.* FROM locked l
+        WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.id = l.original_product_id)
+    ),
+    inserted AS (
+        INSERT INTO products (
+            id, name, description, category, location_name, address, latitude, longitude,
+            ar_asset_url, image_urls, in_stock, store_id, town, price_min, price_max, views
+        )
+        SELECT
+            original_product_id, name, description, category, COALESCE(location_name, ''),
+            address, latitude, longitude, COALESCE(ar_asset_url, ''), COALESCE(image_urls, '{}'),
+            TRUE, store_id, town, price_min, price_max, COALESCE(views, 0)
+        FROM restorable
+        RETURNING id
+    ),
+    deleted AS (
+        DELETE FROM archived_products a USING restorable r WHERE a.id = r.id RETURNING a.id, a.name
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'id', r.id,
+        'status', CASE
+            WHEN d.id IS NOT NULL THEN 'restored'
+            WHEN l.id IS NOT NULL THEN 'conflict'
+            ELSE 'not_found'
+        END,
+        'name', COALESCE(d.name, l.name)
+    )), '[]'::jsonb)
+    FROM requested r
+    LEFT JOIN deleted d ON d.id = r.id
+    LEFT JOIN locked l ON l.id = r.id;
+$$;
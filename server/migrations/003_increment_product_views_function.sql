@@ -0,0 +1,23 @@
+-- Batched product view counter flush.
+--
+-- Applies aggregated view deltas to products in a single UPDATE. p_deltas is a
+-- JSON object mapping product id to the number of views to add, for example
+-- {"12": 40, "57": 3}. Returns the number of products that were updated.
+
+CREATE OR REPLACE FUNCTION increment_product_views(p_deltas jsonb)
+RETURNS integer
+LANGUAGE sql
+AS $$
+    WITH deltas AS (
+        SELECT key::bigint AS id, value::bigint AS delta
+        FROM jsonb_each_text(p_deltas)
+    ),
+    updated AS (
+        UPDATE products p
+        SET views = COALESCE(p.views, 0) + d.delta
+        FROM deltas d
+        WHERE p.id = d.id
+        RETURNING p.id
+    )
+    SELECT count(*)::integer FROM updated;
+$$;
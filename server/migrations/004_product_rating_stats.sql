@@ -0,0 +1,78 @@
+-- Precomputed per-product rating aggregates and indexes for top-K queries.
+--
+-- product_rating_stats keeps the review count and rating sum of every product
+-- up to date through a trigger on reviews, so averages never have to be
+-- computed by reading every review. top_rated_products returns the K best
+-- rated products that are currently listed, using the average_rating index.
+
+CREATE TABLE IF NOT EXISTS product_rating_stats (
+    product_id bigint PRIMARY KEY,
+    review_count integer NOT NULL DEFAULT 0,
+    rating_sum numeric NOT NULL DEFAULT 0,
+    average_rating numeric GENERATED ALWAYS AS (
+        CASE WHEN review_count > 0 THEN rating_sum / review_count ELSE 0 END
+    ) STORED
+);
+
+CREATE INDEX IF NOT EXISTS product_rating_stats_average_rating_idx
+    ON product_rating_stats (average_rating DESC, review_count DESC);
+
+CREATE INDEX IF NOT EXISTS products_views_idx
+    ON products (views DESC);
+
+CREATE OR REPLACE FUNCTION apply_product_rating_delta(
+    p_product_id bigint,
+    p_review_count integer,
+    p_rating_sum numeric
+)
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO product_rating_stats (product_id, review_count, rating_sum)
+    VALUES (p_product_id, p_review_count, p_rating_sum)
+    ON CONFLICT (product_id) DO UPDATE SET
+        review_count = product_rating_stats.review_count + EXCLUDED.review_count,
+        rating_sum = product_rating_stats.rating_sum + EXCLUDED.rating_sum;
+$$;
+
+CREATE OR REPLACE FUNCTION product_rating_stats_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_product_rating_delta(OLD.product_id, -1, -COALESCE(OLD.rating, 0));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_product_rating_delta(NEW.product_id, 1, COALESCE(NEW.rating, 0));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS reviews_product_rating_stats ON reviews;
+CREATE TRIGGER reviews_product_rating_stats
+    AFTER INSERT OR UPDATE OF rating, product_id OR DELETE ON reviews
+    FOR EACH ROW EXECUTE FUNCTION product_rating_stats_trigger();
+
+-- Backfill from the existing reviews
+INSERT INTO product_rating_stats (product_id, review_count, rating_sum)
+SELECT product_id, count(*), COALESCE(sum(rating), 0)
+FROM reviews
+GROUP BY product_id
+ON CONFLICT (product_id) DO UPDATE SET
+    review_count = EXCLUDED.review_count,
+    rating_sum = EXCLUDED.rating_sum;
+
+CREATE OR REPLACE FUNCTION top_rated_products(p_limit integer)
+RETURNS TABLE (product_id bigint, average_rating numeric, review_count integer)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT s.product_id, s.average_rating, s.review_count
+    FROM product_rating_stats s
+    JOIN products p ON p.id = s.product_id
+    WHERE s.review_count > 0
+    ORDER BY s.average_rating DESC, s.review_count DESC
+    LIMIT p_limit;
+$$;
@@ -0,0 +1,52 @@
+-- Include the restored product id in restore_products results.
+--
+-- Callers need the id of the row that was recreated in products (the original
+-- product id) to keep in-memory catalog indexes in sync after a bulk restore.
+-- Each result object now has a "product_id" field next to "id", which is the
+-- archived_products id that was requested.
+
+CREATE OR REPLACE FUNCTION restore_products(
+    p_archived_ids archived_products.id%TYPE[]
+)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+    WITH requested AS (
+        SELECT DISTINCT id FROM unnest(p_archived_ids) AS t(id)
+    ),
+    locked AS (
+        SELECT * FROM archived_products WHERE id IN (SELECT id FROM requested) FOR UPDATE
+    ),
+    restorable AS (
+        SELECT l.* FROM locked l
+        WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.id = l.original_product_id)
+    ),
+    inserted AS (
+        INSERT INTO products (
+            id, name, description, category, location_name, address, latitude, longitude,
+            ar_asset_url, image_urls, in_stock, store_id, town, price_min, price_max, views
+        )
+        SELECT
+            original_product_id, name, description, category, COALESCE(location_name, ''),
+            address, latitude, longitude, COALESCE(ar_asset_url, ''), COALESCE(image_urls, '{}'),
+            TRUE, store_id, town, price_min, price_max, COALESCE(views, 0)
+        FROM restorable
+        RETURNING id
+    ),
+    deleted AS (
+        DELETE FROM archived_products a USING restorable r WHERE a.id = r.id RETURNING a.id, a.name, a.original_product_id
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'id', r.id,
+        'status', CASE
+            WHEN d.id IS NOT NULL THEN 'restored'
+            WHEN l.id IS NOT NULL THEN 'conflict'
+            ELSE 'not_found'
+        END,
+        'name', COALESCE(d.name, l.name),
+        'product_id', COALESCE(d.original_product_id, l.original_product_id)
+    )), '[]'::jsonb)
+    FROM requested r
+    LEFT JOIN deleted d ON d.id = r.id
+    LEFT JOIN locked l ON l.id = r.id;
+$$;
@@ -0,0 +1,17 @@
+-- Perceptual hashes of uploaded product images.
+--
+-- Every image uploaded through the product endpoints gets a 64-bit DCT
+-- perceptual hash, stored as a signed bigint. The API keeps the hashes in an
+-- in-memory BK-tree for Hamming-distance lookups and reloads them from this
+-- table on startup.
+
+CREATE TABLE IF NOT EXISTS product_image_hashes (
+    image_url text PRIMARY KEY,
+    product_id bigint NOT NULL,
+    store_id text,
+    phash bigint NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS product_image_hashes_product_id_idx
+    ON product_image_hashes (product_id);
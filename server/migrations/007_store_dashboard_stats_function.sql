@@ -0,0 +1,47 @@
+-- Seller dashboard statistics in a single call.
+--
+-- Aggregates a store's product count, distinct categories, total views, review
+-- count and average rating (from product_rating_stats) and returns them with
+-- the store row and its most viewed products, so the API no longer downloads
+-- every product and review of the store.
+
+CREATE OR REPLACE FUNCTION store_dashboard_stats(
+    p_store_id products.store_id%TYPE,
+    p_top_limit integer DEFAULT 5
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    WITH store_products AS (
+        SELECT p.id, p.name, p.category, p.views, p.price_min
+        FROM products p
+        WHERE p.store_id = p_store_id
+    ),
+    totals AS (
+        SELECT
+            count(*) AS total_products,
+            count(DISTINCT sp.category) AS total_categories,
+            COALESCE(sum(sp.views), 0) AS product_views,
+            COALESCE(sum(s.review_count), 0) AS total_reviews,
+            COALESCE(sum(s.rating_sum), 0) AS rating_sum
+        FROM store_products sp
+        LEFT JOIN product_rating_stats s ON s.product_id = sp.id
+    ),
+    top_products AS (
+        SELECT id, name, category, views, price_min
+        FROM store_products
+        ORDER BY views DESC NULLS LAST, id
+        LIMIT p_top_limit
+    )
+    SELECT jsonb_build_object(
+        'total_products', t.total_products,
+        'total_categories', t.total_categories,
+        'product_views', t.product_views,
+        'total_reviews', t.total_reviews,
+        'average_rating', CASE WHEN t.total_reviews > 0 THEN round(t.rating_sum / t.total_reviews, 1) ELSE 0 END,
+        'top_products', COALESCE((SELECT jsonb_agg(to_jsonb(tp)) FROM top_products tp), '[]'::jsonb),
+        'store', (SELECT to_jsonb(st) FROM stores st WHERE st.store_id = p_store_id)
+    )
+    FROM totals t;
+$$;
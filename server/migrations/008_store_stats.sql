@@ -0,0 +1,247 @@
+-- Per-store statistics maintained on every write.
+--
+-- store_stats keeps the product count, distinct category count, total views,
+-- review count and rating sum of every store. Triggers on products and on
+-- product_rating_stats apply the deltas of each insert, update and delete, so
+-- product add/update/archive/restore, new reviews and view flushes all keep it
+-- current without rescanning a store. store_category_counts backs the distinct
+-- category count. rebuild_store_stats() recomputes both tables from scratch.
+
+-- Create the tables with the same store_id type as stores
+DO $$
+DECLARE
+    v_store_id_type text;
+BEGIN
+    SELECT format_type(a.atttypid, a.atttypmod) INTO v_store_id_type
+    FROM pg_attribute a
+    WHERE a.attrelid = 'stores'::regclass AND a.attname = 'store_id';
+
+    EXECUTE format($ddl$
+        CREATE TABLE IF NOT EXISTS store_stats (
+            store_id %s PRIMARY KEY REFERENCES stores (store_id) ON DELETE CASCADE,
+            product_count integer NOT NULL DEFAULT 0,
+            category_count integer NOT NULL DEFAULT 0,
+            total_views bigint NOT NULL DEFAULT 0,
+            review_count integer NOT NULL DEFAULT 0,
+            rating_sum numeric NOT NULL DEFAULT 0,
+            average_rating numeric GENERATED ALWAYS AS (
+                CASE WHEN review_count > 0 THEN round(rating_sum / review_count, 1) ELSE 0 END
+            ) STORED,
+            updated_at timestamptz NOT NULL DEFAULT now()
+        )
+    $ddl$, v_store_id_type);
+
+    EXECUTE format($ddl$
+        CREATE TABLE IF NOT EXISTS store_category_counts (
+            store_id %s NOT NULL REFERENCES stores (store_id) ON DELETE CASCADE,
+            category text NOT NULL,
+            product_count integer NOT NULL DEFAULT 0,
+            PRIMARY KEY (store_id, category)
+        )
+    $ddl$, v_store_id_type);
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS products_store_id_views_idx
+    ON products (store_id, views DESC);
+
+CREATE OR REPLACE FUNCTION apply_store_stats_delta(
+    p_store_id stores.store_id%TYPE,
+    p_product_count integer,
+    p_total_views bigint,
+    p_review_count integer,
+    p_rating_sum numeric
+)
+RETURNS void
+LANGUAGE sql
+AS $$
+    -- Stores that no longer exist (for example during a store deletion) are skipped
+    INSERT INTO store_stats (store_id, product_count, total_views, review_count, rating_sum)
+    SELECT s.store_id, p_product_count, p_total_views, p_review_count, p_rating_sum
+    FROM stores s
+    WHERE s.store_id = p_store_id
+    ON CONFLICT (store_id) DO UPDATE SET
+        product_count = store_stats.product_count + EXCLUDED.product_count,
+        total_views = store_stats.total_views + EXCLUDED.total_views,
+        review_count = store_stats.review_count + EXCLUDED.review_count,
+        rating_sum = store_stats.rating_sum + EXCLUDED.rating_sum,
+        updated_at = now();
+$$;
+
+CREATE OR REPLACE FUNCTION apply_store_category_delta(
+    p_store_id stores.store_id%TYPE,
+    p_category text,
+    p_delta integer
+)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_count integer;
+BEGIN
+    IF p_store_id IS NULL OR NULLIF(p_category, '') IS NULL
+       OR NOT EXISTS (SELECT 1 FROM stores WHERE store_id = p_store_id) THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO store_category_counts (store_id, category, product_count)
+    VALUES (p_store_id, p_category, p_delta)
+    ON CONFLICT (store_id, category) DO UPDATE SET
+        product_count = store_category_counts.product_count + EXCLUDED.product_count
+    RETURNING product_count INTO v_count;
+
+    IF p_delta > 0 AND v_count = p_delta THEN
+        -- First product of this category in the store
+        INSERT INTO store_stats (store_id, category_count) VALUES (p_store_id, 1)
+        ON CONFLICT (store_id) DO UPDATE SET
+            category_count = store_stats.category_count + 1,
+            updated_at = now();
+    ELSIF p_delta < 0 AND v_count <= 0 THEN
+        -- Last product of this category left the store
+        DELETE FROM store_category_counts WHERE store_id = p_store_id AND category = p_category;
+        UPDATE store_stats SET category_count = GREATEST(category_count - 1, 0), updated_at = now()
+        WHERE store_id = p_store_id;
+    END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION products_store_stats_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_review_count integer;
+    v_rating_sum numeric;
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.store_id IS NOT DISTINCT FROM NEW.store_id
+       AND OLD.category IS NOT DISTINCT FROM NEW.category THEN
+        -- Same store and category: only views can change the stats
+        IF OLD.views IS DISTINCT FROM NEW.views AND NEW.store_id IS NOT NULL THEN
+            PERFORM apply_store_stats_delta(NEW.store_id, 0, COALESCE(NEW.views, 0) - COALESCE(OLD.views, 0), 0, 0);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.store_id IS NOT NULL THEN
+        SELECT COALESCE(r.review_count, 0), COALESCE(r.rating_sum, 0) INTO v_review_count, v_rating_sum
+        FROM (SELECT 1) one
+        LEFT JOIN product_rating_stats r ON r.product_id = OLD.id;
+        PERFORM apply_store_stats_delta(OLD.store_id, -1, -COALESCE(OLD.views, 0), -v_review_count, -v_rating_sum);
+        PERFORM apply_store_category_delta(OLD.store_id, OLD.category, -1);
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'INSERT') AND NEW.store_id IS NOT NULL THEN
+        SELECT COALESCE(r.review_count, 0), COALESCE(r.rating_sum, 0) INTO v_review_count, v_rating_sum
+        FROM (SELECT 1) one
+        LEFT JOIN product_rating_stats r ON r.product_id = NEW.id;
+        PERFORM apply_store_stats_delta(NEW.store_id, 1, COALESCE(NEW.views, 0), v_review_count, v_rating_sum);
+        PERFORM apply_store_category_delta(NEW.store_id, NEW.category, 1);
+    END IF;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS products_store_stats ON products;
+CREATE TRIGGER products_store_stats
+    AFTER INSERT OR UPDATE OF store_id, category, views OR DELETE ON products
+    FOR EACH ROW EXECUTE FUNCTION products_store_stats_trigger();
+
+CREATE OR REPLACE FUNCTION product_rating_stats_store_trigger()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_product_id bigint := COALESCE(NEW.product_id, OLD.product_id);
+    v_store_id stores.store_id%TYPE;
+BEGIN
+    -- Ratings of archived products are not part of their store's stats
+    SELECT store_id INTO v_store_id FROM products WHERE id = v_product_id;
+    IF v_store_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM apply_store_stats_delta(
+        v_store_id,
+        0,
+        0,
+        COALESCE(NEW.review_count, 0) - COALESCE(OLD.review_count, 0),
+        COALESCE(NEW.rating_sum, 0) - COALESCE(OLD.rating_sum, 0)
+    );
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS product_rating_stats_store_stats ON product_rating_stats;
+CREATE TRIGGER product_rating_stats_store_stats
+    AFTER INSERT OR UPDATE OR DELETE ON product_rating_stats
+    FOR EACH ROW EXECUTE FUNCTION product_rating_stats_store_trigger();
+
+CREATE OR REPLACE FUNCTION rebuild_store_stats()
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_count integer;
+BEGIN
+    DELETE FROM store_category_counts;
+    DELETE FROM store_stats;
+
+    INSERT INTO store_category_counts (store_id, category, product_count)
+    SELECT p.store_id, p.category, count(*)
+    FROM products p
+    JOIN stores s ON s.store_id = p.store_id
+    WHERE NULLIF(p.category, '') IS NOT NULL
+    GROUP BY p.store_id, p.category;
+
+    INSERT INTO store_stats (store_id, product_count, category_count, total_views, review_count, rating_sum)
+    SELECT
+        s.store_id,
+        count(p.id),
+        count(DISTINCT NULLIF(p.category, '')),
+        COALESCE(sum(p.views), 0),
+        COALESCE(sum(r.review_count), 0),
+        COALESCE(sum(r.rating_sum), 0)
+    FROM stores s
+    LEFT JOIN products p ON p.store_id = s.store_id
+    LEFT JOIN product_rating_stats r ON r.product_id = p.id
+    GROUP BY s.store_id;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$;
+
+SELECT rebuild_store_stats();
+
+-- Read the dashboard totals from store_stats instead of aggregating the store's products
+CREATE OR REPLACE FUNCTION store_dashboard_stats(
+    p_store_id products.store_id%TYPE,
+    p_top_limit integer DEFAULT 5
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'total_products', COALESCE(ss.product_count, 0),
+        'total_categories', COALESCE(ss.category_count, 0),
+        'product_views', COALESCE(ss.total_views, 0),
+        'total_reviews', COALESCE(ss.review_count, 0),
+        'average_rating', COALESCE(ss.average_rating, 0),
+        'top_products', COALESCE((
+            SELECT jsonb_agg(to_jsonb(tp))
+            FROM (
+                SELECT p.id, p.name, p.category, p.views, p.price_min
+                FROM products p
+                WHERE p.store_id = p_store_id
+                ORDER BY p.views DESC NULLS LAST, p.id
+                LIMIT p_top_limit
+            ) tp
+        ), '[]'::jsonb),
+        'store', to_jsonb(st)
+    )
+    FROM (SELECT 1) one
+    LEFT JOIN stores st ON st.store_id = p_store_id
+    LEFT JOIN store_stats ss ON ss.store_id = p_store_id;
+$$;
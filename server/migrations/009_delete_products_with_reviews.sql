@@ -0,0 +1,26 @@
+-- Permanent deletion of a batch of products together with their reviews.
+--
+-- Reviews and products are deleted in one transaction, so a failure never
+-- leaves products without their reviews or reviews without their products.
+-- Storage objects cannot take part in the transaction; the function returns
+-- the id, image_urls and ar_asset_url of every deleted product so the caller
+-- can remove them once the rows are gone.
+
+CREATE OR REPLACE FUNCTION delete_products_with_reviews(p_product_ids products.id%TYPE[])
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    deleted jsonb;
+BEGIN
+    DELETE FROM reviews WHERE product_id = ANY(p_product_ids);
+
+    WITH removed AS (
+        DELETE FROM products WHERE id = ANY(p_product_ids)
+        RETURNING id, image_urls, ar_asset_url
+    )
+    SELECT COALESCE(jsonb_agg(to_jsonb(removed)), '[]'::jsonb) INTO deleted FROM removed;
+
+    RETURN deleted;
+END;
+$$;
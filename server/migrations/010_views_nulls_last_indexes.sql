@@ -0,0 +1,13 @@
+-- Sort products with no views after every viewed product.
+--
+-- views can be NULL, and a plain DESC index puts NULLs first. The most viewed
+-- queries order by views DESC NULLS LAST, so the indexes are rebuilt with the
+-- same ordering to keep serving them.
+
+DROP INDEX IF EXISTS products_views_idx;
+CREATE INDEX products_views_idx
+    ON products (views DESC NULLS LAST);
+
+DROP INDEX IF EXISTS products_store_id_views_idx;
+CREATE INDEX products_store_id_views_idx
+    ON products (store_id, views DESC NULLS LAST);
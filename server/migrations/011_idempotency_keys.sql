@@ -0,0 +1,56 @@
+-- Shared store of Idempotency-Key responses.
+--
+-- The first request with a key claims it by inserting a row; the row has no
+-- status_code while that request runs, and the response is written to it when
+-- the request finishes. Retries on any worker find the row and either replay
+-- the response or learn that the first request is still running. Claims of
+-- requests that never finished expire after p_lock_seconds, and responses
+-- after p_ttl_seconds.
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key_hash text PRIMARY KEY,
+    status_code integer,
+    headers jsonb,
+    body text,
+    claimed_at timestamptz NOT NULL DEFAULT now(),
+    expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at_idx
+    ON idempotency_keys (expires_at);
+
+-- Returns {"status": "claimed"}, {"status": "in_flight"} or
+-- {"status": "completed", "status_code", "headers", "body"}.
+CREATE OR REPLACE FUNCTION claim_idempotency_key(p_key_hash text, p_ttl_seconds integer, p_lock_seconds integer)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    existing idempotency_keys%ROWTYPE;
+BEGIN
+    -- Expired responses and abandoned claims no longer hold their key
+    DELETE FROM idempotency_keys
+    WHERE expires_at < now()
+       OR (key_hash = p_key_hash AND status_code IS NULL
+           AND claimed_at < now() - make_interval(secs => p_lock_seconds));
+
+    INSERT INTO idempotency_keys (key_hash, claimed_at, expires_at)
+    VALUES (p_key_hash, now(), now() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (key_hash) DO NOTHING;
+
+    IF FOUND THEN
+        RETURN jsonb_build_object('status', 'claimed');
+    END IF;
+
+    SELECT * INTO existing FROM idempotency_keys WHERE key_hash = p_key_hash;
+    IF existing.status_code IS NULL THEN
+        RETURN jsonb_build_object('status', 'in_flight');
+    END IF;
+    RETURN jsonb_build_object(
+        'status', 'completed',
+        'status_code', existing.status_code,
+        'headers', existing.headers,
+        'body', existing.body
+    );
+END;
+$$;
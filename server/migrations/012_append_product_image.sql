@@ -0,0 +1,27 @@
+-- Atomic append of an image to a product.
+--
+-- The array is extended in the UPDATE itself, so concurrent uploads to the
+-- same product all keep their image and no caller writes back a stale list.
+-- A url that is already in the list is not added again.
+--
+-- Pass p_store_id to restrict the update to products owned by that store
+-- (seller routes); leave it NULL for admin routes. Returns the updated row,
+-- or no rows when the product does not exist or belongs to another store.
+
+CREATE OR REPLACE FUNCTION append_product_image(
+    p_product_id products.id%TYPE,
+    p_image_url text,
+    p_store_id products.store_id%TYPE DEFAULT NULL
+)
+RETURNS SETOF products
+LANGUAGE sql
+AS $$
+    UPDATE products
+    SET image_urls = CASE
+        WHEN p_image_url = ANY(COALESCE(image_urls, '{}')) THEN image_urls
+        ELSE array_append(COALESCE(image_urls, '{}'), p_image_url)
+    END
+    WHERE id = p_product_id
+      AND (p_store_id IS NULL OR store_id::text = p_store_id::text)
+    RETURNING *;
+$$;
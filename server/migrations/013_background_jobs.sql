@@ -0,0 +1,18 @@
+-- State of long-running background jobs (product imports, store deletions,
+-- image hash backfills).
+--
+-- The worker running a job writes the whole job document to this table after
+-- every change, so a status poll that reaches any worker sees its progress.
+-- Finished jobs are deleted an hour after they finish.
+
+CREATE TABLE IF NOT EXISTS background_jobs (
+    job_id uuid PRIMARY KEY,
+    type text NOT NULL,
+    status text NOT NULL,
+    job jsonb NOT NULL,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    finished_at timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS background_jobs_finished_at_idx
+    ON background_jobs (finished_at);
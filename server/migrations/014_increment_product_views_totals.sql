@@ -0,0 +1,26 @@
+-- Return the new view totals from the batched view counter flush.
+--
+-- The in-memory catalog stores these totals instead of adding the deltas, so a
+-- catalog reload that already fetched the new counts can apply them again
+-- without counting the views twice. Returns a JSON object mapping product id
+-- to its new views, for example {"12": 1040, "57": 8}.
+
+DROP FUNCTION IF EXISTS increment_product_views(jsonb);
+
+CREATE FUNCTION increment_product_views(p_deltas jsonb)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+    WITH deltas AS (
+        SELECT key::bigint AS id, value::bigint AS delta
+        FROM jsonb_each_text(p_deltas)
+    ),
+    updated AS (
+        UPDATE products p
+        SET views = COALESCE(p.views, 0) + d.delta
+        FROM deltas d
+        WHERE p.id = d.id
+        RETURNING p.id, p.views
+    )
+    SELECT COALESCE(jsonb_object_agg(id::text, views), '{}'::jsonb) FROM updated;
+$$;